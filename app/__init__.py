@@ -1,13 +1,17 @@
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, current_app, has_app_context, jsonify
 from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_cors import CORS
-from flask_mail import Mail
-from pymongo import MongoClient
 from redis import Redis
-from celery import Celery
 from .config import Config
+from .repositories import MemoryRepositories, MongoRepositories, STORAGE_BACKENDS
+from .utils.passwords import password_hasher, PasswordHasherBusy
+from .utils.email_templates import email_templates
+from .utils.connections import connections, ProcessLocal
+from .utils.warmup import warmup, is_warmup_request
+from .utils import metrics, task_batching
+from .utils.slow_queries import SlowQueryListener
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
@@ -17,32 +21,141 @@ load_dotenv()
 
 # Initialize extensions
 jwt = JWTManager()
-limiter = Limiter(
-    key_func=get_remote_address,
-    storage_uri="redis://localhost:6379/0"
-)
-mail = Mail()
-celery = Celery()
+limiter = Limiter(key_func=get_remote_address)
+
+# Celery and Flask-Mail are only needed to enqueue and send, so they are
+# imported on first use (`from app import celery, mail` or get_celery/get_mail)
+_celery = None
+_celery_config = None
+_mail = None
+
+def celery_settings(config):
+    email = {'queue': config['CELERY_QUEUE_EMAIL'], 'priority': config['CELERY_PRIORITY_EMAIL']}
+    bulk = {'queue': config['CELERY_QUEUE_BULK'], 'priority': config['CELERY_PRIORITY_BULK']}
+    maintenance = {'queue': config['CELERY_QUEUE_MAINTENANCE'], 'priority': config['CELERY_PRIORITY_MAINTENANCE']}
+    return {
+        'broker_url': config['CELERY_BROKER_URL'],
+        'result_backend': config['CELERY_RESULT_BACKEND'],
+        'broker_pool_limit': config['CELERY_BROKER_POOL_LIMIT'],
+        'broker_connection_timeout': config['CELERY_BROKER_CONNECTION_TIMEOUT'],
+        'redis_max_connections': config['CELERY_REDIS_MAX_CONNECTIONS'],
+        # Transactional email, bulk notifications and maintenance jobs each
+        # get a queue so one kind of backlog cannot delay the others
+        'task_default_queue': config['CELERY_QUEUE_DEFAULT'],
+        'task_routes': {
+            'app.tasks.send_order_confirmation': email,
+            'app.tasks.send_order_status_update': email,
+            'app.tasks.send_order_notifications': bulk,
+            'app.tasks.update_sales_rollups': bulk,
+            'app.tasks.update_co_occurrence': bulk,
+            'app.tasks.generate_coupon_codes': maintenance,
+            'app.tasks.backfill_sales_rollups': maintenance,
+            'app.tasks.refresh_related_products': maintenance,
+            'app.tasks.rebuild_co_occurrence': maintenance,
+            'app.tasks.reprice_catalog': maintenance
+        },
+        # Run by `celery -A app.tasks beat`
+        'beat_schedule': {
+            'refresh-related-products': {
+                'task': 'app.tasks.refresh_related_products',
+                'schedule': config['RECOMMENDATIONS_REFRESH_SECONDS']
+            }
+        },
+        # Redis emulates priorities with one list per step; 0 is the highest
+        'broker_transport_options': {'priority_steps': list(range(10)), 'sep': ':', 'queue_order_strategy': 'priority'},
+        'task_default_priority': config['CELERY_PRIORITY_BULK'],
+        # Fetch one task at a time so a long job does not hold back queued ones
+        'worker_prefetch_multiplier': 1
+    }
+
+def get_celery():
+    global _celery
+    if _celery is None:
+        from celery import Celery
+        celery = Celery(__name__)
+        # Until create_app runs (e.g. in a worker), use the defaults from Config
+        celery.conf.update(_celery_config or celery_settings(vars(Config)))
+        metrics.connect_celery_signals()
+        _celery = celery
+    return _celery
+
+def get_mail():
+    global _mail
+    if _mail is None:
+        from flask_mail import Mail
+        _mail = Mail()
+    if has_app_context() and 'mail' not in current_app.extensions:
+        _mail.init_app(current_app._get_current_object())
+    return _mail
+
+def __getattr__(name):
+    if name == 'celery':
+        return get_celery()
+    if name == 'mail':
+        return get_mail()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
-    # Initialize MongoDB
-    client = MongoClient(app.config['MONGODB_URI'])
-    app.db = client.get_database()
+    # Initialize connection pools (created lazily in each process)
+    event_listeners = [metrics.MongoCommandListener()] if app.config['METRICS_ENABLED'] else []
+    slow_query_listener = None
+    if app.config['SLOW_QUERY_ENABLED'] and app.config['STORAGE_BACKEND'] == 'mongo':
+        slow_query_listener = SlowQueryListener(
+            threshold_ms=app.config['SLOW_QUERY_THRESHOLD_MS'],
+            explain_sample_rate=app.config['SLOW_QUERY_EXPLAIN_SAMPLE_RATE'],
+            explain_interval=app.config['SLOW_QUERY_EXPLAIN_INTERVAL']
+        )
+        event_listeners.append(slow_query_listener)
+    connections.init_app(app, event_listeners)
+    
+    # Initialize storage
+    if app.config['STORAGE_BACKEND'] not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {app.config['STORAGE_BACKEND']}")
+    if app.config['STORAGE_BACKEND'] == 'memory':
+        app.db = MemoryRepositories()
+    else:
+        app.db = ProcessLocal(lambda: MongoRepositories(connections.mongo_client.get_database()))
+    
+    # Ensure indexes
+    if app.config['MONGODB_ENSURE_INDEXES']:
+        app.db.ensure_indexes()
     
     # Initialize Redis
-    app.redis = Redis.from_url(app.config['REDIS_URL'])
+    app.redis = connections.redis(metrics.InstrumentedRedis if app.config['METRICS_ENABLED'] else Redis)
+    if slow_query_listener:
+        slow_query_listener.bind(connections, app.redis)
+    
+    # Initialize coupon cache
+    from .utils.coupon_cache import CouponCache
+    app.coupon_cache = CouponCache(
+        app.redis,
+        ttl=app.config['COUPON_CACHE_TTL'],
+        negative_ttl=app.config['COUPON_CACHE_NEGATIVE_TTL'],
+        max_size=app.config['COUPON_CACHE_MAX_SIZE']
+    )
     
     # Initialize extensions
     jwt.init_app(app)
     limiter.init_app(app)
     CORS(app)
-    mail.init_app(app)
+    password_hasher.init_app(app)
+    email_templates.init_app(app)
+    task_batching.init_app(app)
+    
+    limiter.request_filter(is_warmup_request)
     
-    # Configure Celery
-    celery.conf.update(app.config)
+    # Initialize request metrics
+    if app.config['METRICS_ENABLED']:
+        limiter.exempt(metrics.init_app(app, password_hasher, connections))
+    
+    # Configure Celery (applied when it is first used)
+    global _celery_config
+    _celery_config = celery_settings(app.config)
+    if _celery is not None:
+        _celery.conf.update(_celery_config)
     
     # Configure JWT
     app.config['JWT_SECRET_KEY'] = Config.JWT_SECRET_KEY
@@ -55,18 +168,20 @@ def create_app(config_class=Config):
     from .routes.orders import orders_bp
     from .routes.coupons import coupons_bp
     from .routes.cart import cart_bp
+    from .routes.admin import admin_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(products_bp, url_prefix='/api/products')
     app.register_blueprint(orders_bp, url_prefix='/api/orders')
     app.register_blueprint(coupons_bp, url_prefix='/api/coupons')
     app.register_blueprint(cart_bp, url_prefix='/api/cart')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
     
     # Token blacklist check
     @jwt.token_in_blocklist_loader
     def check_if_token_in_blacklist(jwt_header, jwt_data):
         jti = jwt_data['jti']
-        return app.db.token_blocklist.find_one({'jti': jti}) is not None
+        return app.db.token_blocklist.contains(jti)
     
     # Root route
     @app.route('/')
@@ -78,7 +193,8 @@ def create_app(config_class=Config):
                 'products': '/api/products',
                 'cart': '/api/cart',
                 'orders': '/api/orders',
-                'coupons': '/api/coupons'
+                'coupons': '/api/coupons',
+                'admin': '/api/admin'
             }
         })
     
@@ -92,8 +208,17 @@ def create_app(config_class=Config):
     def not_found_error(error):
         return {'error': 'Not found'}, 404
     
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(error):
+        return {'error': 'Server busy, please retry'}, 503, {'Retry-After': '1'}
+    
     @app.errorhandler(500)
     def internal_error(error):
         return {'error': 'Internal server error'}, 500
     
+    # Warm up pools and caches; /ready reports when this process is done
+    limiter.exempt(warmup.init_app(app))
+    if app.config['WARMUP_ON_STARTUP']:
+        warmup.start(app)
+    
     return app 
\ No newline at end of file
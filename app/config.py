@@ -8,11 +8,26 @@ class Config:
     # Flask
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
     
+    # Storage ('mongo' or 'memory')
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+    
     # MongoDB
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ecommerce')
+    MONGODB_ENSURE_INDEXES = os.getenv('MONGODB_ENSURE_INDEXES', 'True').lower() in ('true', '1', 't')
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 60000))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
     
     # Redis
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+    REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', 2))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 5))
+    REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 2))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
     
     # JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
@@ -24,8 +39,103 @@ class Config:
     AWS_SECRET_KEY = os.getenv('AWS_SECRET_KEY')
     AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME')
     
+    # Response cache (app/utils/response_cache.py)
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+    RESPONSE_CACHE_STALE_TTL = int(os.getenv('RESPONSE_CACHE_STALE_TTL', 300))
+    RESPONSE_CACHE_LOCK_TIMEOUT = int(os.getenv('RESPONSE_CACHE_LOCK_TIMEOUT', 5))
+    PRODUCT_CACHE_TTL = int(os.getenv('PRODUCT_CACHE_TTL', 60))
+    
+    # Coupon cache
+    COUPON_CACHE_TTL = int(os.getenv('COUPON_CACHE_TTL', 60))
+    COUPON_CACHE_NEGATIVE_TTL = int(os.getenv('COUPON_CACHE_NEGATIVE_TTL', 10))
+    COUPON_CACHE_MAX_SIZE = int(os.getenv('COUPON_CACHE_MAX_SIZE', 10000))
+    
+    # Bulk coupon generation
+    COUPON_BULK_MAX_COUNT = int(os.getenv('COUPON_BULK_MAX_COUNT', 1000000))
+    COUPON_BULK_BATCH_SIZE = int(os.getenv('COUPON_BULK_BATCH_SIZE', 5000))
+    COUPON_BULK_JOB_TTL = int(os.getenv('COUPON_BULK_JOB_TTL', 7 * 24 * 3600))
+    
+    # Password hashing
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 8))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+    
+    # Metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1', 't')
+    METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'False').lower() in ('true', '1', 't')
+    METRICS_MONGO_COMMANDS_WARNING = int(os.getenv('METRICS_MONGO_COMMANDS_WARNING', 20))
+    # /metrics is served to this bearer token, or to these addresses/networks (comma-separated)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1')
+    
+    # Slow query log
+    SLOW_QUERY_ENABLED = os.getenv('SLOW_QUERY_ENABLED', 'True').lower() in ('true', '1', 't')
+    SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+    SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 3600))
+    
+    # Startup warm-up
+    WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'True').lower() in ('true', '1', 't')
+    WARMUP_CONNECTIONS = int(os.getenv('WARMUP_CONNECTIONS', 4))
+    WARMUP_PRODUCT_PAGES = int(os.getenv('WARMUP_PRODUCT_PAGES', 3))
+    WARMUP_PER_PAGE = int(os.getenv('WARMUP_PER_PAGE', 10))
+    WARMUP_COUPONS = int(os.getenv('WARMUP_COUPONS', 500))
+    
+    # Startup budgets (checked by benchmarks/startup.py and at worker boot)
+    STARTUP_TIME_BUDGET_MS = int(os.getenv('STARTUP_TIME_BUDGET_MS', 1500))
+    WORKER_RSS_BUDGET_MB = int(os.getenv('WORKER_RSS_BUDGET_MB', 200))
+    
+    # Admin order search, export and bulk status updates
+    ORDER_SEARCH_MAX_LIMIT = int(os.getenv('ORDER_SEARCH_MAX_LIMIT', 200))
+    ORDER_EXPORT_BATCH_SIZE = int(os.getenv('ORDER_EXPORT_BATCH_SIZE', 1000))
+    ORDER_BULK_MAX_IDS = int(os.getenv('ORDER_BULK_MAX_IDS', 1000))
+    
+    # Sales analytics rollups (app/utils/analytics.py)
+    ANALYTICS_ENABLED = os.getenv('ANALYTICS_ENABLED', 'True').lower() in ('true', '1', 't')
+    ANALYTICS_BACKFILL_BATCH_SIZE = int(os.getenv('ANALYTICS_BACKFILL_BATCH_SIZE', 1000))
+    ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', 366))
+    
+    # Live operational stats in Redis (app/utils/live_stats.py)
+    LIVE_STATS_ENABLED = os.getenv('LIVE_STATS_ENABLED', 'True').lower() in ('true', '1', 't')
+    LIVE_STATS_BUCKET_SECONDS = int(os.getenv('LIVE_STATS_BUCKET_SECONDS', 10))
+    # Longest window that can be read; buckets expire after it
+    LIVE_STATS_RETENTION = int(os.getenv('LIVE_STATS_RETENTION', 3600))
+    LIVE_STATS_WINDOWS = os.getenv('LIVE_STATS_WINDOWS', '60,300,900,3600')
+    
+    # Related products from order co-occurrence (app/utils/recommendations.py)
+    RECOMMENDATIONS_ENABLED = os.getenv('RECOMMENDATIONS_ENABLED', 'True').lower() in ('true', '1', 't')
+    RECOMMENDATIONS_TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', 10))
+    RECOMMENDATIONS_MIN_COUNT = int(os.getenv('RECOMMENDATIONS_MIN_COUNT', 2))
+    # Orders with more distinct products than this are not counted
+    RECOMMENDATIONS_MAX_BASKET = int(os.getenv('RECOMMENDATIONS_MAX_BASKET', 50))
+    RECOMMENDATIONS_REFRESH_SECONDS = int(os.getenv('RECOMMENDATIONS_REFRESH_SECONDS', 900))
+    RECOMMENDATIONS_REBUILD_BATCH_SIZE = int(os.getenv('RECOMMENDATIONS_REBUILD_BATCH_SIZE', 1000))
+    
+    # Catalog repricing (app/utils/repricing.py)
+    REPRICING_BATCH_SIZE = int(os.getenv('REPRICING_BATCH_SIZE', 1000))
+    # Changes listed in a dry run
+    REPRICING_DIFF_LIMIT = int(os.getenv('REPRICING_DIFF_LIMIT', 500))
+    
+    # Idempotency
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 10))
+    
     # Rate Limiting
     RATELIMIT_DEFAULT = "200 per day"
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'True').lower() in ('true', '1', 't')
+    # Weights the previous window's hits by its overlap, so a burst cannot straddle two windows
+    RATELIMIT_STRATEGY = 'sliding-window-counter'
+    # Count in process and sync to Redis in batches (app/utils/rate_limit.py)
+    RATELIMIT_LOCAL_FIRST = os.getenv('RATELIMIT_LOCAL_FIRST', 'True').lower() in ('true', '1', 't')
+    RATELIMIT_SYNC_INTERVAL = float(os.getenv('RATELIMIT_SYNC_INTERVAL', 0.25))
+    # Unsynced hits a process may hold per key; bounds the overshoot to (processes - 1) * this
+    RATELIMIT_SYNC_MAX_PENDING = int(os.getenv('RATELIMIT_SYNC_MAX_PENDING', 5))
+    # Per-route limits
+    RATELIMIT_LOGIN = os.getenv('RATELIMIT_LOGIN', '10 per minute;50 per hour')
+    RATELIMIT_REGISTER = os.getenv('RATELIMIT_REGISTER', '5 per minute;20 per hour')
+    RATELIMIT_COUPON_VALIDATE = os.getenv('RATELIMIT_COUPON_VALIDATE', '30 per minute')
+    RATELIMIT_CATALOG = os.getenv('RATELIMIT_CATALOG', '600 per minute')
     
     # CORS
     CORS_HEADERS = 'Content-Type'
@@ -33,6 +143,19 @@ class Config:
     # Celery
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/1')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/2')
+    CELERY_BROKER_POOL_LIMIT = int(os.getenv('CELERY_BROKER_POOL_LIMIT', 10))
+    CELERY_BROKER_CONNECTION_TIMEOUT = float(os.getenv('CELERY_BROKER_CONNECTION_TIMEOUT', 4))
+    CELERY_REDIS_MAX_CONNECTIONS = int(os.getenv('CELERY_REDIS_MAX_CONNECTIONS', 20))
+    # Queues and priorities (0 is the highest); see celery_settings in app/__init__.py
+    CELERY_QUEUE_DEFAULT = os.getenv('CELERY_QUEUE_DEFAULT', 'default')
+    CELERY_QUEUE_EMAIL = os.getenv('CELERY_QUEUE_EMAIL', 'email')
+    CELERY_QUEUE_BULK = os.getenv('CELERY_QUEUE_BULK', 'bulk')
+    CELERY_QUEUE_MAINTENANCE = os.getenv('CELERY_QUEUE_MAINTENANCE', 'maintenance')
+    CELERY_PRIORITY_EMAIL = int(os.getenv('CELERY_PRIORITY_EMAIL', 0))
+    CELERY_PRIORITY_BULK = int(os.getenv('CELERY_PRIORITY_BULK', 5))
+    CELERY_PRIORITY_MAINTENANCE = int(os.getenv('CELERY_PRIORITY_MAINTENANCE', 9))
+    # Items per task when small enqueues are batched (app/utils/task_batching.py)
+    CELERY_BATCH_SIZE = int(os.getenv('CELERY_BATCH_SIZE', 100))
     
     # Mail
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -40,4 +163,9 @@ class Config:
     MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'True').lower() in ('true', '1', 't')
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
-    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER') 
\ No newline at end of file
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+    MAIL_SUPPRESS_SEND = os.getenv('MAIL_SUPPRESS_SEND', 'False').lower() in ('true', '1', 't') 
+    # Messages sent over one SMTP connection before reconnecting
+    MAIL_MAX_EMAILS = int(os.getenv('MAIL_MAX_EMAILS', 100))
+    # Rendered order item lines kept per process (app/utils/email_templates.py)
+    EMAIL_FRAGMENT_CACHE_SIZE = int(os.getenv('EMAIL_FRAGMENT_CACHE_SIZE', 4096))
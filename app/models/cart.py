@@ -1,5 +1,5 @@
 from datetime import datetime
-from bson import ObjectId
+from .product import Product
 
 class CartItem:
     def __init__(self, product_id, quantity):
@@ -44,7 +44,7 @@ class Cart:
     
     @staticmethod
     def get_by_user_id(db, user_id):
-        cart_data = db.carts.find_one({'user_id': user_id})
+        cart_data = db.carts.get_by_user(user_id)
         if cart_data:
             return Cart.from_dict(cart_data)
         return None
@@ -75,16 +75,13 @@ class Cart:
     
     def save(self, db):
         cart_data = self.to_dict()
-        db.carts.update_one(
-            {'user_id': self.user_id},
-            {'$set': cart_data},
-            upsert=True
-        )
+        db.carts.save(self.user_id, cart_data)
     
     def get_total(self, db):
+        products = Product.get_many(db, [item.product_id for item in self.items])
         total = 0
         for item in self.items:
-            product = Product.get_by_id(db, item.product_id)
+            product = products.get(str(item.product_id))
             if product:
                 total += product.price * item.quantity
-        return total 
\ No newline at end of file
+        return total
\ No newline at end of file
@@ -1,12 +1,13 @@
 from datetime import datetime
-from bson import ObjectId
 
 class Coupon:
     def __init__(self, code, discount_type, discount_value, min_purchase=0, 
                  max_discount=None, start_date=None, end_date=None, 
-                 usage_limit=None, used_count=0):
+                 usage_limit=None, used_count=0, per_user_limit=None, batch_id=None,
+                 categories=None, product_ids=None, buy_quantity=None, get_quantity=None,
+                 stackable=False, version=0):
         self.code = code
-        self.discount_type = discount_type  # 'percentage' or 'fixed'
+        self.discount_type = discount_type  # 'percentage', 'fixed' or 'bogo'
         self.discount_value = discount_value
         self.min_purchase = min_purchase
         self.max_discount = max_discount
@@ -14,6 +15,14 @@ class Coupon:
         self.end_date = end_date
         self.usage_limit = usage_limit
         self.used_count = used_count
+        self.per_user_limit = per_user_limit
+        self.batch_id = batch_id
+        self.categories = categories or []  # Restrict to these categories
+        self.product_ids = product_ids or []  # Restrict to these products
+        self.buy_quantity = buy_quantity  # BOGO: buy this many...
+        self.get_quantity = get_quantity  # ...and get this many discounted
+        self.stackable = stackable
+        self.version = version
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
     
@@ -28,6 +37,14 @@ class Coupon:
             'end_date': self.end_date,
             'usage_limit': self.usage_limit,
             'used_count': self.used_count,
+            'per_user_limit': self.per_user_limit,
+            'batch_id': self.batch_id,
+            'categories': self.categories,
+            'product_ids': self.product_ids,
+            'buy_quantity': self.buy_quantity,
+            'get_quantity': self.get_quantity,
+            'stackable': self.stackable,
+            'version': self.version,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
@@ -43,7 +60,15 @@ class Coupon:
             start_date=data.get('start_date'),
             end_date=data.get('end_date'),
             usage_limit=data.get('usage_limit'),
-            used_count=data.get('used_count', 0)
+            used_count=data.get('used_count', 0),
+            per_user_limit=data.get('per_user_limit'),
+            batch_id=data.get('batch_id'),
+            categories=data.get('categories'),
+            product_ids=data.get('product_ids'),
+            buy_quantity=data.get('buy_quantity'),
+            get_quantity=data.get('get_quantity'),
+            stackable=data.get('stackable', False),
+            version=data.get('version', 0)
         )
         coupon.created_at = data['created_at']
         coupon.updated_at = data['updated_at']
@@ -51,7 +76,7 @@ class Coupon:
     
     @staticmethod
     def get_by_code(db, code):
-        coupon_data = db.coupons.find_one({'code': code})
+        coupon_data = db.coupons.get(code)
         if coupon_data:
             return Coupon.from_dict(coupon_data)
         return None
@@ -89,24 +114,87 @@ class Coupon:
             return self.discount_value
     
     def increment_usage(self, db):
-        self.used_count += 1
         self.updated_at = datetime.utcnow()
-        db.coupons.update_one(
-            {'code': self.code},
-            {'$set': {'used_count': self.used_count, 'updated_at': self.updated_at}}
-        )
+        used_count = db.coupons.increment_used(self.code, self.updated_at)
+        if used_count is not None:
+            self.used_count = used_count
+    
+    def redeem(self, db, user_id):
+        """
+        Atomically redeem the coupon for a user.
+        
+        The usage limit, validity window and per-user limit are enforced by
+        the storage engine in conditional updates, so concurrent checkouts can never
+        push `used_count` past `usage_limit`.
+        
+        Returns:
+            bool: True if the coupon was redeemed, False if a limit was reached
+        """
+        now = datetime.utcnow()
+        
+        # Claim a per-user slot first
+        if not db.coupons.claim_redemption(self.code, user_id, self.per_user_limit, now):
+            return False
+        
+        used_count = db.coupons.redeem(self.code, now)
+        if used_count is None:
+            # Give the per-user slot back
+            db.coupons.release_redemption(self.code, user_id, now)
+            return False
+        
+        self.used_count = used_count
+        self.updated_at = now
+        return True
+    
+    def release(self, db, user_id):
+        """Undo a redemption, e.g. when the order it was made for fails."""
+        now = datetime.utcnow()
+        db.coupons.release(self.code, now)
+        db.coupons.release_redemption(self.code, user_id, now)
+    
+    @staticmethod
+    def get_used_count(db, code):
+        return db.coupons.get_used_count(code)
+    
+    @staticmethod
+    def get_redemption_count(db, code, user_id):
+        return db.coupons.get_redemption_count(code, user_id)
     
     def save(self, db):
+        self.version += 1
         coupon_data = self.to_dict()
-        db.coupons.update_one(
-            {'code': self.code},
-            {'$set': coupon_data},
-            upsert=True
-        )
+        # used_count is only changed through atomic increments
+        used_count = coupon_data.pop('used_count')
+        db.coupons.save(self.code, coupon_data, insert_fields={'used_count': used_count})
+    
+    @staticmethod
+    def iter_codes(db, prefix='', batch_size=10000):
+        return db.coupons.iter_codes(prefix, batch_size)
+    
+    @staticmethod
+    def count_codes(db, prefix=''):
+        return db.coupons.count_codes(prefix)
+    
+    @staticmethod
+    def iter_batch_codes(db, batch_id, batch_size=10000):
+        return db.coupons.iter_batch_codes(batch_id, batch_size)
+    
+    @staticmethod
+    def insert_many(db, coupons):
+        """
+        Insert new coupons, skipping codes that already exist.
+        
+        Returns:
+            set: Codes that were actually inserted
+        """
+        return db.coupons.insert_many([coupon.to_dict() for coupon in coupons])
+    
+    def delete(self, db):
+        db.coupons.delete(self.code)
     
     @staticmethod
     def get_all(db, page=1, per_page=10):
         skip = (page - 1) * per_page
-        coupons = list(db.coupons.find().skip(skip).limit(per_page))
-        total = db.coupons.count_documents({})
+        coupons = db.coupons.list(skip, per_page)
+        total = db.coupons.count()
         return [Coupon.from_dict(coupon) for coupon in coupons], total 
\ No newline at end of file
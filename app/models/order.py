@@ -1,17 +1,22 @@
 from datetime import datetime
+from .product import Product
 from bson import ObjectId
+import base64
+import json
 
 class OrderItem:
-    def __init__(self, product_id, quantity, price):
+    def __init__(self, product_id, quantity, price, discount=0):
         self.product_id = product_id
         self.quantity = quantity
         self.price = price
+        self.discount = discount
     
     def to_dict(self):
         return {
             'product_id': self.product_id,
             'quantity': self.quantity,
-            'price': self.price
+            'price': self.price,
+            'discount': self.discount
         }
     
     @staticmethod
@@ -19,7 +24,8 @@ class OrderItem:
         return OrderItem(
             product_id=data['product_id'],
             quantity=data['quantity'],
-            price=data['price']
+            price=data['price'],
+            discount=data.get('discount', 0)
         )
 
 class Order:
@@ -29,14 +35,38 @@ class Order:
     STATUS_DELIVERED = 'delivered'
     STATUS_CANCELLED = 'cancelled'
     
-    def __init__(self, user_id, items, total_amount, shipping_address):
+    # Statuses an order may move to from each status
+    ALLOWED_TRANSITIONS = {
+        STATUS_PENDING: {STATUS_PROCESSING, STATUS_SHIPPED, STATUS_CANCELLED},
+        STATUS_PROCESSING: {STATUS_SHIPPED, STATUS_CANCELLED},
+        STATUS_SHIPPED: {STATUS_DELIVERED},
+        STATUS_DELIVERED: set(),
+        STATUS_CANCELLED: set()
+    }
+    
+    # Outcomes of bulk_update_status, per order
+    OUTCOME_UPDATED = 'updated'
+    OUTCOME_UNCHANGED = 'unchanged'
+    OUTCOME_NOT_FOUND = 'not_found'
+    OUTCOME_INVALID_TRANSITION = 'invalid_transition'
+    OUTCOME_CONFLICT = 'conflict'
+    OUTCOME_INVALID_ID = 'invalid_id'
+    
+    def __init__(self, user_id, items, total_amount, shipping_address,
+                 coupon_codes=None, discount=0):
         self.user_id = user_id
         self.items = items
         self.total_amount = total_amount
         self.shipping_address = shipping_address
+        self.coupon_codes = coupon_codes or []
+        self.discount = discount
         self.status = self.STATUS_PENDING
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
+        self.rollup_status = None
+        self.rollup_previous = None
+        self.rollup_claim = None
+        self.rollup_claimed_at = None
     
     def to_dict(self):
         return {
@@ -44,6 +74,8 @@ class Order:
             'items': [item.to_dict() for item in self.items],
             'total_amount': self.total_amount,
             'shipping_address': self.shipping_address,
+            'coupon_codes': self.coupon_codes,
+            'discount': self.discount,
             'status': self.status,
             'created_at': self.created_at,
             'updated_at': self.updated_at
@@ -55,27 +87,92 @@ class Order:
             user_id=data['user_id'],
             items=[OrderItem.from_dict(item) for item in data['items']],
             total_amount=data['total_amount'],
-            shipping_address=data['shipping_address']
+            shipping_address=data['shipping_address'],
+            coupon_codes=data.get('coupon_codes'),
+            discount=data.get('discount', 0)
         )
         order.status = data['status']
         order.created_at = data['created_at']
         order.updated_at = data['updated_at']
+        # Status the sales rollups count this order under (app/utils/analytics.py)
+        order.rollup_status = data.get('rollup_status')
+        # Set while a reconcile is moving the rollups from rollup_previous to rollup_status
+        order.rollup_previous = data.get('rollup_previous')
+        order.rollup_claim = data.get('rollup_claim')
+        order.rollup_claimed_at = data.get('rollup_claimed_at')
+        if '_id' in data:
+            order._id = data['_id']
         return order
     
     @staticmethod
     def get_by_id(db, order_id):
-        order_data = db.orders.find_one({'_id': ObjectId(order_id)})
+        order_data = db.orders.get(order_id)
         if order_data:
             return Order.from_dict(order_data)
         return None
     
+    @staticmethod
+    def get_many(db, order_ids):
+        """
+        Fetch several orders in one query.
+        
+        Returns:
+            dict: Order id (str) -> Order
+        """
+        orders = db.orders.get_many(order_ids)
+        return {str(order['_id']): Order.from_dict(order) for order in orders}
+    
     @staticmethod
     def get_by_user_id(db, user_id, page=1, per_page=10):
         skip = (page - 1) * per_page
-        orders = list(db.orders.find({'user_id': user_id}).skip(skip).limit(per_page))
-        total = db.orders.count_documents({'user_id': user_id})
+        orders = db.orders.list_by_user(user_id, skip, per_page)
+        total = db.orders.count_by_user(user_id)
         return [Order.from_dict(order) for order in orders], total
     
+    @staticmethod
+    def search(db, filters, cursor=None, limit=50):
+        """
+        Search orders across users, newest first, a page at a time.
+        
+        Args:
+            db: Repositories
+            filters (dict): status, user_id, created_from, created_to, min_total
+            cursor (str, optional): `next_cursor` returned for the previous page
+            limit (int): Page size
+        
+        Returns:
+            tuple: (list of Orders, cursor for the next page or None)
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        after = Order.decode_cursor(cursor) if cursor else None
+        orders = [Order.from_dict(order) for order in db.orders.search(filters, after, limit + 1)]
+        next_cursor = Order.encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+        return orders[:limit], next_cursor
+    
+    @staticmethod
+    def iter_search(db, filters, batch_size=1000):
+        """Stream every order matching `filters`, oldest first, without loading them all."""
+        for order_data in db.orders.iter_search(filters, batch_size):
+            yield Order.from_dict(order_data)
+    
+    @staticmethod
+    def encode_cursor(order):
+        position = json.dumps([order.created_at.isoformat(), str(order._id)])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+        if not ObjectId.is_valid(order_id):
+            raise ValueError('Invalid cursor')
+        return created_at, order_id
+    
     def update_status(self, db, new_status):
         if new_status not in [self.STATUS_PENDING, self.STATUS_PROCESSING, 
                             self.STATUS_SHIPPED, self.STATUS_DELIVERED, 
@@ -84,36 +181,105 @@ class Order:
         
         self.status = new_status
         self.updated_at = datetime.utcnow()
-        db.orders.update_one(
-            {'_id': ObjectId(self._id)},
-            {'$set': {'status': self.status, 'updated_at': self.updated_at}}
-        )
+        db.orders.update(self._id, {'status': self.status, 'updated_at': self.updated_at})
+    
+    @staticmethod
+    def bulk_update_status(db, order_ids, new_status):
+        """
+        Move many orders to `new_status` with one bulk write.
+        
+        Each order is only moved if ALLOWED_TRANSITIONS permits it from its
+        current status, and only if that status has not changed between the
+        read and the write (otherwise its outcome is OUTCOME_CONFLICT).
+        
+        Returns:
+            tuple: (dict of order id -> (outcome, status), list of updated Orders)
+        """
+        if new_status not in Order.ALLOWED_TRANSITIONS:
+            raise ValueError('Invalid status')
+        
+        orders = Order.get_many(db, order_ids)
+        # Stored dates keep millisecond precision; match what reads will return
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        
+        outcomes = {}
+        candidates = []
+        for order_id in map(str, order_ids):
+            if order_id in outcomes:
+                continue
+            order = orders.get(order_id)
+            if order is None:
+                outcomes[order_id] = (Order.OUTCOME_NOT_FOUND, None)
+            elif order.status == new_status:
+                outcomes[order_id] = (Order.OUTCOME_UNCHANGED, order.status)
+            elif new_status not in Order.ALLOWED_TRANSITIONS[order.status]:
+                outcomes[order_id] = (Order.OUTCOME_INVALID_TRANSITION, order.status)
+            else:
+                outcomes[order_id] = (Order.OUTCOME_UPDATED, new_status)
+                candidates.append(order)
+        
+        modified = db.orders.bulk_update([
+            (order._id, {'status': order.status}, {'status': new_status, 'updated_at': now})
+            for order in candidates
+        ])
+        
+        if modified < len(candidates):
+            # Some orders changed status concurrently; find out which writes landed
+            current = Order.get_many(db, [order._id for order in candidates])
+            landed = []
+            for order in candidates:
+                stored = current.get(str(order._id))
+                if stored and stored.status == new_status and stored.updated_at == now:
+                    landed.append(order)
+                else:
+                    outcomes[str(order._id)] = (Order.OUTCOME_CONFLICT, stored.status if stored else None)
+            candidates = landed
+        
+        for order in candidates:
+            order.status = new_status
+            order.updated_at = now
+        return outcomes, candidates
     
     def save(self, db):
         order_data = self.to_dict()
-        result = db.orders.insert_one(order_data)
-        return str(result.inserted_id)
+        self._id = db.orders.insert(order_data)
+        return str(self._id)
+    
+    @staticmethod
+    def create_from_cart(db, user_id, cart, shipping_address, coupon_codes=None, item_discounts=None):
+        order = Order.place_from_cart(db, user_id, cart, shipping_address, coupon_codes, item_discounts)
+        return str(order._id)
     
     @staticmethod
-    def create_from_cart(db, user_id, cart, shipping_address):
+    def place_from_cart(db, user_id, cart, shipping_address, coupon_codes=None, item_discounts=None):
+        """Like create_from_cart, but returns the saved Order."""
         items = []
         total_amount = 0
+        discount = 0
+        item_discounts = item_discounts or {}
+        products = Product.get_many(db, [cart_item.product_id for cart_item in cart.items])
         
         for cart_item in cart.items:
-            product = Product.get_by_id(db, cart_item.product_id)
+            product = products.get(str(cart_item.product_id))
             if product and product.stock >= cart_item.quantity:
+                item_discount = item_discounts.get(str(cart_item.product_id), 0)
                 items.append(OrderItem(
                     product_id=product._id,
                     quantity=cart_item.quantity,
-                    price=product.price
+                    price=product.price,
+                    discount=item_discount
                 ))
                 total_amount += product.price * cart_item.quantity
+                discount += item_discount
                 product.update_stock(db, -cart_item.quantity)
             else:
-                raise ValueError(f'Insufficient stock for product {product.name}')
+                name = product.name if product else cart_item.product_id
+                raise ValueError(f'Insufficient stock for product {name}')
         
-        order = Order(user_id, items, total_amount, shipping_address)
-        order_id = order.save(db)
+        total_amount = round(max(total_amount - discount, 0), 2)
+        order = Order(user_id, items, total_amount, shipping_address, coupon_codes, round(discount, 2))
+        order.save(db)
         cart.clear()
         cart.save(db)
-        return order_id 
\ No newline at end of file
+        return order
\ No newline at end of file
@@ -1,5 +1,4 @@
 from datetime import datetime
-from bson import ObjectId
 
 class Product:
     def __init__(self, name, description, price, category, stock, image_url=None):
@@ -42,40 +41,42 @@ class Product:
     
     @staticmethod
     def get_by_id(db, product_id):
-        product_data = db.products.find_one({'_id': ObjectId(product_id)})
+        product_data = db.products.get(product_id)
         if product_data:
             return Product.from_dict(product_data)
         return None
     
+    @staticmethod
+    def get_many(db, product_ids):
+        """
+        Fetch several products in one query.
+        
+        Returns:
+            dict: Product id (str) -> Product
+        """
+        products = db.products.get_many(product_ids)
+        return {str(product['_id']): Product.from_dict(product) for product in products}
+    
     @staticmethod
     def get_all(db, page=1, per_page=10):
         skip = (page - 1) * per_page
-        query = {}
-        
-        products = list(db.products.find(query).skip(skip).limit(per_page))
-        total = db.products.count_documents(query)
+        products = db.products.list(skip, per_page)
+        total = db.products.count()
         
         return [Product.from_dict(product) for product in products], total
     
     def save(self, db):
         product_data = self.to_dict()
         if hasattr(self, '_id'):
-            db.products.update_one(
-                {'_id': ObjectId(self._id)},
-                {'$set': product_data}
-            )
+            db.products.update(self._id, product_data)
         else:
-            result = db.products.insert_one(product_data)
-            self._id = result.inserted_id
+            self._id = db.products.insert(product_data)
     
     def delete(self, db):
         if hasattr(self, '_id'):
-            db.products.delete_one({'_id': ObjectId(self._id)})
+            db.products.delete(self._id)
     
     def update_stock(self, db, quantity):
         self.stock += quantity
         self.updated_at = datetime.utcnow()
-        db.products.update_one(
-            {'_id': ObjectId(self._id)},
-            {'$set': {'stock': self.stock, 'updated_at': self.updated_at.isoformat()}}
-        ) 
\ No newline at end of file
+        db.products.increment(self._id, 'stock', quantity, {'updated_at': self.updated_at.isoformat()}) 
\ No newline at end of file
@@ -1,11 +1,11 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from bson import ObjectId
+from ..utils.passwords import password_hasher
 
 class User:
     def __init__(self, email, password, name, role='customer'):
         self.email = email
         self.password = password  # Store plain password temporarily
+        self._password_changed = True
         self.name = name
         self.role = role
         self.created_at = datetime.utcnow()
@@ -29,46 +29,70 @@ class User:
             role=data.get('role', 'customer')
         )
         user.password = data['password']  # This is already hashed
+        user._password_changed = False
         user.created_at = datetime.fromisoformat(data.get('created_at', datetime.utcnow().isoformat()))
         user.updated_at = datetime.fromisoformat(data.get('updated_at', datetime.utcnow().isoformat()))
         if '_id' in data:
             user._id = data['_id']
         return user
     
+    def set_password(self, password):
+        self.password = password  # Plain password, hashed on the next save()/update()
+        self._password_changed = True
+    
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
+    
+    def needs_rehash(self):
+        return password_hasher.needs_rehash(self.password)
+    
+    def rehash_password(self, db, password):
+        """Store a fresh hash of the verified plain password with the current cost."""
+        self.password = password_hasher.hash(password)
+        self._password_changed = False
+        db.users.update(self._id, {'password': self.password})
+    
+    def _hash_changed_password(self, user_data):
+        # Only hash when the password was actually changed
+        if self._password_changed and self.password:
+            self.password = password_hasher.hash(self.password)
+            self._password_changed = False
+            user_data['password'] = self.password
     
     @staticmethod
     def get_by_id(db, user_id):
-        user_data = db.users.find_one({'_id': ObjectId(user_id)})
+        user_data = db.users.get(user_id)
         if user_data:
             return User.from_dict(user_data)
         return None
     
+    @staticmethod
+    def get_many(db, user_ids):
+        """
+        Fetch several users in one query.
+        
+        Returns:
+            dict: User id (str) -> User
+        """
+        users = db.users.get_many(user_ids)
+        return {str(user['_id']): User.from_dict(user) for user in users}
+    
     @staticmethod
     def get_by_email(db, email):
-        user_data = db.users.find_one({'email': email})
+        user_data = db.users.get_by_email(email)
         if user_data:
             return User.from_dict(user_data)
         return None
     
     def save(self, db):
         user_data = self.to_dict()
-        user_data['password'] = generate_password_hash(self.password)
+        self._hash_changed_password(user_data)
         if hasattr(self, '_id'):
-            db.users.update_one(
-                {'_id': ObjectId(self._id)},
-                {'$set': user_data}
-            )
+            db.users.update(self._id, user_data)
         else:
-            result = db.users.insert_one(user_data)
-            self._id = result.inserted_id
+            self._id = db.users.insert(user_data)
     
     def update(self, db):
         user_data = self.to_dict()
-        if hasattr(self, 'password') and self.password:
-            user_data['password'] = generate_password_hash(self.password)
-        db.users.update_one(
-            {'_id': ObjectId(self._id)},
-            {'$set': user_data}
-        ) 
\ No newline at end of file
+        self._hash_changed_password(user_data)
+        db.users.update(self._id, user_data) 
\ No newline at end of file
@@ -0,0 +1,8 @@
+from .base import (
+    ProductRepository, UserRepository, CartRepository, OrderRepository,
+    CouponRepository, TokenBlocklistRepository, AnalyticsRepository, Repositories
+)
+from .memory import MemoryRepositories
+from .mongo import MongoRepositories
+
+STORAGE_BACKENDS = ('mongo', 'memory')
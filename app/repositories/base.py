@@ -0,0 +1,310 @@
+from abc import ABC, abstractmethod
+
+
+class ProductRepository(ABC):
+    """Storage for catalog products. Documents are plain dicts keyed by `_id`."""
+
+    @abstractmethod
+    def get(self, product_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_many(self, product_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, skip=0, limit=10):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert(self, document):
+        """Insert a product and return its new id."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, product_id, fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    def increment(self, product_id, field, amount, fields=None):
+        """Atomically add `amount` to a numeric field, setting `fields` alongside."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_prices(self, categories=None, batch_size=1000):
+        """
+        `_id`, `category` and `price` of every product, optionally only in
+        `categories`, in `_id` order and fetched `batch_size` at a time.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_update(self, updates):
+        """
+        Apply many conditional updates in one round trip.
+
+        `updates` is a list of (product_id, conditions, fields), as for
+        OrderRepository.bulk_update. Returns the number of products modified.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, product_id):
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    def get(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_many(self, user_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_by_email(self, email):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert(self, document):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, user_id, fields):
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+
+class CartRepository(ABC):
+    @abstractmethod
+    def get_by_user(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def save(self, user_id, document):
+        """Create or replace the fields of a user's cart."""
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+
+class OrderRepository(ABC):
+    @abstractmethod
+    def get(self, order_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_many(self, order_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_by_user(self, user_id, skip=0, limit=10):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_by_user(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, filters, after=None, limit=50):
+        """
+        Orders matching `filters`, newest first.
+
+        `filters` may hold status, user_id, created_from and created_to
+        (datetimes, end exclusive) and min_total. `after` is the
+        (created_at, order id) of the last order on the previous page.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_search(self, filters, batch_size=1000):
+        """Every order matching `filters`, oldest first, fetched `batch_size` at a time."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert(self, document):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, order_id, fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_update(self, updates):
+        """
+        Apply many conditional updates in one round trip.
+
+        `updates` is a list of (order_id, conditions, fields): `fields` are set
+        on the order only if it still matches `conditions`. Returns the number
+        of orders modified.
+        """
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+
+class CouponRepository(ABC):
+    """
+    Storage for coupons and per-user redemption counters.
+
+    `redeem` and `claim_redemption` must be atomic: they are what keeps usage
+    limits intact under concurrent checkouts.
+    """
+
+    @abstractmethod
+    def get(self, code):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_used_count(self, code):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, skip=0, limit=10):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_active(self, now, limit=100):
+        """Coupons inside their validity window at `now`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def save(self, code, fields, insert_fields=None):
+        """Upsert a coupon; `insert_fields` are only written when it is created."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_many(self, documents):
+        """Insert new coupons, skipping existing codes. Returns the set of inserted codes."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, code):
+        """Delete a coupon together with its redemption counters."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def increment_used(self, code, now):
+        """Unconditionally count one use. Returns the new used_count or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def redeem(self, code, now):
+        """
+        Count one use if the coupon is inside its validity window and below its
+        usage limit. Returns the new used_count, or None if nothing was counted.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, code, now):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_redemption(self, code, user_id, per_user_limit, now):
+        """Count one redemption for a user unless that reaches per_user_limit. Returns bool."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_redemption(self, code, user_id, now):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_redemption_count(self, code, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_codes(self, prefix='', batch_size=10000):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_codes(self, prefix=''):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_batch_codes(self, batch_id, batch_size=10000):
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+
+class TokenBlocklistRepository(ABC):
+    @abstractmethod
+    def add(self, jti, blocklisted_at):
+        raise NotImplementedError
+
+    @abstractmethod
+    def contains(self, jti):
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+
+class AnalyticsRepository(ABC):
+    """
+    Pre-aggregated sales rollups, one document per (kind, day, key).
+
+    `kind` is what the rollup is grouped by (e.g. 'product' or 'category'),
+    `day` an ISO date and `key` the product id, category or coupon code.
+    """
+
+    @abstractmethod
+    def increment(self, rollups):
+        """
+        Add to rollup counters, creating missing rollups, in one round trip.
+
+        `rollups` maps (kind, day, key) to a dict of field -> amount.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, kind, day_from, day_to, key=None):
+        """Rollups of `kind` from `day_from` to `day_to` (inclusive), by day."""
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+
+class Repositories:
+    """
+    The application's data store, available as `app.db`.
+
+    Models receive this object and go through its repositories rather than a
+    database driver, so the storage engine can be swapped (see
+    STORAGE_BACKEND) and caching can be layered in one place.
+    """
+
+    def __init__(self, products, users, carts, orders, coupons, token_blocklist, analytics):
+        self.products = products
+        self.users = users
+        self.carts = carts
+        self.orders = orders
+        self.coupons = coupons
+        self.token_blocklist = token_blocklist
+        self.analytics = analytics
+
+    def repositories(self):
+        return [self.products, self.users, self.carts, self.orders, self.coupons, self.token_blocklist, self.analytics]
+
+    def ensure_indexes(self):
+        for repository in self.repositories():
+            repository.ensure_indexes()
@@ -0,0 +1,370 @@
+"""
+In-process storage engine.
+
+Documents live in dicts indexed the same way as the Mongo collections and are
+copied on the way in and out, so callers can never mutate stored state. Each
+repository guards its data with a lock, which makes the conditional updates
+(`redeem`, `claim_redemption`) atomic within the process. State is not shared
+between worker processes; use it for tests, benchmarks and local development.
+"""
+from copy import deepcopy
+from threading import RLock
+from bson import ObjectId
+from .base import (
+    ProductRepository, UserRepository, CartRepository, OrderRepository,
+    CouponRepository, TokenBlocklistRepository, AnalyticsRepository, Repositories
+)
+
+
+class _DocumentStore:
+    """Documents keyed by `_id`, in insertion order."""
+
+    def __init__(self):
+        self._lock = RLock()
+        self._documents = {}
+
+    def _insert(self, document):
+        document = deepcopy(document)
+        document.setdefault('_id', ObjectId())
+        self._documents[str(document['_id'])] = document
+        return document['_id']
+
+    def _get(self, document_id):
+        document = self._documents.get(str(document_id))
+        return deepcopy(document) if document else None
+
+    def _update(self, document_id, fields):
+        document = self._documents.get(str(document_id))
+        if document:
+            document.update(deepcopy(fields))
+
+
+class MemoryProductRepository(_DocumentStore, ProductRepository):
+    def get(self, product_id):
+        with self._lock:
+            return self._get(product_id)
+
+    def get_many(self, product_ids):
+        with self._lock:
+            documents = (self._documents.get(product_id) for product_id in set(map(str, product_ids)))
+            return [deepcopy(document) for document in documents if document]
+
+    def list(self, skip=0, limit=10):
+        with self._lock:
+            return [deepcopy(document) for document in list(self._documents.values())[skip:skip + limit]]
+
+    def count(self):
+        return len(self._documents)
+
+    def insert(self, document):
+        with self._lock:
+            return self._insert(document)
+
+    def update(self, product_id, fields):
+        with self._lock:
+            self._update(product_id, fields)
+
+    def increment(self, product_id, field, amount, fields=None):
+        with self._lock:
+            document = self._documents.get(str(product_id))
+            if document:
+                document[field] = document.get(field, 0) + amount
+                document.update(deepcopy(fields or {}))
+
+    def iter_prices(self, categories=None, batch_size=1000):
+        with self._lock:
+            documents = [
+                {'_id': document['_id'], 'category': document.get('category'), 'price': document.get('price')}
+                for document in self._documents.values()
+                if not categories or document.get('category') in categories
+            ]
+        yield from documents
+
+    def bulk_update(self, updates):
+        modified = 0
+        with self._lock:
+            for product_id, conditions, fields in updates:
+                document = self._documents.get(str(product_id))
+                if document and all(document.get(key) == value for key, value in conditions.items()):
+                    document.update(deepcopy(fields))
+                    modified += 1
+        return modified
+
+    def delete(self, product_id):
+        with self._lock:
+            self._documents.pop(str(product_id), None)
+
+
+class MemoryUserRepository(_DocumentStore, UserRepository):
+    def get(self, user_id):
+        with self._lock:
+            return self._get(user_id)
+
+    def get_many(self, user_ids):
+        with self._lock:
+            documents = (self._documents.get(user_id) for user_id in set(map(str, user_ids)))
+            return [deepcopy(document) for document in documents if document]
+
+    def get_by_email(self, email):
+        with self._lock:
+            for document in self._documents.values():
+                if document.get('email') == email:
+                    return deepcopy(document)
+            return None
+
+    def insert(self, document):
+        with self._lock:
+            return self._insert(document)
+
+    def update(self, user_id, fields):
+        with self._lock:
+            self._update(user_id, fields)
+
+
+class MemoryCartRepository(CartRepository):
+    def __init__(self):
+        self._lock = RLock()
+        self._carts = {}
+
+    def get_by_user(self, user_id):
+        with self._lock:
+            cart_data = self._carts.get(user_id)
+            return deepcopy(cart_data) if cart_data else None
+
+    def save(self, user_id, document):
+        with self._lock:
+            cart_data = self._carts.setdefault(user_id, {'_id': ObjectId(), 'user_id': user_id})
+            cart_data.update(deepcopy(document))
+
+
+class MemoryOrderRepository(_DocumentStore, OrderRepository):
+    def get(self, order_id):
+        with self._lock:
+            return self._get(order_id)
+
+    def get_many(self, order_ids):
+        with self._lock:
+            documents = (self._documents.get(order_id) for order_id in set(map(str, order_ids)))
+            return [deepcopy(document) for document in documents if document]
+
+    def list_by_user(self, user_id, skip=0, limit=10):
+        with self._lock:
+            orders = [order for order in self._documents.values() if order['user_id'] == user_id]
+            return deepcopy(orders[skip:skip + limit])
+
+    def count_by_user(self, user_id):
+        with self._lock:
+            return sum(1 for order in self._documents.values() if order['user_id'] == user_id)
+
+    def _search(self, filters):
+        def matches(order):
+            return (
+                all(order.get(field) == filters[field] for field in ('status', 'user_id') if filters.get(field))
+                and (not filters.get('created_from') or order['created_at'] >= filters['created_from'])
+                and (not filters.get('created_to') or order['created_at'] < filters['created_to'])
+                and (filters.get('min_total') is None or order['total_amount'] >= filters['min_total'])
+            )
+
+        with self._lock:
+            orders = [order for order in self._documents.values() if matches(order)]
+            return deepcopy(sorted(orders, key=lambda order: (order['created_at'], str(order['_id']))))
+
+    def search(self, filters, after=None, limit=50):
+        orders = self._search(filters)[::-1]
+        if after:
+            created_at, order_id = after
+            orders = [order for order in orders if (order['created_at'], str(order['_id'])) < (created_at, str(order_id))]
+        return orders[:limit]
+
+    def iter_search(self, filters, batch_size=1000):
+        yield from self._search(filters)
+
+    def insert(self, document):
+        with self._lock:
+            return self._insert(document)
+
+    def update(self, order_id, fields):
+        with self._lock:
+            self._update(order_id, fields)
+
+    def bulk_update(self, updates):
+        modified = 0
+        with self._lock:
+            for order_id, conditions, fields in updates:
+                document = self._documents.get(str(order_id))
+                if document and all(document.get(key) == value for key, value in conditions.items()):
+                    document.update(deepcopy(fields))
+                    modified += 1
+        return modified
+
+
+class MemoryCouponRepository(CouponRepository):
+    def __init__(self):
+        self._lock = RLock()
+        self._coupons = {}
+        self._redemptions = {}
+
+    def get(self, code):
+        with self._lock:
+            coupon_data = self._coupons.get(code)
+            if not coupon_data:
+                return None
+            coupon_data = deepcopy(coupon_data)
+            coupon_data.pop('_id', None)
+            return coupon_data
+
+    def get_used_count(self, code):
+        with self._lock:
+            coupon_data = self._coupons.get(code)
+            return coupon_data.get('used_count', 0) if coupon_data else 0
+
+    def list(self, skip=0, limit=10):
+        with self._lock:
+            return [deepcopy(coupon_data) for coupon_data in list(self._coupons.values())[skip:skip + limit]]
+
+    def list_active(self, now, limit=100):
+        with self._lock:
+            active = [
+                coupon_data for coupon_data in self._coupons.values()
+                if not (coupon_data.get('start_date') and coupon_data['start_date'] > now)
+                and not (coupon_data.get('end_date') and coupon_data['end_date'] < now)
+            ]
+            return [{key: value for key, value in deepcopy(coupon_data).items() if key != '_id'} for coupon_data in active[:limit]]
+
+    def count(self):
+        return len(self._coupons)
+
+    def save(self, code, fields, insert_fields=None):
+        with self._lock:
+            coupon_data = self._coupons.get(code)
+            if coupon_data is None:
+                coupon_data = self._coupons[code] = {'_id': ObjectId(), 'code': code}
+                coupon_data.update(deepcopy(insert_fields or {}))
+            coupon_data.update(deepcopy(fields))
+
+    def insert_many(self, documents):
+        inserted = set()
+        with self._lock:
+            for document in documents:
+                if document['code'] in self._coupons:
+                    continue
+                coupon_data = deepcopy(document)
+                coupon_data.setdefault('_id', ObjectId())
+                self._coupons[document['code']] = coupon_data
+                inserted.add(document['code'])
+        return inserted
+
+    def delete(self, code):
+        with self._lock:
+            self._coupons.pop(code, None)
+            for key in [key for key in self._redemptions if key[0] == code]:
+                del self._redemptions[key]
+
+    def increment_used(self, code, now):
+        with self._lock:
+            coupon_data = self._coupons.get(code)
+            if not coupon_data:
+                return None
+            coupon_data['used_count'] = coupon_data.get('used_count', 0) + 1
+            coupon_data['updated_at'] = now
+            return coupon_data['used_count']
+
+    def redeem(self, code, now):
+        with self._lock:
+            coupon_data = self._coupons.get(code)
+            if not coupon_data:
+                return None
+            usage_limit = coupon_data.get('usage_limit')
+            if usage_limit and coupon_data.get('used_count', 0) >= usage_limit:
+                return None
+            if coupon_data.get('start_date') and coupon_data['start_date'] > now:
+                return None
+            if coupon_data.get('end_date') and coupon_data['end_date'] < now:
+                return None
+            coupon_data['used_count'] = coupon_data.get('used_count', 0) + 1
+            coupon_data['updated_at'] = now
+            return coupon_data['used_count']
+
+    def release(self, code, now):
+        with self._lock:
+            coupon_data = self._coupons.get(code)
+            if coupon_data and coupon_data.get('used_count', 0) > 0:
+                coupon_data['used_count'] -= 1
+                coupon_data['updated_at'] = now
+
+    def claim_redemption(self, code, user_id, per_user_limit, now):
+        with self._lock:
+            count = self._redemptions.get((code, user_id), 0)
+            if per_user_limit and count >= per_user_limit:
+                return False
+            self._redemptions[(code, user_id)] = count + 1
+            return True
+
+    def release_redemption(self, code, user_id, now):
+        with self._lock:
+            if self._redemptions.get((code, user_id), 0) > 0:
+                self._redemptions[(code, user_id)] -= 1
+
+    def get_redemption_count(self, code, user_id):
+        return self._redemptions.get((code, user_id), 0)
+
+    def iter_codes(self, prefix='', batch_size=10000):
+        with self._lock:
+            codes = [code for code in self._coupons if code.startswith(prefix)]
+        yield from codes
+
+    def count_codes(self, prefix=''):
+        with self._lock:
+            return sum(1 for code in self._coupons if code.startswith(prefix))
+
+    def iter_batch_codes(self, batch_id, batch_size=10000):
+        with self._lock:
+            codes = [code for code, coupon_data in self._coupons.items() if coupon_data.get('batch_id') == batch_id]
+        yield from codes
+
+
+class MemoryTokenBlocklistRepository(TokenBlocklistRepository):
+    def __init__(self):
+        self._lock = RLock()
+        self._blocklist = {}
+
+    def add(self, jti, blocklisted_at):
+        with self._lock:
+            self._blocklist[jti] = blocklisted_at
+
+    def contains(self, jti):
+        return jti in self._blocklist
+
+
+class MemoryAnalyticsRepository(AnalyticsRepository):
+    def __init__(self):
+        self._lock = RLock()
+        self._rollups = {}
+
+    def increment(self, rollups):
+        with self._lock:
+            for (kind, day, key), fields in rollups.items():
+                rollup = self._rollups.setdefault((kind, day, key), {'kind': kind, 'day': day, 'key': key})
+                for field, amount in fields.items():
+                    rollup[field] = rollup.get(field, 0) + amount
+
+    def list(self, kind, day_from, day_to, key=None):
+        with self._lock:
+            rollups = [
+                rollup for (rollup_kind, day, rollup_key), rollup in self._rollups.items()
+                if rollup_kind == kind and day_from <= day <= day_to and (key is None or rollup_key == key)
+            ]
+            return deepcopy(sorted(rollups, key=lambda rollup: (rollup['day'], rollup['key'])))
+
+
+class MemoryRepositories(Repositories):
+    def __init__(self):
+        super().__init__(
+            products=MemoryProductRepository(),
+            users=MemoryUserRepository(),
+            carts=MemoryCartRepository(),
+            orders=MemoryOrderRepository(),
+            coupons=MemoryCouponRepository(),
+            token_blocklist=MemoryTokenBlocklistRepository(),
+            analytics=MemoryAnalyticsRepository()
+        )
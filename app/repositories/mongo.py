@@ -0,0 +1,366 @@
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import re
+from .base import (
+    ProductRepository, UserRepository, CartRepository, OrderRepository,
+    CouponRepository, TokenBlocklistRepository, AnalyticsRepository, Repositories
+)
+
+
+def _prefix_query(prefix):
+    # A prefix-anchored regex is served by the unique index on code
+    return {'code': {'$regex': f'^{re.escape(prefix)}'}} if prefix else {}
+
+
+def _order_search_query(filters):
+    query = {}
+    for field in ('status', 'user_id'):
+        if filters.get(field):
+            query[field] = filters[field]
+    created_at = {}
+    if filters.get('created_from'):
+        created_at['$gte'] = filters['created_from']
+    if filters.get('created_to'):
+        created_at['$lt'] = filters['created_to']
+    if created_at:
+        query['created_at'] = created_at
+    if filters.get('min_total') is not None:
+        query['total_amount'] = {'$gte': filters['min_total']}
+    return query
+
+
+class MongoProductRepository(ProductRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, product_id):
+        return self.collection.find_one({'_id': ObjectId(product_id)})
+
+    def get_many(self, product_ids):
+        object_ids = [ObjectId(product_id) for product_id in set(map(str, product_ids))]
+        if not object_ids:
+            return []
+        return list(self.collection.find({'_id': {'$in': object_ids}}))
+
+    def list(self, skip=0, limit=10):
+        return list(self.collection.find().skip(skip).limit(limit))
+
+    def count(self):
+        return self.collection.count_documents({})
+
+    def insert(self, document):
+        return self.collection.insert_one(document).inserted_id
+
+    def update(self, product_id, fields):
+        self.collection.update_one({'_id': ObjectId(product_id)}, {'$set': fields})
+
+    def increment(self, product_id, field, amount, fields=None):
+        update = {'$inc': {field: amount}}
+        if fields:
+            update['$set'] = fields
+        self.collection.update_one({'_id': ObjectId(product_id)}, update)
+
+    def iter_prices(self, categories=None, batch_size=1000):
+        query = {'category': {'$in': list(categories)}} if categories else {}
+        cursor = self.collection.find(
+            query, {'category': 1, 'price': 1}, sort=[('_id', 1)], batch_size=batch_size
+        )
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def bulk_update(self, updates):
+        if not updates:
+            return 0
+        result = self.collection.bulk_write([
+            UpdateOne({'_id': ObjectId(product_id), **conditions}, {'$set': fields})
+            for product_id, conditions, fields in updates
+        ], ordered=False)
+        return result.modified_count
+
+    def delete(self, product_id):
+        self.collection.delete_one({'_id': ObjectId(product_id)})
+
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, user_id):
+        return self.collection.find_one({'_id': ObjectId(user_id)})
+
+    def get_many(self, user_ids):
+        object_ids = [ObjectId(user_id) for user_id in set(map(str, user_ids))]
+        if not object_ids:
+            return []
+        return list(self.collection.find({'_id': {'$in': object_ids}}))
+
+    def get_by_email(self, email):
+        return self.collection.find_one({'email': email})
+
+    def insert(self, document):
+        return self.collection.insert_one(document).inserted_id
+
+    def update(self, user_id, fields):
+        self.collection.update_one({'_id': ObjectId(user_id)}, {'$set': fields})
+
+    def ensure_indexes(self):
+        self.collection.create_index('email')
+
+
+class MongoCartRepository(CartRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_by_user(self, user_id):
+        return self.collection.find_one({'user_id': user_id})
+
+    def save(self, user_id, document):
+        self.collection.update_one({'user_id': user_id}, {'$set': document}, upsert=True)
+
+    def ensure_indexes(self):
+        self.collection.create_index('user_id')
+
+
+class MongoOrderRepository(OrderRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, order_id):
+        return self.collection.find_one({'_id': ObjectId(order_id)})
+
+    def get_many(self, order_ids):
+        object_ids = [ObjectId(order_id) for order_id in set(map(str, order_ids))]
+        if not object_ids:
+            return []
+        return list(self.collection.find({'_id': {'$in': object_ids}}))
+
+    def list_by_user(self, user_id, skip=0, limit=10):
+        return list(self.collection.find({'user_id': user_id}).skip(skip).limit(limit))
+
+    def count_by_user(self, user_id):
+        return self.collection.count_documents({'user_id': user_id})
+
+    def search(self, filters, after=None, limit=50):
+        query = _order_search_query(filters)
+        if after:
+            # Keyset pagination: continue strictly after the last order seen
+            created_at, order_id = after
+            query = {'$and': [query, {'$or': [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': ObjectId(order_id)}}
+            ]}]}
+        return list(self.collection.find(query).sort([('created_at', -1), ('_id', -1)]).limit(limit))
+
+    def iter_search(self, filters, batch_size=1000):
+        # A slow export client may leave the cursor idle longer than the server's timeout
+        cursor = self.collection.find(
+            _order_search_query(filters),
+            sort=[('created_at', 1), ('_id', 1)],
+            batch_size=batch_size,
+            no_cursor_timeout=True
+        )
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def insert(self, document):
+        return self.collection.insert_one(document).inserted_id
+
+    def update(self, order_id, fields):
+        self.collection.update_one({'_id': ObjectId(order_id)}, {'$set': fields})
+
+    def bulk_update(self, updates):
+        if not updates:
+            return 0
+        result = self.collection.bulk_write([
+            UpdateOne({'_id': ObjectId(order_id), **conditions}, {'$set': fields})
+            for order_id, conditions, fields in updates
+        ], ordered=False)
+        return result.modified_count
+
+    def ensure_indexes(self):
+        # Serve the admin search for each filter with the keyset sort order;
+        # the user_id index also serves list_by_user
+        self.collection.create_index([('user_id', 1), ('created_at', -1), ('_id', -1)])
+        self.collection.create_index([('status', 1), ('created_at', -1), ('_id', -1)])
+        self.collection.create_index([('created_at', -1), ('_id', -1)])
+
+
+class MongoCouponRepository(CouponRepository):
+    def __init__(self, collection, redemptions):
+        self.collection = collection
+        self.redemptions = redemptions
+
+    def get(self, code):
+        return self.collection.find_one({'code': code}, {'_id': 0})
+
+    def get_used_count(self, code):
+        coupon_data = self.collection.find_one({'code': code}, {'used_count': 1})
+        return coupon_data.get('used_count', 0) if coupon_data else 0
+
+    def list(self, skip=0, limit=10):
+        return list(self.collection.find().skip(skip).limit(limit))
+
+    def list_active(self, now, limit=100):
+        return list(self.collection.find({
+            '$and': [
+                {'$or': [{'start_date': None}, {'start_date': {'$lte': now}}]},
+                {'$or': [{'end_date': None}, {'end_date': {'$gte': now}}]}
+            ]
+        }, {'_id': 0}).limit(limit))
+
+    def count(self):
+        return self.collection.count_documents({})
+
+    def save(self, code, fields, insert_fields=None):
+        update = {'$set': fields}
+        if insert_fields:
+            update['$setOnInsert'] = insert_fields
+        self.collection.update_one({'code': code}, update, upsert=True)
+
+    def insert_many(self, documents):
+        try:
+            self.collection.insert_many(documents, ordered=False)
+            return {document['code'] for document in documents}
+        except BulkWriteError as e:
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+            failed = {documents[error['index']]['code'] for error in e.details['writeErrors']}
+            return {document['code'] for document in documents} - failed
+
+    def delete(self, code):
+        self.collection.delete_one({'code': code})
+        self.redemptions.delete_many({'code': code})
+
+    def increment_used(self, code, now):
+        coupon_data = self.collection.find_one_and_update(
+            {'code': code},
+            {'$inc': {'used_count': 1}, '$set': {'updated_at': now}},
+            projection={'used_count': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return coupon_data['used_count'] if coupon_data else None
+
+    def redeem(self, code, now):
+        coupon_data = self.collection.find_one_and_update(
+            {
+                'code': code,
+                '$and': [
+                    {'$or': [
+                        {'usage_limit': {'$in': [None, 0]}},
+                        {'$expr': {'$lt': ['$used_count', '$usage_limit']}}
+                    ]},
+                    {'$or': [{'start_date': None}, {'start_date': {'$lte': now}}]},
+                    {'$or': [{'end_date': None}, {'end_date': {'$gte': now}}]}
+                ]
+            },
+            {'$inc': {'used_count': 1}, '$set': {'updated_at': now}},
+            projection={'used_count': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return coupon_data['used_count'] if coupon_data else None
+
+    def release(self, code, now):
+        self.collection.update_one(
+            {'code': code, 'used_count': {'$gt': 0}},
+            {'$inc': {'used_count': -1}, '$set': {'updated_at': now}}
+        )
+
+    def claim_redemption(self, code, user_id, per_user_limit, now):
+        # A full slot makes the upsert collide with the unique (code, user_id) index
+        redemption_filter = {'code': code, 'user_id': user_id}
+        if per_user_limit:
+            redemption_filter['count'] = {'$lt': per_user_limit}
+        redemption_update = {'$inc': {'count': 1}, '$set': {'updated_at': now}}
+        try:
+            self.redemptions.update_one(redemption_filter, redemption_update, upsert=True)
+            return True
+        except DuplicateKeyError:
+            # Either the slot is full or a concurrent first redemption created it
+            result = self.redemptions.update_one(redemption_filter, redemption_update)
+            return result.modified_count == 1
+
+    def release_redemption(self, code, user_id, now):
+        self.redemptions.update_one(
+            {'code': code, 'user_id': user_id, 'count': {'$gt': 0}},
+            {'$inc': {'count': -1}, '$set': {'updated_at': now}}
+        )
+
+    def get_redemption_count(self, code, user_id):
+        redemption = self.redemptions.find_one({'code': code, 'user_id': user_id})
+        return redemption['count'] if redemption else 0
+
+    def iter_codes(self, prefix='', batch_size=10000):
+        for coupon_data in self.collection.find(_prefix_query(prefix), {'code': 1, '_id': 0}).batch_size(batch_size):
+            yield coupon_data['code']
+
+    def count_codes(self, prefix=''):
+        return self.collection.count_documents(_prefix_query(prefix))
+
+    def iter_batch_codes(self, batch_id, batch_size=10000):
+        cursor = self.collection.find({'batch_id': batch_id}, {'code': 1, '_id': 0}).batch_size(batch_size)
+        for coupon_data in cursor:
+            yield coupon_data['code']
+
+    def ensure_indexes(self):
+        self.collection.create_index('code', unique=True)
+        self.collection.create_index('batch_id', sparse=True)
+        self.redemptions.create_index([('code', 1), ('user_id', 1)], unique=True)
+
+
+class MongoTokenBlocklistRepository(TokenBlocklistRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def add(self, jti, blocklisted_at):
+        self.collection.insert_one({'jti': jti, 'blocklisted_at': blocklisted_at})
+
+    def contains(self, jti):
+        return self.collection.find_one({'jti': jti}, {'_id': 1}) is not None
+
+    def ensure_indexes(self):
+        self.collection.create_index('jti')
+
+
+class MongoAnalyticsRepository(AnalyticsRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def increment(self, rollups):
+        if not rollups:
+            return
+        self.collection.bulk_write([
+            UpdateOne(
+                {'_id': f'{kind}:{day}:{key}'},
+                {'$inc': fields, '$setOnInsert': {'kind': kind, 'day': day, 'key': key}},
+                upsert=True
+            )
+            for (kind, day, key), fields in rollups.items()
+        ], ordered=False)
+
+    def list(self, kind, day_from, day_to, key=None):
+        query = {'kind': kind, 'day': {'$gte': day_from, '$lte': day_to}}
+        if key is not None:
+            query['key'] = key
+        return list(self.collection.find(query, {'_id': 0}).sort([('day', 1), ('key', 1)]))
+
+    def ensure_indexes(self):
+        self.collection.create_index([('kind', 1), ('day', 1), ('key', 1)])
+
+
+class MongoRepositories(Repositories):
+    def __init__(self, database):
+        self.database = database
+        super().__init__(
+            products=MongoProductRepository(database.products),
+            users=MongoUserRepository(database.users),
+            carts=MongoCartRepository(database.carts),
+            orders=MongoOrderRepository(database.orders),
+            coupons=MongoCouponRepository(database.coupons, database.coupon_redemptions),
+            token_blocklist=MongoTokenBlocklistRepository(database.token_blocklist),
+            analytics=MongoAnalyticsRepository(database.sales_rollups)
+        )
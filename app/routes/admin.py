@@ -0,0 +1,110 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..models.user import User
+from ..utils.slow_queries import get_report, reset_report
+from ..utils.connections import connections
+from ..utils import analytics, live_stats
+
+admin_bp = Blueprint('admin', __name__)
+
+def admin_required():
+    current_user_id = get_jwt_identity()
+    user = User.get_by_id(current_app.db, current_user_id)
+    if not user or user.role != 'admin':
+        return False
+    return True
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@jwt_required()
+def get_slow_queries():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    limit = request.args.get('limit', 50, type=int)
+    report = get_report(current_app.redis, min(max(limit, 1), 500))
+    
+    return jsonify({
+        'threshold_ms': current_app.config['SLOW_QUERY_THRESHOLD_MS'],
+        'queries': report
+    }), 200
+
+@admin_bp.route('/slow-queries', methods=['DELETE'])
+@jwt_required()
+def reset_slow_queries():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    reset_report(current_app.redis)
+    
+    return '', 204
+
+@admin_bp.route('/pools', methods=['GET'])
+@jwt_required()
+def get_pool_stats():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    # Pools are per process; this reports the worker that served the request
+    return jsonify(connections.stats()), 200
+
+@admin_bp.route('/analytics/<kind>', methods=['GET'])
+@jwt_required()
+def get_sales_rollups(kind):
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    day_from, day_to = analytics.default_range()
+    day_from = request.args.get('from', day_from)
+    day_to = request.args.get('to', day_to)
+    try:
+        rollups = analytics.read_rollups(
+            current_app.db, kind, day_from, day_to, request.args.get('key'),
+            max_days=current_app.config['ANALYTICS_MAX_DAYS']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'kind': kind,
+        'from': day_from,
+        'to': day_to,
+        'rollups': rollups
+    }), 200
+
+@admin_bp.route('/analytics/backfill', methods=['POST'])
+@jwt_required()
+def queue_sales_rollup_backfill():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    from ..tasks import backfill_sales_rollups
+    backfill_sales_rollups.delay()
+    
+    return jsonify({'message': 'Sales rollup backfill queued'}), 202
+
+@admin_bp.route('/stats/live', methods=['GET'])
+@jwt_required()
+def get_live_stats():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    try:
+        windows = live_stats.parse_windows(
+            request.args.get('windows', current_app.config['LIVE_STATS_WINDOWS']),
+            current_app.config['LIVE_STATS_RETENTION']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(live_stats.read(windows)), 200
+
+@admin_bp.route('/recommendations/rebuild', methods=['POST'])
+@jwt_required()
+def queue_co_occurrence_rebuild():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    from ..tasks import rebuild_co_occurrence
+    rebuild_co_occurrence.delay()
+    
+    return jsonify({'message': 'Related products rebuild queued'}), 202
@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
-from werkzeug.security import generate_password_hash, check_password_hash
 from ..models.user import User
 from datetime import timedelta, datetime
 from bson import ObjectId
@@ -8,11 +7,15 @@ from ..models.cart import Cart
 from ..models.order import Order
 from ..models.coupon import Coupon
 from ..utils.email import send_email
+from .. import limiter
+from ..utils.rate_limit import configured_limit
+from ..utils import live_stats
 import uuid
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@limiter.limit(configured_limit('RATELIMIT_REGISTER'))
 def register():
     data = request.get_json()
     if not data:
@@ -55,6 +58,7 @@ def register():
     }), 201
 
 @auth_bp.route('/login', methods=['POST'])
+@limiter.limit(configured_limit('RATELIMIT_LOGIN'))
 def login():
     data = request.get_json()
     if not data:
@@ -70,9 +74,15 @@ def login():
         return jsonify({'error': 'Invalid email or password'}), 401
     
     # Verify password
-    if not check_password_hash(user.password, data['password']):
+    if not user.check_password(data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
     
+    # Upgrade hashes made with an older method or cost
+    if user.needs_rehash():
+        user.rehash_password(current_app.db, data['password'])
+    
+    live_stats.record_login(user._id)
+    
     # Generate tokens
     access_token = create_access_token(identity=str(user._id))
     refresh_token = create_refresh_token(identity=str(user._id))
@@ -137,7 +147,7 @@ def update_current_user():
     if 'name' in data:
         user.name = data['name']
     if 'password' in data:
-        user.password = data['password']  # Will be hashed in update()
+        user.set_password(data['password'])  # Will be hashed in update()
     
     user.update(current_app.db)
     
@@ -150,10 +160,7 @@ def logout():
     jti = get_jwt()['jti']
     
     # Add the token to the blocklist
-    current_app.db.token_blocklist.insert_one({
-        'jti': jti,
-        'blocklisted_at': datetime.utcnow()
-    })
+    current_app.db.token_blocklist.add(jti, datetime.utcnow())
     
     return jsonify({'message': 'Successfully logged out'}), 200
 
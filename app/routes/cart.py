@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.cart import Cart
 from ..models.product import Product
+from ..utils.idempotency import idempotent
+from ..utils import live_stats
 
 cart_bp = Blueprint('cart', __name__)
 
@@ -19,6 +21,7 @@ def get_cart():
 
 @cart_bp.route('/', methods=['POST'])
 @jwt_required()
+@idempotent()
 def add_to_cart():
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -50,11 +53,13 @@ def add_to_cart():
     # Add item to cart
     cart.add_item(data['product_id'], quantity)
     cart.save(current_app.db)
+    live_stats.record_cart_add(current_user_id, quantity)
     
     return jsonify(cart.to_dict()), 201
 
 @cart_bp.route('/<product_id>', methods=['PUT'])
 @jwt_required()
+@idempotent()
 def update_cart_item(product_id):
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -93,6 +98,7 @@ def update_cart_item(product_id):
 
 @cart_bp.route('/<product_id>', methods=['DELETE'])
 @jwt_required()
+@idempotent()
 def remove_from_cart(product_id):
     current_user_id = get_jwt_identity()
     
@@ -108,6 +114,7 @@ def remove_from_cart(product_id):
 
 @cart_bp.route('/', methods=['DELETE'])
 @jwt_required()
+@idempotent()
 def clear_cart():
     current_user_id = get_jwt_identity()
     
@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.coupon import Coupon
 from ..models.user import User
+from .. import limiter
+from ..utils.rate_limit import configured_limit
+from ..utils.response_cache import cached_response, invalidate
+from ..utils.idempotency import idempotent
+from ..utils.coupon_codes import PLACEHOLDERS, bulk_job_key, keyspace_size
+from ..utils.coupon_engine import DISCOUNT_TYPES, CartLines, evaluate_coupons
+from bson.errors import InvalidId
 from datetime import datetime, timedelta
+import uuid
 
 coupons_bp = Blueprint('coupons', __name__)
 
@@ -13,8 +21,26 @@ def admin_required():
         return False
     return True
 
+def parse_rule_fields(data):
+    """Parse the optional targeting and stacking fields of a coupon."""
+    fields = {}
+    for field in ('categories', 'product_ids'):
+        if field in data:
+            if not isinstance(data[field], list):
+                raise ValueError(f'{field} must be a list')
+            fields[field] = [str(value) for value in data[field]]
+    for field in ('buy_quantity', 'get_quantity'):
+        if field in data:
+            fields[field] = int(data[field]) if data[field] else None
+            if fields[field] is not None and fields[field] <= 0:
+                raise ValueError(f'{field} must be positive')
+    if 'stackable' in data:
+        fields['stackable'] = bool(data['stackable'])
+    return fields
+
 @coupons_bp.route('/', methods=['POST'])
 @jwt_required()
+@idempotent()
 def create_coupon():
     if not admin_required():
         return jsonify({'error': 'Admin privileges required'}), 403
@@ -26,7 +52,7 @@ def create_coupon():
         return jsonify({'error': 'Missing required fields'}), 400
     
     # Validate discount type
-    if data['discount_type'] not in ['percentage', 'fixed']:
+    if data['discount_type'] not in DISCOUNT_TYPES:
         return jsonify({'error': 'Invalid discount type'}), 400
     
     # Validate discount value
@@ -34,8 +60,9 @@ def create_coupon():
         discount_value = float(data['discount_value'])
         if discount_value <= 0:
             raise ValueError('Discount value must be positive')
-        if data['discount_type'] == 'percentage' and discount_value > 100:
+        if data['discount_type'] != 'fixed' and discount_value > 100:
             raise ValueError('Percentage discount cannot exceed 100%')
+        rule_fields = parse_rule_fields(data)
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     
@@ -55,7 +82,9 @@ def create_coupon():
         max_discount=float(data.get('max_discount')) if 'max_discount' in data else None,
         start_date=start_date,
         end_date=end_date,
-        usage_limit=int(data.get('usage_limit')) if 'usage_limit' in data else None
+        usage_limit=int(data.get('usage_limit')) if 'usage_limit' in data else None,
+        per_user_limit=int(data.get('per_user_limit')) if 'per_user_limit' in data else None,
+        **rule_fields
     )
     
     # Check if coupon code already exists
@@ -63,6 +92,8 @@ def create_coupon():
         return jsonify({'error': 'Coupon code already exists'}), 409
     
     coupon.save(current_app.db)
+    current_app.coupon_cache.invalidate(coupon.code)
+    invalidate('coupon', code=coupon.code)
     
     return jsonify(coupon.to_dict()), 201
 
@@ -85,30 +116,59 @@ def get_coupons():
     }), 200
 
 @coupons_bp.route('/<code>', methods=['GET'])
+@limiter.limit(configured_limit('RATELIMIT_COUPON_VALIDATE'))
+@cached_response('coupon', ttl='COUPON_CACHE_TTL')
 def get_coupon(code):
-    coupon = Coupon.get_by_code(current_app.db, code)
+    coupon = current_app.coupon_cache.get(current_app.db, code)
     if not coupon:
         return jsonify({'error': 'Coupon not found'}), 404
     
     return jsonify(coupon.to_dict()), 200
 
 @coupons_bp.route('/validate', methods=['POST'])
+@limiter.limit(configured_limit('RATELIMIT_COUPON_VALIDATE'))
 def validate_coupon():
     data = request.get_json()
-    if 'code' not in data:
+    if not data or ('code' not in data and 'codes' not in data):
         return jsonify({'error': 'Missing coupon code'}), 400
     
-    coupon = Coupon.get_by_code(current_app.db, data['code'])
-    if not coupon:
-        return jsonify({'error': 'Invalid coupon code'}), 404
+    codes = data['codes'] if 'codes' in data else [data['code']]
+    coupons = []
+    for code in dict.fromkeys(codes):
+        coupon = current_app.coupon_cache.get(current_app.db, code)
+        if not coupon:
+            return jsonify({'error': 'Invalid coupon code'}), 404
+        coupons.append(coupon)
     
-    if not coupon.is_valid():
+    if 'codes' not in data and not coupons[0].is_valid():
         return jsonify({'error': 'Coupon is not valid'}), 400
     
-    return jsonify(coupon.to_dict()), 200
+    # Without line items only the coupon definitions can be checked
+    if 'items' not in data:
+        if 'codes' in data:
+            return jsonify({'coupons': [coupon.to_dict() for coupon in coupons]}), 200
+        return jsonify(coupons[0].to_dict()), 200
+    
+    try:
+        items = [(item['product_id'], int(item['quantity'])) for item in data['items']]
+        lines = CartLines.from_items(current_app.db, items)
+    except (KeyError, TypeError, ValueError, InvalidId):
+        return jsonify({'error': 'Invalid items'}), 400
+    
+    evaluation = evaluate_coupons(coupons, lines)
+    if 'codes' in data:
+        return jsonify({
+            'coupons': [coupon.to_dict() for coupon in coupons],
+            'evaluation': evaluation.to_dict()
+        }), 200
+    
+    response = coupons[0].to_dict()
+    response['evaluation'] = evaluation.to_dict()
+    return jsonify(response), 200
 
 @coupons_bp.route('/<code>', methods=['PUT'])
 @jwt_required()
+@idempotent()
 def update_coupon(code):
     if not admin_required():
         return jsonify({'error': 'Admin privileges required'}), 403
@@ -121,7 +181,7 @@ def update_coupon(code):
     
     # Update fields if provided
     if 'discount_type' in data:
-        if data['discount_type'] not in ['percentage', 'fixed']:
+        if data['discount_type'] not in DISCOUNT_TYPES:
             return jsonify({'error': 'Invalid discount type'}), 400
         coupon.discount_type = data['discount_type']
     
@@ -130,7 +190,7 @@ def update_coupon(code):
             discount_value = float(data['discount_value'])
             if discount_value <= 0:
                 raise ValueError('Discount value must be positive')
-            if coupon.discount_type == 'percentage' and discount_value > 100:
+            if coupon.discount_type != 'fixed' and discount_value > 100:
                 raise ValueError('Percentage discount cannot exceed 100%')
             coupon.discount_value = discount_value
         except ValueError as e:
@@ -166,12 +226,27 @@ def update_coupon(code):
         except ValueError:
             return jsonify({'error': 'Invalid usage limit value'}), 400
     
+    if 'per_user_limit' in data:
+        try:
+            coupon.per_user_limit = int(data['per_user_limit']) if data['per_user_limit'] else None
+        except ValueError:
+            return jsonify({'error': 'Invalid per user limit value'}), 400
+    
+    try:
+        for field, value in parse_rule_fields(data).items():
+            setattr(coupon, field, value)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     coupon.save(current_app.db)
+    current_app.coupon_cache.invalidate(code)
+    invalidate('coupon', code=code)
     
     return jsonify(coupon.to_dict()), 200
 
 @coupons_bp.route('/<code>', methods=['DELETE'])
 @jwt_required()
+@idempotent()
 def delete_coupon(code):
     if not admin_required():
         return jsonify({'error': 'Admin privileges required'}), 403
@@ -181,5 +256,117 @@ def delete_coupon(code):
         return jsonify({'error': 'Coupon not found'}), 404
     
     coupon.delete(current_app.db)
+    current_app.coupon_cache.invalidate(code)
+    invalidate('coupon', code=code)
+    
+    return '', 204
+
+@coupons_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+@idempotent()
+def create_bulk_coupons():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    data = request.get_json()
+    
+    # Validate required fields
+    if not data or not all(k in data for k in ['template', 'count', 'discount_type', 'discount_value']):
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    if data['discount_type'] not in DISCOUNT_TYPES:
+        return jsonify({'error': 'Invalid discount type'}), 400
+    
+    try:
+        count = int(data['count'])
+        if count <= 0 or count > current_app.config['COUPON_BULK_MAX_COUNT']:
+            raise ValueError(f"Count must be between 1 and {current_app.config['COUPON_BULK_MAX_COUNT']}")
+        discount_value = float(data['discount_value'])
+        if discount_value <= 0:
+            raise ValueError('Discount value must be positive')
+        if data['discount_type'] != 'fixed' and discount_value > 100:
+            raise ValueError('Percentage discount cannot exceed 100%')
+        rule_fields = parse_rule_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The template must leave plenty of room so random codes rarely collide
+    template = data['template']
+    if not any(char in PLACEHOLDERS for char in template):
+        return jsonify({'error': 'Template must contain at least one of #, ? or *'}), 400
+    if keyspace_size(template) < count * 10:
+        return jsonify({'error': 'Template is too short for the requested count'}), 400
+    
+    try:
+        start_date = datetime.fromisoformat(data['start_date']) if 'start_date' in data else None
+        end_date = datetime.fromisoformat(data['end_date']) if 'end_date' in data else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
+    
+    coupon_fields = {
+        'discount_type': data['discount_type'],
+        'discount_value': discount_value,
+        'min_purchase': float(data.get('min_purchase', 0)),
+        'max_discount': float(data['max_discount']) if 'max_discount' in data else None,
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+        'usage_limit': int(data.get('usage_limit', 1)),
+        'per_user_limit': int(data['per_user_limit']) if 'per_user_limit' in data else None,
+        **rule_fields
+    }
+    
+    job_id = uuid.uuid4().hex
+    job_key = bulk_job_key(job_id)
+    current_app.redis.hset(job_key, mapping={
+        'status': 'queued',
+        'template': template,
+        'requested': count,
+        'generated': 0,
+        'inserted': 0,
+        'created_at': datetime.utcnow().isoformat()
+    })
+    current_app.redis.expire(job_key, current_app.config['COUPON_BULK_JOB_TTL'])
+    from ..tasks import generate_coupon_codes
+    generate_coupon_codes.delay(job_id, template, count, coupon_fields)
+    
+    return jsonify({'job_id': job_id, 'status': 'queued', 'requested': count}), 202
+
+@coupons_bp.route('/bulk/<job_id>', methods=['GET'])
+@jwt_required()
+def get_bulk_coupon_job(job_id):
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
     
-    return '', 204 
\ No newline at end of file
+    job = current_app.redis.hgetall(bulk_job_key(job_id))
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    job = {key.decode(): value.decode() for key, value in job.items()}
+    for field in ('requested', 'generated', 'inserted'):
+        job[field] = int(job.get(field, 0))
+    job['job_id'] = job_id
+    job['progress'] = round(job['inserted'] / job['requested'], 4) if job['requested'] else 0
+    
+    return jsonify(job), 200
+
+@coupons_bp.route('/bulk/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_bulk_coupons(job_id):
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    if not current_app.redis.exists(bulk_job_key(job_id)):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    db = current_app.db
+    
+    def generate():
+        yield 'code\n'
+        for code in Coupon.iter_batch_codes(db, job_id):
+            yield f'{code}\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=coupons-{job_id}.csv'}
+    )
@@ -1,26 +1,79 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.order import Order
 from ..models.cart import Cart
 from ..models.user import User
-from ..models.coupon import Coupon
-from .. import jwt
-from ..tasks import send_order_confirmation, send_order_status_update
+from ..utils.idempotency import idempotent
+from ..utils.coupon_engine import CartLines, evaluate_coupons
+from ..utils.task_batching import batch
+from ..utils import live_stats
+from bson import ObjectId
+from datetime import datetime
+import csv
+import io
+import json
 
 orders_bp = Blueprint('orders', __name__)
 
 def admin_required():
     current_user_id = get_jwt_identity()
-    user = User.get_by_id(jwt.db, current_user_id)
+    user = User.get_by_id(current_app.db, current_user_id)
     if not user or user.role != 'admin':
         return False
     return True
 
+EXPORT_COLUMNS = [
+    'order_id', 'user_id', 'status', 'total_amount', 'discount',
+    'items', 'coupon_codes', 'created_at', 'updated_at'
+]
+
+def parse_order_filters(args):
+    """Admin search filters from query args. Raises ValueError on bad input."""
+    filters = {}
+    if args.get('status'):
+        if args['status'] not in Order.ALLOWED_TRANSITIONS:
+            raise ValueError('Invalid status')
+        filters['status'] = args['status']
+    if args.get('user_id'):
+        filters['user_id'] = args['user_id']
+    for arg, field in (('from', 'created_from'), ('to', 'created_to')):
+        if args.get(arg):
+            try:
+                filters[field] = datetime.fromisoformat(args[arg])
+            except ValueError:
+                raise ValueError(f'{arg} must be an ISO 8601 date')
+    if args.get('min_total'):
+        try:
+            filters['min_total'] = float(args['min_total'])
+        except ValueError:
+            raise ValueError('min_total must be a number')
+    return filters
+
+def export_row(order):
+    return {
+        'order_id': str(order._id),
+        'user_id': order.user_id,
+        'status': order.status,
+        'total_amount': order.total_amount,
+        'discount': order.discount,
+        'items': sum(item.quantity for item in order.items),
+        'coupon_codes': ';'.join(order.coupon_codes),
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat()
+    }
+
+def track_order_change(order_id):
+    """Queue the order for a sales rollup update once the request succeeds."""
+    if current_app.config['ANALYTICS_ENABLED']:
+        from ..tasks import update_sales_rollups
+        batch(update_sales_rollups, str(order_id))
+
 @orders_bp.route('/', methods=['POST'])
 @jwt_required()
+@idempotent()
 def create_order():
     current_user_id = get_jwt_identity()
-    cart = Cart.get_by_user_id(jwt.db, current_user_id)
+    cart = Cart.get_by_user_id(current_app.db, current_user_id)
     
     if not cart or not cart.items:
         return jsonify({'error': 'Cart is empty'}), 400
@@ -29,35 +82,72 @@ def create_order():
     if 'shipping_address' not in data:
         return jsonify({'error': 'Missing shipping address'}), 400
     
-    try:
-        # Apply coupon if provided
-        total_amount = cart.get_total(jwt.db)
-        if 'coupon_code' in data:
-            coupon = Coupon.get_by_code(jwt.db, data['coupon_code'])
-            if coupon and coupon.is_valid():
-                discount = coupon.calculate_discount(total_amount)
-                total_amount -= discount
-                coupon.increment_usage(jwt.db)
-            else:
+    # Coupons can be passed as a single code or as a list of stackable codes
+    coupon_codes = data.get('coupon_codes') or ([data['coupon_code']] if data.get('coupon_code') else [])
+    redeemed = []
+    item_discounts = {}
+    if coupon_codes:
+        coupons = []
+        for code in dict.fromkeys(coupon_codes):
+            coupon = current_app.coupon_cache.get(current_app.db, code)
+            if not coupon:
                 return jsonify({'error': 'Invalid or expired coupon'}), 400
+            coupons.append(coupon)
+        
+        lines = CartLines.from_items(current_app.db, ((item.product_id, item.quantity) for item in cart.items))
+        evaluation = evaluate_coupons(coupons, lines)
+        if evaluation.rejected:
+            code, reason = next(iter(evaluation.rejected.items()))
+            return jsonify({'error': f'Coupon {code}: {reason}'}), 400
         
+        # Redeem atomically; the usage limit is enforced by the database.
+        # Superseded coupons (beaten by a better combination) are not used.
+        for coupon in coupons:
+            if coupon.code not in evaluation.applied:
+                continue
+            if not coupon.redeem(current_app.db, current_user_id):
+                for redeemed_coupon in redeemed:
+                    redeemed_coupon.release(current_app.db, current_user_id)
+                return jsonify({'error': f'Coupon {coupon.code}: usage limit reached'}), 400
+            redeemed.append(coupon)
+        
+        item_discounts = dict(zip(lines.product_ids, evaluation.line_discounts))
+    
+    try:
         # Create order
-        order_id = Order.create_from_cart(
-            jwt.db,
+        order = Order.place_from_cart(
+            current_app.db,
             current_user_id,
             cart,
-            data['shipping_address']
+            data['shipping_address'],
+            coupon_codes=[coupon.code for coupon in redeemed],
+            item_discounts=item_discounts
         )
-        
-        # Send order confirmation email
-        send_order_confirmation.delay(current_user_id, order_id)
-        
-        return jsonify({
-            'message': 'Order created successfully',
-            'order_id': order_id
-        }), 201
     except ValueError as e:
+        for coupon in redeemed:
+            coupon.release(current_app.db, current_user_id)
         return jsonify({'error': str(e)}), 400
+    except Exception:
+        # No order was placed (e.g. a database error): give the redemptions back
+        for coupon in redeemed:
+            coupon.release(current_app.db, current_user_id)
+        raise
+    
+    order_id = str(order._id)
+    live_stats.record_order(current_user_id, order.total_amount)
+    
+    # Send order confirmation email (Celery is loaded on first enqueue)
+    from ..tasks import send_order_confirmation
+    send_order_confirmation.delay(current_user_id, order_id)
+    track_order_change(order_id)
+    if current_app.config['RECOMMENDATIONS_ENABLED']:
+        from ..tasks import update_co_occurrence
+        batch(update_co_occurrence, order_id)
+    
+    return jsonify({
+        'message': 'Order created successfully',
+        'order_id': order_id
+    }), 201
 
 @orders_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -66,7 +156,7 @@ def get_orders():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     
-    orders, total = Order.get_by_user_id(jwt.db, current_user_id, page, per_page)
+    orders, total = Order.get_by_user_id(current_app.db, current_user_id, page, per_page)
     
     return jsonify({
         'orders': [order.to_dict() for order in orders],
@@ -79,7 +169,7 @@ def get_orders():
 @jwt_required()
 def get_order(order_id):
     current_user_id = get_jwt_identity()
-    order = Order.get_by_id(jwt.db, order_id)
+    order = Order.get_by_id(current_app.db, order_id)
     
     if not order:
         return jsonify({'error': 'Order not found'}), 404
@@ -92,11 +182,12 @@ def get_order(order_id):
 
 @orders_bp.route('/<order_id>/status', methods=['PUT'])
 @jwt_required()
+@idempotent()
 def update_order_status(order_id):
     if not admin_required():
         return jsonify({'error': 'Admin privileges required'}), 403
     
-    order = Order.get_by_id(jwt.db, order_id)
+    order = Order.get_by_id(current_app.db, order_id)
     if not order:
         return jsonify({'error': 'Order not found'}), 404
     
@@ -106,21 +197,127 @@ def update_order_status(order_id):
     
     try:
         old_status = order.status
-        order.update_status(jwt.db, data['status'])
+        order.update_status(current_app.db, data['status'])
         
         # Send status update email if status changed
         if old_status != order.status:
+            from ..tasks import send_order_status_update
             send_order_status_update.delay(order.user_id, order_id, order.status)
+            track_order_change(order_id)
         
         return jsonify(order.to_dict()), 200
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
 
+@orders_bp.route('/admin', methods=['GET'])
+@jwt_required()
+def search_orders():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    limit = min(max(request.args.get('limit', 50, type=int), 1), current_app.config['ORDER_SEARCH_MAX_LIMIT'])
+    try:
+        filters = parse_order_filters(request.args)
+        orders, next_cursor = Order.search(current_app.db, filters, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'orders': [dict(order.to_dict(), id=str(order._id)) for order in orders],
+        'next_cursor': next_cursor
+    }), 200
+
+@orders_bp.route('/admin/export', methods=['GET'])
+@jwt_required()
+def export_orders():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    try:
+        filters = parse_order_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    db = current_app.db
+    batch_size = current_app.config['ORDER_EXPORT_BATCH_SIZE']
+    
+    def generate():
+        # Rows are written to a small buffer and flushed every batch, so
+        # memory stays bounded however many orders match
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS) if export_format == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for count, order in enumerate(Order.iter_search(db, filters, batch_size), 1):
+            if writer:
+                writer.writerow(export_row(order))
+            else:
+                buffer.write(json.dumps(export_row(order)) + '\n')
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename=orders.{export_format}'}
+    )
+
+@orders_bp.route('/bulk-status', methods=['POST'])
+@jwt_required()
+@idempotent()
+def bulk_update_order_status():
+    if not admin_required():
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    data = request.get_json()
+    if not data or 'status' not in data or not isinstance(data.get('order_ids'), list):
+        return jsonify({'error': 'status and a list of order_ids are required'}), 400
+    
+    order_ids = [str(order_id) for order_id in data['order_ids']]
+    max_ids = current_app.config['ORDER_BULK_MAX_IDS']
+    if not order_ids or len(order_ids) > max_ids:
+        return jsonify({'error': f'order_ids must contain between 1 and {max_ids} ids'}), 400
+    
+    valid_ids = [order_id for order_id in order_ids if ObjectId.is_valid(order_id)]
+    try:
+        outcomes, updated = Order.bulk_update_status(current_app.db, valid_ids, data['status'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Notifications are published in chunks once the request has succeeded
+    from ..tasks import NOTIFICATION_STATUS_UPDATE, send_order_notifications
+    for order in updated:
+        batch(send_order_notifications, {
+            'type': NOTIFICATION_STATUS_UPDATE,
+            'user_id': order.user_id,
+            'order_id': str(order._id),
+            'status': order.status
+        })
+        track_order_change(order._id)
+    
+    results = []
+    for order_id in order_ids:
+        outcome, status = outcomes.get(order_id, (Order.OUTCOME_INVALID_ID, None))
+        results.append({'order_id': order_id, 'outcome': outcome, 'status': status})
+    
+    return jsonify({
+        'status': data['status'],
+        'updated': len(updated),
+        'results': results
+    }), 200
+
 @orders_bp.route('/<order_id>/cancel', methods=['POST'])
 @jwt_required()
+@idempotent()
 def cancel_order(order_id):
     current_user_id = get_jwt_identity()
-    order = Order.get_by_id(jwt.db, order_id)
+    order = Order.get_by_id(current_app.db, order_id)
     
     if not order:
         return jsonify({'error': 'Order not found'}), 404
@@ -134,10 +331,12 @@ def cancel_order(order_id):
         return jsonify({'error': 'Order cannot be cancelled'}), 400
     
     try:
-        order.update_status(jwt.db, Order.STATUS_CANCELLED)
+        order.update_status(current_app.db, Order.STATUS_CANCELLED)
         
         # Send cancellation email
+        from ..tasks import send_order_status_update
         send_order_status_update.delay(order.user_id, order_id, order.status)
+        track_order_change(order_id)
         
         return jsonify(order.to_dict()), 200
     except ValueError as e:
@@ -2,40 +2,53 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.product import Product
 from ..models.user import User
-from .. import jwt
-import json
+from .. import limiter
+from ..utils.rate_limit import configured_limit
+from ..utils.response_cache import cached_response, invalidate
+from ..utils.recommendations import get_related
+from ..utils.idempotency import idempotent
+from ..utils import repricing
 from bson import ObjectId
 
 products_bp = Blueprint('products', __name__)
 
 def admin_required():
     current_user_id = get_jwt_identity()
-    user = User.get_by_id(jwt.db, current_user_id)
+    user = User.get_by_id(current_app.db, current_user_id)
     if not user or user.role != 'admin':
         return False
     return True
 
+def clear_product_caches(product_id):
+    invalidate('product', product_id=str(product_id))
+    invalidate('products_page')
+    invalidate('products_featured')
+
 @products_bp.route('/', methods=['GET'])
+@limiter.limit(configured_limit('RATELIMIT_CATALOG'))
+@cached_response('products_page', query_args=('page', 'per_page'), ttl='PRODUCT_CACHE_TTL')
 def get_products():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
     products, total = Product.get_all(current_app.db, page, per_page)
+    
     return jsonify({
         'products': [product.to_dict() for product in products],
         'total': total,
         'page': page,
         'per_page': per_page
-    })
+    }), 200
 
 @products_bp.route('/featured', methods=['GET'])
+@limiter.limit(configured_limit('RATELIMIT_CATALOG'))
+@cached_response('products_featured', ttl='PRODUCT_CACHE_TTL')
 def get_featured_products():
     # For now, just return the first 5 products as featured
     # In a real application, you would have a 'featured' flag in the product model
     products = Product.get_all(current_app.db, 1, 5)[0]
-    return jsonify({
-        'products': [product.to_dict() for product in products]
-    })
+    
+    return jsonify({'products': [product.to_dict() for product in products]}), 200
 
 @products_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -64,17 +77,66 @@ def create_product():
     )
     
     product.save(current_app.db)
+    clear_product_caches(product._id)
     return jsonify(product.to_dict()), 201
 
 @products_bp.route('/<product_id>', methods=['GET'])
+@limiter.limit(configured_limit('RATELIMIT_CATALOG'))
+@cached_response('product', ttl='PRODUCT_CACHE_TTL')
 def get_product(product_id):
     try:
         product = Product.get_by_id(current_app.db, product_id)
-        if not product:
-            return jsonify({'error': 'Product not found'}), 404
-        return jsonify(product.to_dict())
     except:
         return jsonify({'error': 'Invalid product ID'}), 400
+    
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    return jsonify(product.to_dict()), 200
+
+@products_bp.route('/reprice', methods=['POST'])
+@jwt_required()
+@idempotent()
+def reprice_products():
+    if not admin_required():
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    try:
+        rules = repricing.parse_rules(data.get('rules'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # A dry run only reads, so it runs here and returns the diff
+    if data.get('dry_run', True):
+        summary = repricing.reprice(
+            current_app.db,
+            rules,
+            dry_run=True,
+            batch_size=current_app.config['REPRICING_BATCH_SIZE'],
+            diff_limit=current_app.config['REPRICING_DIFF_LIMIT']
+        )
+        return jsonify(summary), 200
+    
+    from ..tasks import reprice_catalog
+    reprice_catalog.delay([rule.to_dict() for rule in rules])
+    
+    return jsonify({'message': 'Repricing queued'}), 202
+
+@products_bp.route('/<product_id>/related', methods=['GET'])
+@limiter.limit(configured_limit('RATELIMIT_CATALOG'))
+def get_related_products(product_id):
+    # Precomputed by the refresh_related_products task; one Redis read
+    limit = request.args.get('limit', current_app.config['RECOMMENDATIONS_TOP_K'], type=int)
+    related = get_related(current_app.redis, product_id, max(limit, 1))
+    
+    return jsonify({
+        'product_id': product_id,
+        'related': related
+    }), 200
 
 @products_bp.route('/', methods=['PUT'])
 @jwt_required()
@@ -104,9 +166,7 @@ def update_product(product_id):
     
     product.save(current_app.db)
     
-    # Clear caches
-    current_app.redis.delete(f'product_{product_id}')
-    current_app.redis.delete(*current_app.redis.keys('products_page_*'))
+    clear_product_caches(product_id)
     
     return jsonify(product.to_dict())
 
@@ -122,9 +182,7 @@ def delete_product(product_id):
     
     product.delete(current_app.db)
     
-    # Clear caches
-    current_app.redis.delete(f'product_{product_id}')
-    current_app.redis.delete(*current_app.redis.keys('products_page_*'))
+    clear_product_caches(product_id)
     
     return '', 204
 
@@ -152,8 +210,6 @@ def update_stock(product_id):
     product.stock = stock
     product.save(current_app.db)
     
-    # Clear caches
-    current_app.redis.delete(f'product_{product_id}')
-    current_app.redis.delete(*current_app.redis.keys('products_page_*'))
+    clear_product_caches(product_id)
     
     return jsonify(product.to_dict()) 
\ No newline at end of file
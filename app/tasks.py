@@ -1,87 +1,229 @@
-from celery import Celery
+from contextlib import nullcontext
+from datetime import datetime
+from flask import current_app, has_app_context
 from flask_mail import Message
-from . import mail, jwt
+from . import celery, get_mail
 from .models.user import User
 from .models.order import Order
+from .models.product import Product
+from .models.coupon import Coupon
+from .utils.bloom import BloomFilter
+from .utils.coupon_codes import bulk_job_key, generate_codes, template_prefix
+from .utils.email_templates import email_templates
+from .utils import analytics, recommendations, repricing
+import logging
+import smtplib
 
-celery = Celery('tasks', broker='redis://localhost:6379/1')
+NOTIFICATION_CONFIRMATION = 'confirmation'
+NOTIFICATION_STATUS_UPDATE = 'status_update'
 
-@celery.task
-def send_order_confirmation(user_id, order_id):
-    user = User.get_by_id(jwt.db, user_id)
-    order = Order.get_by_id(jwt.db, order_id)
-    
-    if not user or not order:
-        return
+_flask_app = None
+
+def _order_message(notification, user, order, products):
+    """Build the email for one order notification."""
+    if notification['type'] == NOTIFICATION_CONFIRMATION:
+        subject, template, status = 'Order Confirmation', 'order_confirmation', order.status
+    else:
+        subject, template, status = 'Order Status Update', 'order_status_update', notification['status']
     
-    msg = Message(
-        subject='Order Confirmation',
-        recipients=[user.email]
+    msg = Message(subject=subject, recipients=[user.email])
+    msg.body, msg.html = email_templates.render(
+        template,
+        lines=email_templates.item_lines(order.items, products),
+        user=user,
+        order=order,
+        order_id=notification['order_id'],
+        status=status
     )
-    
-    # Create HTML email template
-    msg.html = f"""
-    <h2>Order Confirmation</h2>
-    <p>Dear {user.name},</p>
-    <p>Thank you for your order! Your order has been confirmed.</p>
-    <h3>Order Details:</h3>
-    <p>Order ID: {order_id}</p>
-    <p>Total Amount: ${order.total_amount:.2f}</p>
-    <p>Status: {order.status}</p>
-    <h3>Items:</h3>
-    <ul>
+    return msg
+
+def build_order_messages(db, notifications):
     """
+    Build the emails for a batch of order notifications.
+    
+    Users, orders and products are each fetched in one query for the whole
+    batch. Notifications whose user or order no longer exists are skipped.
     
-    for item in order.items:
-        product = Product.get_by_id(jwt.db, item.product_id)
-        if product:
-            msg.html += f"""
-            <li>{product.name} x {item.quantity} - ${item.price * item.quantity:.2f}</li>
-            """
+    Args:
+        db: Repositories
+        notifications (list): Dicts with 'type' (NOTIFICATION_CONFIRMATION or
+            NOTIFICATION_STATUS_UPDATE), 'user_id', 'order_id' and, for status
+            updates, 'status'
     
-    msg.html += """
-    </ul>
-    <p>Thank you for shopping with us!</p>
+    Returns:
+        list: Message objects
     """
+    users = User.get_many(db, [notification['user_id'] for notification in notifications])
+    orders = Order.get_many(db, [notification['order_id'] for notification in notifications])
+    products = Product.get_many(db, [item.product_id for order in orders.values() for item in order.items])
     
-    mail.send(msg)
+    messages = []
+    for notification in notifications:
+        user = users.get(str(notification['user_id']))
+        order = orders.get(str(notification['order_id']))
+        if not user or not order:
+            continue
+        messages.append(_order_message(notification, user, order, products))
+    return messages
 
-@celery.task
-def send_order_status_update(user_id, order_id, new_status):
-    user = User.get_by_id(jwt.db, user_id)
-    order = Order.get_by_id(jwt.db, order_id)
-    
-    if not user or not order:
-        return
-    
-    msg = Message(
-        subject='Order Status Update',
-        recipients=[user.email]
-    )
-    
-    # Create HTML email template
-    msg.html = f"""
-    <h2>Order Status Update</h2>
-    <p>Dear {user.name},</p>
-    <p>Your order status has been updated.</p>
-    <h3>Order Details:</h3>
-    <p>Order ID: {order_id}</p>
-    <p>New Status: {new_status}</p>
-    <p>Total Amount: ${order.total_amount:.2f}</p>
-    <h3>Items:</h3>
-    <ul>
+def send_messages(messages):
     """
+    Send messages over one SMTP connection.
     
-    for item in order.items:
-        product = Product.get_by_id(jwt.db, item.product_id)
-        if product:
-            msg.html += f"""
-            <li>{product.name} x {item.quantity} - ${item.price * item.quantity:.2f}</li>
-            """
+    Flask-Mail reconnects after MAIL_MAX_EMAILS messages. A message the
+    server refuses is logged and skipped so the rest of the batch still goes out.
     
-    msg.html += """
-    </ul>
-    <p>Thank you for your patience!</p>
+    Returns:
+        int: Number of messages sent
     """
+    sent = 0
+    if not messages:
+        return sent
     
-    mail.send(msg) 
\ No newline at end of file
+    with get_mail().connect() as connection:
+        for msg in messages:
+            try:
+                connection.send(msg)
+                sent += 1
+            except smtplib.SMTPRecipientsRefused as e:
+                logging.error(f"Email to {', '.join(msg.recipients)} was refused: {str(e)}")
+    return sent
+
+@celery.task(ignore_result=True)
+def send_order_notifications(notifications):
+    """Send a batch of order notifications (see build_order_messages)."""
+    with _app_context():
+        return send_messages(build_order_messages(current_app.db, notifications))
+
+@celery.task(ignore_result=True)
+def send_order_confirmation(user_id, order_id):
+    return send_order_notifications([{
+        'type': NOTIFICATION_CONFIRMATION,
+        'user_id': user_id,
+        'order_id': order_id
+    }])
+
+@celery.task(ignore_result=True)
+def send_order_status_update(user_id, order_id, new_status):
+    return send_order_notifications([{
+        'type': NOTIFICATION_STATUS_UPDATE,
+        'user_id': user_id,
+        'order_id': order_id,
+        'status': new_status
+    }])
+
+def _app_context():
+    # Tasks run outside of a request; reuse the caller's app when called eagerly
+    if has_app_context():
+        return nullcontext()
+    global _flask_app
+    if _flask_app is None:
+        from . import create_app
+        _flask_app = create_app()
+    return _flask_app.app_context()
+
+@celery.task(ignore_result=True)
+def generate_coupon_codes(job_id, template, count, coupon_fields):
+    with _app_context():
+        db = current_app.db
+        redis = current_app.redis
+        job_key = bulk_job_key(job_id)
+        batch_size = current_app.config['COUPON_BULK_BATCH_SIZE']
+        
+        try:
+            # Only codes sharing the template's literal prefix can collide
+            redis.hset(job_key, 'status', 'loading')
+            prefix = template_prefix(template)
+            seen = BloomFilter(capacity=Coupon.count_codes(db, prefix) + count)
+            for code in Coupon.iter_codes(db, prefix):
+                seen.add(code)
+            
+            for field in ('start_date', 'end_date'):
+                if coupon_fields.get(field):
+                    coupon_fields[field] = datetime.fromisoformat(coupon_fields[field])
+            
+            redis.hset(job_key, 'status', 'running')
+            inserted = 0
+            generated = 0
+            while inserted < count:
+                needed = min(batch_size, count - inserted)
+                batch = []
+                while len(batch) < needed:
+                    if generated > count * 20:
+                        raise ValueError('Code template keyspace exhausted')
+                    for code in generate_codes(template, needed - len(batch)):
+                        generated += 1
+                        # A false positive only costs a regenerated code
+                        if code not in seen:
+                            seen.add(code)
+                            batch.append(code)
+                
+                coupons = [Coupon(code=code, batch_id=job_id, **coupon_fields) for code in batch]
+                inserted += len(Coupon.insert_many(db, coupons))
+                redis.hset(job_key, mapping={'inserted': inserted, 'generated': generated})
+            
+            redis.hset(job_key, mapping={'status': 'completed', 'finished_at': datetime.utcnow().isoformat()})
+        except Exception as e:
+            logging.error(f"Bulk coupon job {job_id} failed: {str(e)}")
+            redis.hset(job_key, mapping={'status': 'failed', 'error': str(e)})
+            raise
+
+@celery.task(ignore_result=True)
+def update_sales_rollups(order_ids):
+    """Reconcile the sales rollups of orders that were created or changed status."""
+    with _app_context():
+        return analytics.reconcile_order_ids(current_app.db, order_ids)
+
+@celery.task(ignore_result=True)
+def backfill_sales_rollups():
+    """Reconcile the sales rollups of every order, in batches."""
+    with _app_context():
+        result = analytics.backfill(current_app.db, current_app.config['ANALYTICS_BACKFILL_BATCH_SIZE'])
+        logging.info(f"Sales rollup backfill finished: {result}")
+        return result
+
+@celery.task(ignore_result=True)
+def update_co_occurrence(order_ids):
+    """Add new orders to the product co-occurrence matrix."""
+    with _app_context():
+        orders = Order.get_many(current_app.db, order_ids).values()
+        return recommendations.add_orders(current_app.redis, orders, current_app.config['RECOMMENDATIONS_MAX_BASKET'])
+
+@celery.task(ignore_result=True)
+def refresh_related_products():
+    """Recompute the related products of every product from the co-occurrence matrix."""
+    with _app_context():
+        config = current_app.config
+        count = recommendations.refresh_related(
+            current_app.db, current_app.redis, config['RECOMMENDATIONS_TOP_K'], config['RECOMMENDATIONS_MIN_COUNT']
+        )
+        logging.info(f"Refreshed related products of {count} products")
+        return count
+
+@celery.task(ignore_result=True)
+def rebuild_co_occurrence():
+    """Rebuild the co-occurrence matrix from every order, then refresh related products."""
+    with _app_context():
+        config = current_app.config
+        recommendations.reset(current_app.redis)
+        batch = []
+        added = 0
+        for order in Order.iter_search(current_app.db, {}, config['RECOMMENDATIONS_REBUILD_BATCH_SIZE']):
+            batch.append(order)
+            if len(batch) >= config['RECOMMENDATIONS_REBUILD_BATCH_SIZE']:
+                added += recommendations.add_orders(current_app.redis, batch, config['RECOMMENDATIONS_MAX_BASKET'])
+                batch = []
+        added += recommendations.add_orders(current_app.redis, batch, config['RECOMMENDATIONS_MAX_BASKET'])
+        logging.info(f"Rebuilt the co-occurrence matrix from {added} orders")
+    return refresh_related_products()
+
+@celery.task(ignore_result=True)
+def reprice_catalog(rules):
+    """Apply repricing rules (as sent to POST /api/products/reprice) to the whole catalog."""
+    with _app_context():
+        return repricing.reprice(
+            current_app.db,
+            repricing.parse_rules(rules),
+            batch_size=current_app.config['REPRICING_BATCH_SIZE'],
+            diff_limit=0
+        )
@@ -0,0 +1,200 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from ..models.order import Order
+from ..models.product import Product
+import logging
+import uuid
+
+# Rollup kinds: daily totals, and daily figures per product, category and coupon
+KIND_DAY = 'day'
+KIND_PRODUCT = 'product'
+KIND_CATEGORY = 'category'
+KIND_COUPON = 'coupon'
+ROLLUP_KINDS = (KIND_DAY, KIND_PRODUCT, KIND_CATEGORY, KIND_COUPON)
+
+# Cancelled orders are counted by status but not as sales
+UNCOUNTED_STATUSES = {Order.STATUS_CANCELLED}
+# A claim older than this is taken to belong to a worker that died before clearing it
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def order_day(order):
+    created_at = order.created_at
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at.date().isoformat()
+
+
+def add_order(rollups, order, products, status, sign):
+    """
+    Add (sign=1) or remove (sign=-1) an order, counted under `status`, to `rollups`.
+
+    `rollups` maps (kind, day, key) to a dict of field -> amount.
+    """
+    day = order_day(order)
+    rollups[(KIND_DAY, day, 'all')][f'status_{status}'] += sign
+    if status in UNCOUNTED_STATUSES:
+        return
+
+    totals = rollups[(KIND_DAY, day, 'all')]
+    totals['orders'] += sign
+    totals['revenue'] += sign * order.total_amount
+    totals['discount'] += sign * order.discount
+
+    for item in order.items:
+        units = sign * item.quantity
+        revenue = sign * (item.price * item.quantity - item.discount)
+        product = products.get(str(item.product_id))
+        category = product.category if product else 'unknown'
+        for kind, key in ((KIND_PRODUCT, str(item.product_id)), (KIND_CATEGORY, category)):
+            rollup = rollups[(kind, day, key)]
+            rollup['units'] += units
+            rollup['revenue'] += revenue
+        totals['units'] += units
+
+    for code in order.coupon_codes:
+        rollup = rollups[(KIND_COUPON, day, code)]
+        rollup['orders'] += sign
+        # The order discount is not broken down by coupon; split it evenly
+        rollup['discount'] += sign * order.discount / len(order.coupon_codes)
+
+
+def _claim(order, now):
+    """
+    Condition to claim `order` on, and the status the rollups count it under,
+    or None if the order needs no reconciling or another worker holds it.
+    """
+    claimed_at = order.rollup_claimed_at
+    if isinstance(claimed_at, str):
+        claimed_at = datetime.fromisoformat(claimed_at)
+    if claimed_at is None:
+        if order.rollup_status == order.status:
+            return None
+        return {'rollup_status': order.rollup_status, 'rollup_claimed_at': None}, order.rollup_status
+    if now - claimed_at < CLAIM_TIMEOUT:
+        return None
+    # Never cleared: the increments may not have been applied, so the
+    # rollups are taken to still count the order under its previous status
+    return {'rollup_claim': order.rollup_claim}, order.rollup_previous
+
+
+def reconcile_orders(db, orders):
+    """
+    Bring the sales rollups up to date with the current status of `orders`.
+
+    Each order records the status the rollups count it under
+    (`rollup_status`). Orders whose status has moved on are reconciled in
+    three steps, each one bulk write:
+
+    1. Claim: set `rollup_status` to the current status, keep the counted
+       one in `rollup_previous` and mark the order pending with a claim id
+       and time, conditioned on the order not being claimed already, so two
+       workers cannot both count it
+    2. Apply the rollup changes for the claimed orders with one bulk upsert
+    3. Clear the claim, conditioned on it still being ours
+
+    A claim that is not cleared within CLAIM_TIMEOUT (the worker died) is
+    taken over by the next reconcile of the order, including the backfill,
+    which applies the change from `rollup_previous` again. Only a worker
+    dying between steps 2 and 3 can count an order twice. Orders claimed by
+    another worker are skipped; that worker re-reads its orders after
+    clearing and picks up status changes made in the meantime.
+
+    Returns:
+        int: Number of order reconciliations applied
+    """
+    changed = 0
+    while orders:
+        now = datetime.utcnow()
+        claims = [(order, _claim(order, now)) for order in orders]
+        claims = [(order, claim) for order, claim in claims if claim is not None]
+        if not claims:
+            break
+
+        claim_id = uuid.uuid4().hex
+        db.orders.bulk_update([
+            (order._id, condition, {
+                'rollup_status': order.status,
+                'rollup_previous': counted_status,
+                'rollup_claim': claim_id,
+                'rollup_claimed_at': now
+            })
+            for order, (condition, counted_status) in claims
+        ])
+        claimed = [
+            order for order in Order.get_many(db, [order._id for order, _ in claims]).values()
+            if order.rollup_claim == claim_id
+        ]
+
+        products = Product.get_many(db, [item.product_id for order in claimed for item in order.items])
+        rollups = defaultdict(lambda: defaultdict(int))
+        for order in claimed:
+            if order.rollup_previous is not None:
+                add_order(rollups, order, products, order.rollup_previous, -1)
+            add_order(rollups, order, products, order.rollup_status, 1)
+
+        # Drop counters that cancelled out
+        db.analytics.increment({
+            rollup_key: {field: amount for field, amount in fields.items() if amount}
+            for rollup_key, fields in rollups.items()
+            if any(fields.values())
+        })
+        db.orders.bulk_update([
+            (order._id, {'rollup_claim': claim_id},
+             {'rollup_previous': None, 'rollup_claim': None, 'rollup_claimed_at': None})
+            for order in claimed
+        ])
+        changed += len(claimed)
+
+        # Status changes skipped by other reconciles while these orders were claimed
+        orders = list(Order.get_many(db, [order._id for order in claimed]).values())
+    return changed
+
+
+def reconcile_order_ids(db, order_ids):
+    return reconcile_orders(db, list(Order.get_many(db, order_ids).values()))
+
+
+def backfill(db, batch_size=1000):
+    """
+    Reconcile every order, oldest first, `batch_size` orders at a time.
+
+    Returns:
+        dict: Orders scanned and orders whose rollups changed
+    """
+    scanned = 0
+    changed = 0
+    batch = []
+    for order in Order.iter_search(db, {}, batch_size):
+        batch.append(order)
+        if len(batch) >= batch_size:
+            changed += reconcile_orders(db, batch)
+            scanned += len(batch)
+            batch = []
+            logging.info(f"Sales rollup backfill: {scanned} orders scanned, {changed} updated")
+    if batch:
+        changed += reconcile_orders(db, batch)
+        scanned += len(batch)
+    return {'scanned': scanned, 'updated': changed}
+
+
+def read_rollups(db, kind, day_from, day_to, key=None, max_days=None):
+    """
+    Rollups of `kind` for a day range (ISO dates, inclusive), by day.
+
+    Raises:
+        ValueError: On an unknown kind, a malformed range or one longer than `max_days`
+    """
+    if kind not in ROLLUP_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(ROLLUP_KINDS)}")
+    days = (date.fromisoformat(day_to) - date.fromisoformat(day_from)).days + 1
+    if days < 1:
+        raise ValueError('from must not be after to')
+    if max_days and days > max_days:
+        raise ValueError(f'Range must not exceed {max_days} days')
+    return db.analytics.list(kind, day_from, day_to, key)
+
+
+def default_range(days=30):
+    today = datetime.utcnow().date()
+    return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
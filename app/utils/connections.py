@@ -0,0 +1,242 @@
+from pymongo import MongoClient, monitoring
+from redis import BlockingConnectionPool, Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from .rate_limit import LOCAL_FIRST_PREFIX
+import os
+import threading
+import time
+
+
+class ProcessLocal:
+    """
+    Proxy to an object that is built lazily, once per process.
+
+    Attribute access is forwarded to the instance created by `factory` in the
+    current process, so an object created before a gunicorn fork (--preload)
+    is never used by the forked workers.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._instance = self._factory()
+                    self._pid = pid
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Tracks checkouts from the MongoDB connection pool of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checkout_started = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open = 0
+            self.in_use = 0
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': self.open,
+                'in_use': self.in_use,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6)
+            }
+
+    def connection_check_out_started(self, event):
+        # Checkout events fire on the thread that waits for the connection
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = time.perf_counter() - getattr(self._checkout_started, 'value', time.perf_counter())
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            with self._lock:
+                self.timeouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+class TrackedConnectionPool(BlockingConnectionPool):
+    """
+    Blocking Redis pool that records checkout waits and timeouts.
+
+    When all connections are in use, callers wait up to `timeout` seconds for
+    one to be returned instead of opening more. redis-py resets the pool on
+    first use after a fork, so each worker process gets its own connections.
+    """
+
+    def reset(self):
+        super().reset()
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def get_connection(self, command_name, *keys, **options):
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except RedisConnectionError as e:
+            if str(e) == 'No connection available.':
+                with self._stats_lock:
+                    self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return connection
+
+    def stats(self):
+        # Unused slots are queued as None placeholders
+        created = len(self._connections)
+        idle = sum(1 for connection in list(self.pool.queue) if connection is not None)
+        with self._stats_lock:
+            return {
+                'max_connections': self.max_connections,
+                'open': created,
+                'in_use': created - idle,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6)
+            }
+
+
+class ConnectionManager:
+    """
+    Owns the MongoDB client and the Redis connection pool.
+
+    The MongoClient is created lazily in each process, so an app created before
+    a gunicorn fork never shares sockets or monitor threads with its workers.
+    One Redis pool serves the app (`app.redis`: caches, idempotency, metrics)
+    and the rate limiter. Pool sizes and timeouts come from Config.
+    """
+
+    def __init__(self, app=None):
+        self.event_listeners = []
+        self.pool_listener = MongoPoolListener()
+        self.redis_pool = None
+        self._mongo_client = None
+        self._mongo_pid = None
+        self._lock = threading.Lock()
+        self.config = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, event_listeners=None):
+        self.config = app.config
+        self.event_listeners = list(event_listeners or [])
+        self.redis_pool = TrackedConnectionPool.from_url(
+            app.config['REDIS_URL'],
+            max_connections=app.config['REDIS_MAX_CONNECTIONS'],
+            timeout=app.config['REDIS_POOL_TIMEOUT'],
+            socket_timeout=app.config['REDIS_SOCKET_TIMEOUT'],
+            socket_connect_timeout=app.config['REDIS_SOCKET_CONNECT_TIMEOUT'],
+            health_check_interval=app.config['REDIS_HEALTH_CHECK_INTERVAL']
+        )
+        self._mongo_client = None
+        self._mongo_pid = None
+
+        # Share the pool with Flask-Limiter instead of letting it open its own
+        local_first_uri = LOCAL_FIRST_PREFIX + app.config['REDIS_URL']
+        if app.config['RATELIMIT_LOCAL_FIRST']:
+            app.config.setdefault('RATELIMIT_STORAGE_URI', local_first_uri)
+        app.config.setdefault('RATELIMIT_STORAGE_URI', app.config['REDIS_URL'])
+        storage_options = app.config.setdefault('RATELIMIT_STORAGE_OPTIONS', {})
+        if app.config['RATELIMIT_STORAGE_URI'] in (app.config['REDIS_URL'], local_first_uri):
+            storage_options['connection_pool'] = self.redis_pool
+        if app.config['RATELIMIT_STORAGE_URI'].startswith(LOCAL_FIRST_PREFIX):
+            storage_options.setdefault('sync_interval', app.config['RATELIMIT_SYNC_INTERVAL'])
+            storage_options.setdefault('max_pending', app.config['RATELIMIT_SYNC_MAX_PENDING'])
+        app.extensions['connections'] = self
+
+    @property
+    def mongo_client(self):
+        pid = os.getpid()
+        if self._mongo_pid != pid:
+            with self._lock:
+                if self._mongo_pid != pid:
+                    # The parent's client must not be used (or closed) after a fork
+                    self.pool_listener.reset()
+                    self._mongo_client = MongoClient(
+                        self.config['MONGODB_URI'],
+                        maxPoolSize=self.config['MONGODB_MAX_POOL_SIZE'],
+                        minPoolSize=self.config['MONGODB_MIN_POOL_SIZE'],
+                        maxIdleTimeMS=self.config['MONGODB_MAX_IDLE_TIME_MS'],
+                        waitQueueTimeoutMS=self.config['MONGODB_WAIT_QUEUE_TIMEOUT_MS'],
+                        connectTimeoutMS=self.config['MONGODB_CONNECT_TIMEOUT_MS'],
+                        serverSelectionTimeoutMS=self.config['MONGODB_SERVER_SELECTION_TIMEOUT_MS'],
+                        event_listeners=self.event_listeners + [self.pool_listener]
+                    )
+                    self._mongo_pid = pid
+        return self._mongo_client
+
+    def redis(self, redis_class=Redis):
+        return redis_class(connection_pool=self.redis_pool)
+
+    def stats(self):
+        """Saturation of this process's pools."""
+        stats = {'pid': os.getpid()}
+        if self._mongo_pid == os.getpid():
+            stats['mongo'] = dict(self.pool_listener.stats(), max_pool_size=self.config['MONGODB_MAX_POOL_SIZE'])
+        if self.redis_pool is not None:
+            stats['redis'] = self.redis_pool.stats()
+        return stats
+
+
+connections = ConnectionManager()
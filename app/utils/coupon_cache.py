@@ -0,0 +1,135 @@
+from ..models.coupon import Coupon
+from .coupon_engine import forget_compiled
+import logging
+import os
+import threading
+import time
+
+INVALIDATION_CHANNEL = 'coupon_cache:invalidate'
+# How long the listener blocks waiting for a message; kept below the Redis
+# socket timeout so a quiet channel is never read as a broken connection
+LISTEN_POLL_SECONDS = 1
+
+# Marks a cached lookup of a code that does not exist
+_MISSING = object()
+
+
+class CouponCache:
+    """
+    In-process, TTL-bounded cache of coupon definitions.
+
+    Unknown codes are cached too (for a shorter TTL) so widgets probing random
+    codes do not reach MongoDB. Entries are evicted on every worker through
+    Redis pub/sub when a coupon is created, updated or deleted.
+
+    The cached `used_count` is only a snapshot, so validation against it can
+    let through a coupon that has just run out. The usage limit is enforced
+    when the coupon is redeemed (`Coupon.redeem`, a conditional update), so
+    lookups never read the live count.
+    """
+
+    def __init__(self, redis, ttl=60, negative_ttl=10, max_size=10000):
+        self.redis = redis
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._listener_pid = None
+        self._subscribed = threading.Event()
+
+    def get(self, db, code):
+        self._ensure_listener()
+
+        now = time.monotonic()
+        entry = self._entries.get(code)
+        if entry and entry[0] > now:
+            data = entry[1]
+        else:
+            coupon_data = db.coupons.get(code)
+            data = coupon_data if coupon_data else _MISSING
+            self._store(code, data, now)
+
+        if data is _MISSING:
+            return None
+
+        return Coupon.from_dict(data)
+
+    def invalidate(self, code):
+        self._evict(code)
+        try:
+            self.redis.publish(INVALIDATION_CHANNEL, code)
+        except Exception as e:
+            logging.warning(f"Failed to publish coupon cache invalidation: {str(e)}")
+
+    def prime(self, coupons_data, timeout=2):
+        """Load coupon definitions ahead of their first lookup, e.g. during warm-up."""
+        self._ensure_listener()
+        # The listener empties the cache once it has subscribed; prime after that
+        self._subscribed.wait(timeout)
+        now = time.monotonic()
+        for coupon_data in coupons_data:
+            self._store(coupon_data['code'], coupon_data, now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, code, data, now):
+        ttl = self.negative_ttl if data is _MISSING else self.ttl
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                # Still full: drop the oldest entries
+                while len(self._entries) >= self.max_size:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[code] = (now + ttl, data)
+
+    def _evict(self, code):
+        with self._lock:
+            self._entries.pop(code, None)
+        forget_compiled(code)
+
+    def _ensure_listener(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._entries.clear()
+            self._listener_pid = pid
+            self._subscribed = threading.Event()
+            thread = threading.Thread(target=self._listen, name='coupon-cache-invalidation', daemon=True)
+            thread.start()
+
+    def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything may have changed while we were disconnected
+                self.clear()
+                self._subscribed.set()
+                while True:
+                    # None when nothing arrived within the poll interval
+                    message = pubsub.get_message(timeout=LISTEN_POLL_SECONDS)
+                    if message is None:
+                        continue
+                    code = message['data']
+                    if isinstance(code, bytes):
+                        code = code.decode()
+                    self._evict(code)
+            except Exception as e:
+                # A real disconnect: invalidations may have been missed, so
+                # start over empty once resubscribed
+                logging.warning(f"Coupon cache invalidation listener error: {str(e)}")
+                self.clear()
+                time.sleep(1)
+            finally:
+                # Return the subscription's connection to the pool
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
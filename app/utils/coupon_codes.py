@@ -0,0 +1,57 @@
+import random
+import re
+
+# Placeholders usable in a code template; everything else is copied literally.
+# Letters and alphanumerics skip characters that are easy to misread (O/0, I/1).
+PLACEHOLDERS = {
+    '#': '0123456789',
+    '?': 'ABCDEFGHJKLMNPQRSTUVWXYZ',
+    '*': 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+}
+
+_random = random.SystemRandom()
+
+
+def parse_template(template):
+    """
+    Split a template such as 'SUMMER-****-##' into literal and random parts.
+
+    Returns:
+        list: (literal, None) or (None, alphabet) tuples
+    """
+    parts = []
+    for char in template:
+        if char in PLACEHOLDERS:
+            parts.append((None, PLACEHOLDERS[char]))
+        else:
+            parts.append((char, None))
+    return parts
+
+
+def keyspace_size(template):
+    size = 1
+    for char in template:
+        if char in PLACEHOLDERS:
+            size *= len(PLACEHOLDERS[char])
+    return size
+
+
+def template_prefix(template):
+    """Literal prefix shared by every code the template can produce."""
+    match = re.match(r'[^#?*]*', template)
+    return match.group(0)
+
+
+def generate_codes(template, count):
+    parts = parse_template(template)
+    codes = []
+    for _ in range(count):
+        codes.append(''.join(
+            literal if literal is not None else _random.choice(alphabet)
+            for literal, alphabet in parts
+        ))
+    return codes
+
+
+def bulk_job_key(job_id):
+    return f'coupon_bulk_job:{job_id}'
@@ -0,0 +1,259 @@
+from collections import OrderedDict
+from ..models.product import Product
+import threading
+
+DISCOUNT_TYPES = ['percentage', 'fixed', 'bogo']
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+_COMPILED_MAX_SIZE = 1024
+
+
+class CartLines:
+    """Column-oriented view of cart line items, priced from the catalog."""
+
+    def __init__(self, product_ids, categories, prices, quantities):
+        self.product_ids = product_ids
+        self.categories = categories
+        self.prices = prices
+        self.quantities = quantities
+        self.subtotals = [price * quantity for price, quantity in zip(prices, quantities)]
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    @property
+    def total(self):
+        return sum(self.subtotals)
+
+    @staticmethod
+    def from_items(db, items):
+        """
+        Build line items from (product_id, quantity) pairs with one product query.
+
+        Products that no longer exist are left out.
+        """
+        items = list(items)
+        products = Product.get_many(db, [product_id for product_id, _ in items])
+        product_ids, categories, prices, quantities = [], [], [], []
+        for product_id, quantity in items:
+            product = products.get(str(product_id))
+            if product:
+                product_ids.append(str(product_id))
+                categories.append(product.category)
+                prices.append(product.price)
+                quantities.append(quantity)
+        return CartLines(product_ids, categories, prices, quantities)
+
+
+class CompiledCoupon:
+    """
+    A coupon definition reduced to a line predicate and a discount evaluator.
+
+    Built once per coupon definition by `compile_coupon`.
+    """
+
+    def __init__(self, coupon):
+        self.code = coupon.code
+        self.stackable = coupon.stackable
+        self.min_purchase = coupon.min_purchase or 0
+        self.max_discount = coupon.max_discount
+        self.discount_type = coupon.discount_type
+        self.discount_value = coupon.discount_value
+        self.buy_quantity = coupon.buy_quantity or 1
+        self.get_quantity = coupon.get_quantity or 1
+
+        categories = frozenset(coupon.categories or ())
+        product_ids = frozenset(str(product_id) for product_id in coupon.product_ids or ())
+        if categories and product_ids:
+            self.matches = lambda product_id, category: product_id in product_ids or category in categories
+        elif categories:
+            self.matches = lambda product_id, category: category in categories
+        elif product_ids:
+            self.matches = lambda product_id, category: product_id in product_ids
+        else:
+            self.matches = lambda product_id, category: True
+
+        if self.discount_type == 'percentage':
+            rate = self.discount_value / 100
+            self.line_discount = lambda price, quantity, subtotal: subtotal * rate
+        elif self.discount_type == 'bogo':
+            # Every (buy + get) units of a line, `get` units are discounted by discount_value %
+            group = self.buy_quantity + self.get_quantity
+            rate = self.discount_value / 100
+            self.line_discount = lambda price, quantity, subtotal: (quantity // group) * self.get_quantity * price * rate
+        else:
+            # Fixed amounts are spread over the eligible lines afterwards
+            self.line_discount = None
+
+    def finish(self, eligible, discounts, eligible_subtotal):
+        """
+        Apply order-level constraints to the per-line discounts.
+
+        Returns:
+            dict: Line index -> discount, or None if the minimum purchase is not met
+        """
+        if not eligible or eligible_subtotal < self.min_purchase:
+            return None
+
+        if self.line_discount is None:
+            amount = min(self.discount_value, eligible_subtotal)
+            discounts = {i: amount * subtotal / eligible_subtotal for i, subtotal in eligible.items()}
+
+        total = sum(discounts.values())
+        if total <= 0:
+            return None
+        if self.max_discount and total > self.max_discount:
+            scale = self.max_discount / total
+            discounts = {i: discount * scale for i, discount in discounts.items()}
+        return discounts
+
+
+def _definition_key(coupon):
+    # Everything a compiled coupon is built from; a coupon deleted and
+    # re-created under the same code, or saved concurrently, still gets a
+    # different key when its rules differ
+    return (
+        coupon.code,
+        coupon.stackable,
+        coupon.min_purchase,
+        coupon.max_discount,
+        coupon.discount_type,
+        coupon.discount_value,
+        coupon.buy_quantity,
+        coupon.get_quantity,
+        frozenset(coupon.categories or ()),
+        frozenset(str(product_id) for product_id in coupon.product_ids or ())
+    )
+
+
+def compile_coupon(coupon):
+    key = _definition_key(coupon)
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled:
+            _compiled.move_to_end(key)
+            return compiled
+
+    compiled = CompiledCoupon(coupon)
+    with _compiled_lock:
+        _compiled[key] = compiled
+        if len(_compiled) > _COMPILED_MAX_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def forget_compiled(code):
+    """Drop the compiled rules of every definition of `code`."""
+    with _compiled_lock:
+        for key in [key for key in _compiled if key[0] == code]:
+            del _compiled[key]
+
+
+class Evaluation:
+    def __init__(self, lines):
+        self.lines = lines
+        self.applied = {}
+        self.rejected = {}
+        # Valid coupons left out because a better combination won
+        self.superseded = {}
+        self.line_discounts = [0] * len(lines)
+
+    @property
+    def total_discount(self):
+        return round(sum(self.line_discounts), 2)
+
+    def to_dict(self):
+        return {
+            'subtotal': round(self.lines.total, 2),
+            'discount': self.total_discount,
+            'total': round(self.lines.total - self.total_discount, 2),
+            'applied': [{'code': code, 'discount': round(amount, 2)} for code, amount in self.applied.items()],
+            'rejected': [{'code': code, 'reason': reason} for code, reason in self.rejected.items()],
+            'superseded': [{'code': code, 'reason': reason} for code, reason in self.superseded.items()],
+            'lines': [
+                {
+                    'product_id': product_id,
+                    'subtotal': round(subtotal, 2),
+                    'discount': round(discount, 2)
+                }
+                for product_id, subtotal, discount in zip(self.lines.product_ids, self.lines.subtotals, self.line_discounts)
+            ]
+        }
+
+
+def evaluate_coupons(coupons, lines):
+    """
+    Evaluate every coupon against the cart lines in a single pass.
+
+    Stackable coupons combine with each other; a non-stackable coupon is only
+    used on its own. Whichever of the two gives the larger discount wins. The
+    discount on a line never exceeds its subtotal.
+
+    Args:
+        coupons (list): Coupon models
+        lines (CartLines): Priced cart lines
+
+    Returns:
+        Evaluation: Applied, rejected (invalid or ineligible) and superseded
+        (valid but beaten by a better combination) coupons with per-line
+        discounts
+    """
+    evaluation = Evaluation(lines)
+
+    candidates = []
+    for coupon in coupons:
+        if not coupon.is_valid():
+            evaluation.rejected[coupon.code] = 'Coupon is not valid'
+        else:
+            candidates.append(compile_coupon(coupon))
+
+    # One pass over the lines, accumulating every coupon at once
+    eligible = [{} for _ in candidates]
+    discounts = [{} for _ in candidates]
+    for i in range(len(lines)):
+        product_id = lines.product_ids[i]
+        category = lines.categories[i]
+        price = lines.prices[i]
+        quantity = lines.quantities[i]
+        subtotal = lines.subtotals[i]
+        for c, compiled in enumerate(candidates):
+            if compiled.matches(product_id, category):
+                eligible[c][i] = subtotal
+                if compiled.line_discount is not None:
+                    discounts[c][i] = compiled.line_discount(price, quantity, subtotal)
+
+    results = []
+    for c, compiled in enumerate(candidates):
+        line_discounts = compiled.finish(eligible[c], discounts[c], sum(eligible[c].values()))
+        if line_discounts is None:
+            evaluation.rejected[compiled.code] = 'Cart does not meet the coupon requirements'
+        else:
+            results.append((compiled, line_discounts))
+
+    def apply(selection):
+        applied = {}
+        remaining = list(lines.subtotals)
+        for compiled, line_discounts in selection:
+            amount = 0
+            for i, discount in line_discounts.items():
+                discount = min(discount, remaining[i])
+                remaining[i] -= discount
+                amount += discount
+            applied[compiled.code] = amount
+        return applied, [subtotal - left for subtotal, left in zip(lines.subtotals, remaining)]
+
+    stackable = [result for result in results if result[0].stackable]
+    best_applied, best_lines = apply(stackable)
+    for result in results:
+        if not result[0].stackable:
+            applied, line_totals = apply([result])
+            if sum(line_totals) > sum(best_lines):
+                best_applied, best_lines = applied, line_totals
+
+    for compiled, _ in results:
+        if compiled.code not in best_applied:
+            evaluation.superseded[compiled.code] = 'Coupon cannot be combined with the other coupons'
+    evaluation.applied = best_applied
+    evaluation.line_discounts = best_lines
+    return evaluation
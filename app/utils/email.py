@@ -1,5 +1,3 @@
-from flask import current_app
-from flask_mail import Message
 import logging
 
 def send_email(subject, recipients, body, html=None):
@@ -15,6 +13,10 @@ def send_email(subject, recipients, body, html=None):
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
+    # Flask-Mail is only imported once an email is actually sent
+    from flask_mail import Message
+    from .. import get_mail
+    
     try:
         msg = Message(
             subject=subject,
@@ -22,7 +24,7 @@ def send_email(subject, recipients, body, html=None):
             body=body,
             html=html
         )
-        current_app.mail.send(msg)
+        get_mail().send(msg)
         return True
     except Exception as e:
         logging.error(f"Failed to send email: {str(e)}")
@@ -0,0 +1,103 @@
+from functools import lru_cache
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+import os
+import threading
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'email')
+
+# Each email is sent as both a plain-text and an HTML part
+VARIANTS = ('txt', 'html')
+
+
+class EmailTemplates:
+    """
+    Jinja templates for outgoing emails, compiled once per process.
+
+    Every email template `<name>` has a `<name>.txt` and a `<name>.html`
+    variant that extend the shared `_layout` and include partials (names
+    starting with `_`). All templates are compiled when the environment is
+    first used in a process and are never reloaded from disk.
+
+    Order item lines are rendered from the `_item` fragment and cached by
+    (name, quantity, line total), so large orders and batches of status
+    updates for the same products render each line once.
+    """
+
+    def __init__(self, template_folder=TEMPLATE_FOLDER, fragment_cache_size=4096):
+        self.template_folder = template_folder
+        self._environment = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._item_fragment = lru_cache(maxsize=fragment_cache_size)(self._render_item)
+
+    def init_app(self, app):
+        self._item_fragment = lru_cache(maxsize=app.config['EMAIL_FRAGMENT_CACHE_SIZE'])(self._render_item)
+        app.extensions['email_templates'] = self
+
+    @property
+    def environment(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    environment = Environment(
+                        loader=FileSystemLoader(self.template_folder),
+                        autoescape=select_autoescape(['html']),
+                        auto_reload=False,
+                        cache_size=-1,
+                        trim_blocks=True,
+                        lstrip_blocks=True
+                    )
+                    # Compile everything up front so no message pays for it
+                    for name in environment.list_templates():
+                        environment.get_template(name)
+                    self._environment = environment
+                    self._pid = pid
+        return self._environment
+
+    def render(self, name, lines=None, **context):
+        """
+        Render both variants of an email template.
+
+        Args:
+            name (str): Template name, without extension
+            lines (dict, optional): Variant -> pre-rendered lines (see item_lines)
+            **context: Template variables shared by both variants
+
+        Returns:
+            tuple: (plain text body, HTML body)
+        """
+        return tuple(
+            self.environment.get_template(f'{name}.{variant}').render(lines=(lines or {}).get(variant, []), **context)
+            for variant in VARIANTS
+        )
+
+    def item_lines(self, items, products):
+        """
+        Rendered lines for order items, skipping products that no longer exist.
+
+        Returns:
+            dict: Variant -> list of lines
+        """
+        lines = {variant: [] for variant in VARIANTS}
+        for item in items:
+            product = products.get(str(item.product_id))
+            if not product:
+                continue
+            for variant in VARIANTS:
+                lines[variant].append(self._item_fragment(variant, product.name, item.quantity, item.price * item.quantity))
+        return lines
+
+    def cache_info(self):
+        return self._item_fragment.cache_info()
+
+    def _render_item(self, variant, name, quantity, line_total):
+        fragment = self.environment.get_template(f'_item.{variant}').render(
+            name=name, quantity=quantity, line_total=line_total
+        )
+        # Already escaped; the HTML layouts must not escape it again
+        return Markup(fragment) if variant == 'html' else fragment
+
+
+email_templates = EmailTemplates()
@@ -0,0 +1,140 @@
+from functools import wraps
+from flask import current_app, request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+from redis.exceptions import LockError
+import hashlib
+import json
+import threading
+import time
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _scope():
+    # Keys are scoped per user so one client cannot replay another's response
+    try:
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    return identity or request.remote_addr or 'anonymous'
+
+
+def _fingerprint():
+    payload = request.get_data() or b''
+    return hashlib.sha256(request.method.encode() + request.path.encode() + payload).hexdigest()
+
+
+def _replay(stored):
+    response = make_response(stored['body'], stored['status'])
+    response.headers['Content-Type'] = stored['content_type']
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _keep_alive(lock, stop):
+    # Extend the lock while the view runs, so a slow request never loses it
+    while not stop.wait(lock.timeout / 3):
+        try:
+            lock.extend(lock.timeout, replace_ttl=True)
+        except LockError:
+            return
+
+
+def idempotent(ttl=None, lock_timeout=None):
+    """
+    Make a mutating endpoint safe to retry using the Idempotency-Key header.
+
+    The first request carrying a given key runs the view and its response is
+    stored in Redis for `ttl` seconds. Replays with the same key get the stored
+    response back without re-running the view. Concurrent duplicates are
+    serialized with a Redis lock: they wait for the first request to finish
+    and then replay its response, or get a 409 if it takes too long. The lock
+    holds a per-request token, is extended while the view runs and is only
+    released by its holder. If the first request fails without storing a
+    response (a server error), a waiting duplicate takes the lock and runs.
+
+    Requests without the header are passed through unchanged.
+
+    Args:
+        ttl (int, optional): Seconds to keep stored responses
+            (defaults to IDEMPOTENCY_TTL)
+        lock_timeout (int, optional): Seconds a duplicate waits for the
+            in-flight request (defaults to IDEMPOTENCY_LOCK_TIMEOUT)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+
+            if len(key) > 255:
+                return jsonify({'error': 'Idempotency key too long'}), 400
+
+            redis = current_app.redis
+            response_ttl = ttl or current_app.config['IDEMPOTENCY_TTL']
+            wait_timeout = lock_timeout or current_app.config['IDEMPOTENCY_LOCK_TIMEOUT']
+
+            base_key = f'idempotency:{request.blueprint}.{view.__name__}:{_scope()}:{key}'
+            response_key = f'{base_key}:response'
+            lock_key = f'{base_key}:lock'
+            fingerprint = _fingerprint()
+
+            def lookup():
+                # The stored response, if the request already completed
+                stored = redis.get(response_key)
+                if not stored:
+                    return None
+                stored = json.loads(stored)
+                if stored['fingerprint'] != fingerprint:
+                    return jsonify({'error': 'Idempotency key reused with a different request'}), 422
+                return _replay(stored)
+
+            # Replay a completed request
+            replayed = lookup()
+            if replayed:
+                return replayed
+
+            # Serialize concurrent duplicates behind a lock
+            lock = redis.lock(lock_key, timeout=wait_timeout * 2, thread_local=False)
+            if not lock.acquire(blocking=False):
+                deadline = time.monotonic() + wait_timeout
+                while True:
+                    if time.monotonic() >= deadline:
+                        return jsonify({'error': 'A request with this idempotency key is already in progress'}), 409
+                    time.sleep(0.05)
+                    replayed = lookup()
+                    if replayed:
+                        return replayed
+                    # The lock is gone without a stored response: run the request here
+                    if lock.acquire(blocking=False):
+                        break
+
+            stop = threading.Event()
+            threading.Thread(target=_keep_alive, args=(lock, stop), name='idempotency-lock', daemon=True).start()
+            try:
+                # The holder may have stored its response just before releasing
+                replayed = lookup()
+                if replayed:
+                    return replayed
+
+                response = make_response(view(*args, **kwargs))
+
+                # Server errors are not stored so the client can retry them
+                if response.status_code < 500:
+                    redis.set(response_key, json.dumps({
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'content_type': response.content_type,
+                        'body': response.get_data(as_text=True)
+                    }), ex=response_ttl)
+                return response
+            finally:
+                stop.set()
+                try:
+                    # Compare-and-delete: never releases a lock another request took over
+                    lock.release()
+                except LockError:
+                    pass
+        return wrapper
+    return decorator
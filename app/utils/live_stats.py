@@ -0,0 +1,136 @@
+from flask import current_app
+import logging
+import math
+import time
+
+KEY_PREFIX = 'live_stats'
+
+# Per-bucket counters, and the unique-user sets (HyperLogLogs) reported with them
+COUNTERS = ('orders', 'revenue', 'cart_adds', 'cart_units', 'logins')
+UNIQUES = ('shoppers', 'buyers')
+
+
+def counter_key(name, bucket):
+    return f'{KEY_PREFIX}:{name}:{bucket}'
+
+
+def uniques_key(name, bucket):
+    return f'{KEY_PREFIX}:hll:{name}:{bucket}'
+
+
+def record(counters=None, uniques=None):
+    """
+    Add to the current time bucket's counters and unique-user sets.
+
+    Everything is written with one pipelined round trip. Stats are best
+    effort: a Redis error is logged and never fails the request.
+
+    Args:
+        counters (dict, optional): Counter name -> amount (int, or float for revenue)
+        uniques (dict, optional): Unique-user set name -> user id
+    """
+    config = current_app.config
+    if not config['LIVE_STATS_ENABLED']:
+        return
+    bucket_seconds = config['LIVE_STATS_BUCKET_SECONDS']
+    bucket = int(time.time() // bucket_seconds)
+    # Buckets outlive the longest window by one bucket
+    ttl = config['LIVE_STATS_RETENTION'] + bucket_seconds
+
+    try:
+        pipeline = current_app.redis.pipeline(transaction=False)
+        for name, amount in (counters or {}).items():
+            key = counter_key(name, bucket)
+            if isinstance(amount, float):
+                pipeline.incrbyfloat(key, amount)
+            else:
+                pipeline.incrby(key, amount)
+            pipeline.expire(key, ttl)
+        for name, user_id in (uniques or {}).items():
+            key = uniques_key(name, bucket)
+            pipeline.pfadd(key, str(user_id))
+            pipeline.expire(key, ttl)
+        pipeline.execute()
+    except Exception as e:
+        logging.warning(f"Failed to record live stats: {str(e)}")
+
+
+def record_order(user_id, total_amount):
+    record({'orders': 1, 'revenue': float(total_amount)}, {'shoppers': user_id, 'buyers': user_id})
+
+
+def record_cart_add(user_id, quantity):
+    record({'cart_adds': 1, 'cart_units': quantity}, {'shoppers': user_id})
+
+
+def record_login(user_id):
+    record({'logins': 1}, {'shoppers': user_id})
+
+
+def parse_windows(value, retention):
+    """
+    Parse a comma-separated list of window lengths in seconds.
+
+    Raises:
+        ValueError: If a window is not a positive integer up to `retention`
+    """
+    try:
+        windows = sorted({int(window) for window in str(value).split(',') if window.strip()})
+    except ValueError:
+        raise ValueError('windows must be a comma-separated list of seconds')
+    if not windows or windows[0] < 1 or windows[-1] > retention:
+        raise ValueError(f'windows must be between 1 and {retention} seconds')
+    return windows
+
+
+def read(windows, now=None):
+    """
+    Totals over rolling windows ending now.
+
+    A window of N seconds covers the buckets that overlap the last N
+    seconds, including the current, partial one. Counters for every bucket
+    of the longest window and the unique-user counts for each window
+    (PFCOUNT merges the window's HyperLogLogs) are read in one pipelined
+    round trip. Unique counts have a standard error of about 0.8%.
+
+    Args:
+        windows (list): Window lengths in seconds
+        now (float, optional): Current time, for testing
+
+    Returns:
+        dict: Bucket size and, per window, totals, orders per minute and unique users
+    """
+    bucket_seconds = current_app.config['LIVE_STATS_BUCKET_SECONDS']
+    now = time.time() if now is None else now
+    current = int(now // bucket_seconds)
+    spans = {window: math.ceil(window / bucket_seconds) for window in windows}
+    buckets = list(range(current - max(spans.values()) + 1, current + 1))
+
+    pipeline = current_app.redis.pipeline(transaction=False)
+    for name in COUNTERS:
+        pipeline.mget([counter_key(name, bucket) for bucket in buckets])
+    for window in windows:
+        for name in UNIQUES:
+            pipeline.pfcount(*[uniques_key(name, bucket) for bucket in buckets[-spans[window]:]])
+    results = pipeline.execute()
+
+    series = {name: [float(value or 0) for value in values] for name, values in zip(COUNTERS, results)}
+    unique_counts = iter(results[len(COUNTERS):])
+    # The current bucket has only run for part of its length
+    elapsed_in_bucket = now - current * bucket_seconds
+
+    stats = {}
+    for window in windows:
+        span = spans[window]
+        totals = {name: sum(series[name][-span:]) for name in COUNTERS}
+        covered = (span - 1) * bucket_seconds + elapsed_in_bucket
+        stats[str(window)] = {
+            'orders': int(totals['orders']),
+            'revenue': round(totals['revenue'], 2),
+            'cart_adds': int(totals['cart_adds']),
+            'cart_units': int(totals['cart_units']),
+            'logins': int(totals['logins']),
+            'orders_per_minute': round(totals['orders'] * 60 / covered, 2) if covered else 0,
+            **{f'unique_{name}': next(unique_counts) for name in UNIQUES}
+        }
+    return {'bucket_seconds': bucket_seconds, 'windows': stats}
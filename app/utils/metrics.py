@@ -0,0 +1,237 @@
+from flask import Response, g, has_app_context, jsonify, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+from redis import Redis
+import hmac
+import ipaddress
+import logging
+import os
+import threading
+import time
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by route',
+    ['method', 'endpoint', 'status']
+)
+REQUEST_MONGO_COMMANDS = Histogram(
+    'http_request_mongo_commands',
+    'MongoDB commands issued per request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+MONGO_COMMANDS = Counter(
+    'mongo_commands_total',
+    'MongoDB commands by name and outcome',
+    ['command', 'outcome']
+)
+MONGO_LATENCY = Histogram(
+    'mongo_command_duration_seconds',
+    'MongoDB command latency',
+    ['command']
+)
+REDIS_COMMANDS = Counter(
+    'redis_commands_total',
+    'Redis commands by name',
+    ['command']
+)
+REDIS_LATENCY = Histogram(
+    'redis_command_duration_seconds',
+    'Redis command latency',
+    ['command']
+)
+CELERY_ENQUEUE_LATENCY = Histogram(
+    'celery_enqueue_duration_seconds',
+    'Time to publish a task to the broker',
+    ['task']
+)
+
+
+def _request_stats():
+    # Per-request counters live on flask.g; commands outside a request are only counted globally
+    if not has_app_context():
+        return None
+    stats = g.get('_perf_stats')
+    if stats is None:
+        stats = g._perf_stats = {'mongo_count': 0, 'mongo_time': 0.0, 'redis_count': 0, 'redis_time': 0.0}
+    return stats
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Counts and times MongoDB commands. Events fire on the calling thread."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, 'success')
+
+    def failed(self, event):
+        self._record(event, 'failure')
+
+    def _record(self, event, outcome):
+        duration = event.duration_micros / 1e6
+        MONGO_COMMANDS.labels(event.command_name, outcome).inc()
+        MONGO_LATENCY.labels(event.command_name).observe(duration)
+        stats = _request_stats()
+        if stats is not None:
+            stats['mongo_count'] += 1
+            stats['mongo_time'] += duration
+
+
+class InstrumentedRedis(Redis):
+    """Redis client that counts and times every command it executes."""
+
+    def execute_command(self, *args, **options):
+        command = str(args[0]).upper() if args else 'UNKNOWN'
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            duration = time.perf_counter() - started
+            REDIS_COMMANDS.labels(command).inc()
+            REDIS_LATENCY.labels(command).observe(duration)
+            stats = _request_stats()
+            if stats is not None:
+                stats['redis_count'] += 1
+                stats['redis_time'] += duration
+
+
+_publish_started = threading.local()
+
+
+def _before_task_publish(sender=None, headers=None, **kwargs):
+    if headers and 'id' in headers:
+        if not hasattr(_publish_started, 'tasks'):
+            _publish_started.tasks = {}
+        _publish_started.tasks[headers['id']] = time.perf_counter()
+
+
+def _after_task_publish(sender=None, headers=None, **kwargs):
+    tasks = getattr(_publish_started, 'tasks', {})
+    started = tasks.pop(headers.get('id'), None) if headers else None
+    if started is not None:
+        CELERY_ENQUEUE_LATENCY.labels(sender or 'unknown').observe(time.perf_counter() - started)
+
+
+def connect_celery_signals():
+    """Time task publishing; called when the Celery app is first created."""
+    from celery.signals import before_task_publish, after_task_publish
+    before_task_publish.connect(_before_task_publish, weak=False)
+    after_task_publish.connect(_after_task_publish, weak=False)
+
+
+class PasswordHasherCollector:
+    """Exposes the password hashing pool counters kept by PasswordHasher."""
+
+    def __init__(self, hasher):
+        self.hasher = hasher
+
+    def collect(self):
+        stats = self.hasher.stats()
+        for name, description in [
+            ('jobs', 'Password hashing jobs completed'),
+            ('rejected', 'Password hashing jobs rejected because the queue was full'),
+            ('in_flight', 'Password hashing jobs queued or running'),
+            ('queue_seconds_total', 'Total time hashing jobs spent queued'),
+            ('queue_seconds_max', 'Longest time a hashing job spent queued'),
+            ('run_seconds_total', 'Total time spent hashing')
+        ]:
+            yield GaugeMetricFamily(f'password_hash_{name}', description, value=stats[name])
+
+
+class ConnectionPoolCollector:
+    """Exposes MongoDB and Redis pool saturation for this process."""
+
+    def __init__(self, connections):
+        self.connections = connections
+
+    def collect(self):
+        stats = self.connections.stats()
+        for pool in ('mongo', 'redis'):
+            if pool not in stats:
+                continue
+            for name, value in stats[pool].items():
+                yield GaugeMetricFamily(f'{pool}_pool_{name}', f'{pool.capitalize()} connection pool {name.replace("_", " ")}', value=value)
+
+
+def _server_timing(total, stats):
+    parts = [f'app;dur={total * 1000:.1f}']
+    if stats:
+        parts.append(f'mongo;desc="{stats["mongo_count"]} commands";dur={stats["mongo_time"] * 1000:.1f}')
+        parts.append(f'redis;desc="{stats["redis_count"]} commands";dur={stats["redis_time"] * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def init_app(app, hasher=None, connections=None):
+    """
+    Register request instrumentation and the /metrics endpoint.
+
+    Set PROMETHEUS_MULTIPROC_DIR when running several gunicorn workers so that
+    /metrics aggregates all of them.
+    """
+    if hasher is not None and not getattr(init_app, '_hasher_registered', False):
+        REGISTRY.register(PasswordHasherCollector(hasher))
+        init_app._hasher_registered = True
+    if connections is not None and not getattr(init_app, '_connections_registered', False):
+        REGISTRY.register(ConnectionPoolCollector(connections))
+        init_app._connections_registered = True
+
+    @app.before_request
+    def start_request_timer():
+        g._perf_started = time.perf_counter()
+        _request_stats()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('_perf_started')
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        stats = g.get('_perf_stats')
+
+        REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(total)
+        if stats:
+            REQUEST_MONGO_COMMANDS.labels(endpoint).observe(stats['mongo_count'])
+            threshold = app.config['METRICS_MONGO_COMMANDS_WARNING']
+            if threshold and stats['mongo_count'] > threshold:
+                logging.warning(f"{endpoint} issued {stats['mongo_count']} MongoDB commands in one request")
+
+        if app.config['METRICS_SERVER_TIMING']:
+            response.headers['Server-Timing'] = _server_timing(total, stats)
+        return response
+
+    allowed_networks = [
+        ipaddress.ip_network(entry.strip(), strict=False)
+        for entry in app.config['METRICS_ALLOWED_IPS'].split(',') if entry.strip()
+    ]
+
+    def authorized():
+        # A scraper is let in by bearer token or by source address
+        token = app.config['METRICS_TOKEN']
+        header = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+        try:
+            address = ipaddress.ip_address(request.remote_addr or '')
+        except ValueError:
+            return False
+        return any(address in network for network in allowed_networks)
+
+    def metrics():
+        if not authorized():
+            return jsonify({'error': 'Forbidden'}), 403
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    return metrics
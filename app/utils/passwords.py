@@ -0,0 +1,125 @@
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+import multiprocessing
+import os
+import threading
+import time
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when a hashing job waited longer than the queue timeout."""
+
+
+def _hash_job(password, method):
+    return time.time(), generate_password_hash(password, method=method)
+
+
+def _verify_job(pwhash, password):
+    return time.time(), check_password_hash(pwhash, password)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a bounded process pool instead of request threads.
+
+    At most PASSWORD_HASH_MAX_PENDING jobs are admitted at once; further callers
+    wait up to PASSWORD_HASH_QUEUE_TIMEOUT seconds and then get
+    PasswordHasherBusy, so a login storm degrades into fast 503s instead of
+    starving every other endpoint on the worker. Set PASSWORD_HASH_WORKERS to 0
+    to hash inline (still bounded).
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.workers = 0
+        self.max_pending = 8
+        self.queue_timeout = 5
+        self._executor = None
+        self._executor_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._method_prefix = None
+        self._stats = {
+            'jobs': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'queue_seconds_total': 0.0,
+            'queue_seconds_max': 0.0,
+            'run_seconds_total': 0.0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.max_pending = app.config['PASSWORD_HASH_MAX_PENDING']
+        self.queue_timeout = app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._method_prefix = None
+
+    def hash(self, password):
+        return self._run(_hash_job, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(_verify_job, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if the hash was made with a different method or cost than configured."""
+        if self._method_prefix is None:
+            # Werkzeug expands defaults (e.g. 'scrypt' -> 'scrypt:32768:8:1')
+            self._method_prefix = generate_password_hash('', method=self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.max_pending
+        return stats
+
+    def _get_executor(self):
+        # Pools do not survive a fork; each worker process creates its own
+        pid = os.getpid()
+        if self._executor_pid != pid:
+            with self._lock:
+                if self._executor_pid != pid:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    self._executor_pid = pid
+        return self._executor
+
+    def _run(self, job, *args):
+        submitted = time.time()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PasswordHasherBusy()
+
+        with self._lock:
+            self._stats['in_flight'] += 1
+        try:
+            if self.workers:
+                started, result = self._get_executor().submit(job, *args).result()
+            else:
+                started, result = job(*args)
+        finally:
+            self._slots.release()
+            finished = time.time()
+            with self._lock:
+                self._stats['in_flight'] -= 1
+
+        queued = max(started - submitted, 0)
+        with self._lock:
+            self._stats['jobs'] += 1
+            self._stats['queue_seconds_total'] += queued
+            self._stats['queue_seconds_max'] = max(self._stats['queue_seconds_max'], queued)
+            self._stats['run_seconds_total'] += finished - started
+        return result
+
+
+password_hasher = PasswordHasher()
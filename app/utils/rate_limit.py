@@ -0,0 +1,271 @@
+from flask import current_app
+from limits.storage import SlidingWindowCounterSupport, Storage
+from redis import ConnectionPool, Redis
+from redis.exceptions import RedisError
+import logging
+import math
+import os
+import threading
+import time
+
+# Prefix for the rate limit storage URI, e.g. local+redis://localhost:6379/0
+LOCAL_FIRST_PREFIX = 'local+'
+
+
+def configured_limit(name):
+    """Limit string read from app config at request time, for `limiter.limit`."""
+    return lambda: current_app.config[name]
+
+
+class _Window:
+    """Hit counts for one rate limit key in its current and previous window."""
+
+    __slots__ = ('expiry', 'index', 'previous', 'synced', 'pending', 'touched')
+
+    def __init__(self, expiry, index):
+        self.expiry = expiry
+        self.index = index
+        self.previous = 0  # Previous window total, all processes
+        self.synced = 0  # Current window total, all processes, as of the last sync
+        self.pending = 0  # Hits made in this process and not yet synced
+        self.touched = 0
+
+    def remaining(self, now):
+        # Seconds left in the current window, which is also how long the
+        # previous window still overlaps the sliding one
+        return (self.index + 1) * self.expiry - now
+
+    def weighted(self, now):
+        # Sliding window: weight the previous window by how much of it still overlaps
+        return self.previous * self.remaining(now) / self.expiry + self.synced + self.pending
+
+    def estimate(self, now):
+        return math.floor(self.weighted(now))
+
+
+class LocalFirstStorage(Storage, SlidingWindowCounterSupport):
+    """
+    Flask-Limiter storage that counts hits in process and syncs them to Redis
+    in batches.
+
+    Each process keeps a sliding window counter per key (the current fixed
+    window plus a weighted share of the previous one). A background thread
+    pushes the pending hits of every active key to Redis every
+    `sync_interval` seconds in one pipeline and reads back the totals of all
+    processes. A key with `max_pending` unsynced hits is synced inline, so a
+    limit can be exceeded by at most (processes - 1) * max_pending hits.
+
+    Use it with the sliding-window-counter strategy, which checks the limit
+    against the weighted count before taking a hit. Under the fixed-window
+    strategy, `incr` and `get` return the same weighted count in place of the
+    fixed window count.
+    """
+
+    STORAGE_SCHEME = [LOCAL_FIRST_PREFIX + 'redis', LOCAL_FIRST_PREFIX + 'rediss']
+
+    def __init__(self, uri, connection_pool=None, sync_interval=0.25, max_pending=5,
+                 key_prefix='LIMITS', wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions)
+        if connection_pool is None:
+            connection_pool = ConnectionPool.from_url(uri[len(LOCAL_FIRST_PREFIX):], **options)
+        self.redis = Redis(connection_pool=connection_pool)
+        self.sync_interval = sync_interval
+        self.max_pending = max(1, max_pending)
+        self.key_prefix = key_prefix
+        self._windows = {}
+        self._carry = []  # (redis key, hits, expiry) left over from rolled windows
+        self._pid = None
+        self._failing = False
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+
+    @property
+    def base_exceptions(self):
+        return RedisError
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        self._ensure_sync_thread()
+        now = time.time()
+        with self._lock:
+            window = self._window(key, expiry, now)
+            window.pending += amount
+            window.touched = now
+            if window.pending < self.max_pending:
+                return window.estimate(now)
+
+        # Too many unsynced hits on this key: sync it now to keep the error bounded
+        self.sync([key])
+        now = time.time()
+        with self._lock:
+            return self._window(key, expiry, now).estimate(now)
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        self._ensure_sync_thread()
+        now = time.time()
+        with self._lock:
+            window = self._window(key, expiry, now)
+            if math.floor(window.weighted(now)) + amount > limit:
+                return False
+            window.pending += amount
+            window.touched = now
+            if window.pending < self.max_pending:
+                return True
+
+        # Too many unsynced hits on this key: sync it now to keep the error bounded
+        self.sync([key])
+        return True
+
+    def get_sliding_window(self, key, expiry):
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or window.expiry != expiry:
+                return 0, 0.0, 0, (int(now // expiry) + 1) * expiry - now + expiry
+            window = self._window(key, expiry, now)
+            remaining = window.remaining(now)
+            return (
+                window.previous,
+                remaining if window.previous else 0.0,
+                window.synced + window.pending,
+                # Current window keys are kept for one window after it ends
+                remaining + expiry
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                return 0
+            return self._window(key, window.expiry, now).estimate(now)
+
+    def get_expiry(self, key):
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                return time.time()
+            return (window.index + 1) * window.expiry
+
+    def check(self):
+        try:
+            return self.redis.ping()
+        except RedisError:
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._windows = {}
+            self._carry = []
+        keys = list(self.redis.scan_iter(match=f'{self.key_prefix}:*', count=1000))
+        return self.redis.delete(*keys) if keys else 0
+
+    def clear(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+        keys = list(self.redis.scan_iter(match=f'{self.key_prefix}:{key}:*'))
+        if keys:
+            self.redis.delete(*keys)
+
+    def sync(self, keys=None):
+        """Push pending hits to Redis and read back the totals of all processes."""
+        now = time.time()
+        with self._lock:
+            batch = []
+            for key in list(self._windows) if keys is None else keys:
+                window = self._windows.get(key)
+                if window is None:
+                    continue
+                if now - window.touched > 2 * window.expiry and not window.pending:
+                    # Idle long enough that neither window matters any more
+                    del self._windows[key]
+                    continue
+                window = self._window(key, window.expiry, now)
+                batch.append((key, window.index, window.expiry, window.pending))
+                window.pending = 0
+            carry, self._carry = self._carry, []
+        if not batch and not carry:
+            return
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for redis_key, hits, expiry in carry:
+            pipeline.incrby(redis_key, hits)
+            pipeline.expire(redis_key, 2 * expiry)
+        for key, index, expiry, hits in batch:
+            current = self._redis_key(key, index)
+            pipeline.incrby(current, hits)
+            pipeline.expire(current, 2 * expiry)
+            pipeline.get(self._redis_key(key, index - 1))
+        try:
+            results = pipeline.execute()
+        except RedisError:
+            self._restore(batch, carry)
+            raise
+
+        results = results[2 * len(carry):]
+        with self._lock:
+            for position, (key, index, expiry, hits) in enumerate(batch):
+                synced, _, previous = results[3 * position:3 * position + 3]
+                window = self._windows.get(key)
+                if window is None or window.index != index:
+                    continue
+                # Totals only grow within a window; an older reply must not win
+                window.synced = max(window.synced, int(synced))
+                window.previous = int(previous or 0)
+
+    def _window(self, key, expiry, now):
+        # Must be called with the lock held
+        index = int(now // expiry)
+        window = self._windows.get(key)
+        if window is None or window.expiry != expiry:
+            window = self._windows[key] = _Window(expiry, index)
+        elif window.index != index:
+            # Unsynced hits still count towards the window they were made in
+            if window.pending:
+                self._carry.append((self._redis_key(key, window.index), window.pending, expiry))
+            window.previous = window.synced + window.pending if index == window.index + 1 else 0
+            window.index, window.synced, window.pending = index, 0, 0
+        return window
+
+    def _restore(self, batch, carry):
+        # Keep hits from a failed sync for the next attempt
+        with self._lock:
+            self._carry = carry + self._carry
+            for key, index, expiry, hits in batch:
+                window = self._windows.get(key)
+                if window is not None and window.index == index:
+                    window.pending += hits
+                elif hits:
+                    self._carry.append((self._redis_key(key, index), hits, expiry))
+
+    def _redis_key(self, key, index):
+        return f'{self.key_prefix}:{key}:{index}'
+
+    def _ensure_sync_thread(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._thread_lock:
+            if self._pid == pid:
+                return
+            # Counters inherited across a fork belong to the parent
+            self._lock = threading.Lock()
+            self._windows = {}
+            self._carry = []
+            self._pid = pid
+            threading.Thread(target=self._sync_loop, args=(pid,), name='ratelimit-sync', daemon=True).start()
+
+    def _sync_loop(self, pid):
+        while self._pid == pid:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+                if self._failing:
+                    logging.info("Rate limit sync recovered")
+                self._failing = False
+            except Exception as e:
+                # Keep counting locally; log once per outage
+                if not self._failing:
+                    logging.warning(f"Rate limit sync failed: {str(e)}")
+                self._failing = True
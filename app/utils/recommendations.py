@@ -0,0 +1,227 @@
+from ..models.product import Product
+import json
+
+KEY_PREFIX = 'recommendations'
+# Hash of product id -> number of counted orders containing it
+SUPPORT_KEY = f'{KEY_PREFIX}:support'
+# Orders already counted, so retried or overlapping updates count each order once
+COUNTED_TTL = 7 * 86400
+# Hashes written per pipeline
+CHUNK_SIZE = 500
+
+
+def co_occurrence_key(product_id):
+    # Row of the co-occurrence matrix: other product id -> orders containing both
+    return f'{KEY_PREFIX}:cooc:{product_id}'
+
+
+def related_key(product_id):
+    return f'{KEY_PREFIX}:related:{product_id}'
+
+
+def counted_key(order_id):
+    return f'{KEY_PREFIX}:counted:{order_id}'
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def count_pairs(baskets, max_basket=None):
+    """
+    Sparse co-occurrence counts of baskets of product ids.
+
+    Each basket counts once per distinct product and once per distinct pair
+    of products, in both directions. Baskets with more than `max_basket`
+    products are skipped: they add many pairs and say little about what
+    goes together.
+
+    Returns:
+        tuple: (product ids, rows, cols, counts, support), where rows, cols
+        and counts are COO arrays indexing the product ids and support
+        counts the baskets containing each product
+    """
+    # NumPy is only needed by the Celery tasks, so it is imported on first use
+    import numpy as np
+
+    baskets = [sorted({str(product_id) for product_id in basket}) for basket in baskets]
+    if max_basket:
+        baskets = [basket for basket in baskets if len(basket) <= max_basket]
+    product_ids = sorted({product_id for basket in baskets for product_id in basket})
+    index = {product_id: i for i, product_id in enumerate(product_ids)}
+    size = len(product_ids)
+
+    support = np.zeros(size, dtype=np.int64)
+    rows, cols = [], []
+    for basket in baskets:
+        indexes = np.fromiter((index[product_id] for product_id in basket), dtype=np.int64, count=len(basket))
+        support[indexes] += 1
+        upper, lower = np.triu_indices(len(indexes), k=1)
+        rows += [indexes[upper], indexes[lower]]
+        cols += [indexes[lower], indexes[upper]]
+
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return product_ids, empty, empty, empty, support
+    # Coalesce duplicate (row, col) entries into counts
+    cells, counts = np.unique(np.concatenate(rows) * size + np.concatenate(cols), return_counts=True)
+    return product_ids, cells // size, cells % size, counts, support
+
+
+def add_orders(redis, orders, max_basket=None):
+    """
+    Add orders to the co-occurrence matrix in Redis.
+
+    Orders are first marked as counted with SET NX in one pipeline, and only
+    the ones marked by this call are added, with HINCRBYs in a second one.
+
+    Returns:
+        int: Number of orders added
+    """
+    orders = list(orders)
+    if not orders:
+        return 0
+    pipeline = redis.pipeline(transaction=False)
+    for order in orders:
+        pipeline.set(counted_key(order._id), 1, nx=True, ex=COUNTED_TTL)
+    orders = [order for order, marked in zip(orders, pipeline.execute()) if marked]
+    if not orders:
+        return 0
+
+    product_ids, rows, cols, counts, support = count_pairs(
+        ([item.product_id for item in order.items] for order in orders), max_basket
+    )
+    pipeline = redis.pipeline(transaction=False)
+    for i, product_id in enumerate(product_ids):
+        pipeline.hincrby(SUPPORT_KEY, product_id, int(support[i]))
+    for row, col, count in zip(rows.tolist(), cols.tolist(), counts.tolist()):
+        pipeline.hincrby(co_occurrence_key(product_ids[row]), product_ids[col], count)
+    pipeline.execute()
+    return len(orders)
+
+
+def reset(redis):
+    """Drop the co-occurrence matrix, the counted-order marks and the related products."""
+    for pattern in (f'{KEY_PREFIX}:cooc:*', f'{KEY_PREFIX}:counted:*', f'{KEY_PREFIX}:related:*'):
+        keys = list(redis.scan_iter(match=pattern, count=1000))
+        for start in range(0, len(keys), CHUNK_SIZE):
+            redis.delete(*keys[start:start + CHUNK_SIZE])
+    redis.delete(SUPPORT_KEY)
+
+
+def load_matrix(redis):
+    """
+    Read the co-occurrence matrix from Redis as COO arrays.
+
+    Returns:
+        tuple: (product ids, rows, cols, counts, support), as for count_pairs
+    """
+    import numpy as np
+
+    support_counts = {_decode(product_id): int(count) for product_id, count in redis.hgetall(SUPPORT_KEY).items()}
+    product_ids = sorted(support_counts)
+    index = {product_id: i for i, product_id in enumerate(product_ids)}
+    support = np.array([support_counts[product_id] for product_id in product_ids], dtype=np.int64)
+
+    rows, cols, counts = [], [], []
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        pipeline = redis.pipeline(transaction=False)
+        for product_id in chunk:
+            pipeline.hgetall(co_occurrence_key(product_id))
+        for product_id, row in zip(chunk, pipeline.execute()):
+            for other_id, count in row.items():
+                other_id = _decode(other_id)
+                if other_id in index:
+                    rows.append(index[product_id])
+                    cols.append(index[other_id])
+                    counts.append(int(count))
+    return (
+        product_ids,
+        np.array(rows, dtype=np.int64),
+        np.array(cols, dtype=np.int64),
+        np.array(counts, dtype=np.int64),
+        support
+    )
+
+
+def top_k(rows, cols, counts, support, k, min_count=1):
+    """
+    The `k` best neighbours of every row of a co-occurrence matrix.
+
+    Pairs seen in fewer than `min_count` orders are ignored. The rest are
+    scored by cosine similarity, count / sqrt(support[row] * support[col]),
+    so products that are in every order do not top every list.
+
+    Returns:
+        tuple: (rows, cols, counts, scores), sorted by row and best score first
+    """
+    import numpy as np
+
+    keep = counts >= min_count
+    rows, cols, counts = rows[keep], cols[keep], counts[keep]
+    scores = counts / np.sqrt(support[rows] * support[cols])
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, counts, scores = rows[order], cols[order], counts[order], scores[order]
+    # Rank of each entry within its row: position minus the row's first position
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = ranks < k
+    return rows[keep], cols[keep], counts[keep], scores[keep]
+
+
+def refresh_related(db, redis, k=10, min_count=1):
+    """
+    Recompute the top-`k` related products of every product into Redis.
+
+    Each product's list is stored under one key with the names of the
+    related products, so serving it is a single GET. Deleted products are
+    left out, and products that lost all their related products have their
+    key removed.
+
+    Returns:
+        int: Number of products with related products
+    """
+    import numpy as np
+
+    product_ids, rows, cols, counts, support = load_matrix(redis)
+    rows, cols, counts, scores = top_k(rows, cols, counts, support, k, min_count)
+    products = {}
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        products.update(Product.get_many(db, product_ids[start:start + CHUNK_SIZE]))
+
+    row_ids, starts = np.unique(rows, return_index=True)
+    stale = set(product_ids) - {product_ids[row] for row in row_ids.tolist()}
+    pipeline = redis.pipeline(transaction=False)
+    written = 0
+    for row, row_cols, row_counts, row_scores in zip(
+        row_ids.tolist(), np.split(cols, starts[1:]), np.split(counts, starts[1:]), np.split(scores, starts[1:])
+    ):
+        related = [
+            {
+                'product_id': product_ids[col],
+                'name': products[product_ids[col]].name,
+                'orders': count,
+                'score': round(score, 4)
+            }
+            for col, count, score in zip(row_cols.tolist(), row_counts.tolist(), row_scores.tolist())
+            if product_ids[col] in products
+        ]
+        if related and product_ids[row] in products:
+            pipeline.set(related_key(product_ids[row]), json.dumps(related))
+            written += 1
+        else:
+            stale.add(product_ids[row])
+        if len(pipeline) >= CHUNK_SIZE:
+            pipeline.execute()
+    for product_id in stale:
+        pipeline.delete(related_key(product_id))
+    pipeline.execute()
+    return written
+
+
+def get_related(redis, product_id, limit=None):
+    """Related products of a product, best first; empty until the next refresh."""
+    related = redis.get(related_key(product_id))
+    if not related:
+        return []
+    return json.loads(related)[:limit]
@@ -0,0 +1,225 @@
+from datetime import datetime
+from .response_cache import invalidate, invalidate_many
+import logging
+import math
+
+# Prices are stored in currency units with cents
+CENT = 0.01
+
+
+class RepricingRule:
+    """
+    A percentage change for one category (or every category), followed by
+    rounding and optional floor and ceiling prices.
+
+    Rounding is either to the nearest multiple of `round_to` or, when
+    `ending` is set, to the whole number below plus `ending` (for example
+    0.99). Floor and ceiling are applied after rounding.
+    """
+
+    def __init__(self, category, percent, round_to=CENT, ending=None, floor=None, ceiling=None):
+        self.category = category
+        self.percent = percent
+        self.round_to = round_to
+        self.ending = ending
+        self.floor = floor
+        self.ceiling = ceiling
+
+    @staticmethod
+    def from_dict(data):
+        """
+        Build a rule from a request payload.
+
+        Raises:
+            ValueError: On a missing or invalid field
+        """
+        if not isinstance(data, dict) or 'percent' not in data:
+            raise ValueError('Each rule needs a percent')
+        try:
+            rule = RepricingRule(
+                category=data.get('category'),
+                percent=float(data['percent']),
+                round_to=float(data.get('round_to', CENT)),
+                ending=None if data.get('ending') is None else float(data['ending']),
+                floor=None if data.get('floor') is None else float(data['floor']),
+                ceiling=None if data.get('ceiling') is None else float(data['ceiling'])
+            )
+        except (TypeError, ValueError):
+            raise ValueError('Rule percent, round_to, ending, floor and ceiling must be numbers')
+        if not all(math.isfinite(value) for value in (rule.percent, rule.round_to)):
+            raise ValueError('Rule percent and round_to must be finite')
+        if rule.percent <= -100:
+            raise ValueError('Rule percent must be greater than -100')
+        if rule.round_to < CENT:
+            raise ValueError(f'Rule round_to must be at least {CENT}')
+        if rule.ending is not None and not 0 <= rule.ending < 1:
+            raise ValueError('Rule ending must be between 0 and 1')
+        if rule.floor is not None and rule.ceiling is not None and rule.floor > rule.ceiling:
+            raise ValueError('Rule floor must not be above its ceiling')
+        return rule
+
+    def to_dict(self):
+        return {
+            'category': self.category,
+            'percent': self.percent,
+            'round_to': self.round_to,
+            'ending': self.ending,
+            'floor': self.floor,
+            'ceiling': self.ceiling
+        }
+
+
+def parse_rules(rules):
+    """
+    Rules from a request payload, in order. The first rule whose category
+    matches a product applies to it; a rule without a category matches every
+    product.
+
+    Raises:
+        ValueError: If `rules` is not a non-empty list of valid rules
+    """
+    if not isinstance(rules, list) or not rules:
+        raise ValueError('rules must be a non-empty list')
+    return [RepricingRule.from_dict(rule) for rule in rules]
+
+
+def apply_rules(categories, prices, rules):
+    """
+    New prices for arrays of categories and prices.
+
+    Each rule is applied to all its products at once as array operations.
+
+    Returns:
+        tuple: (new prices, mask of the products a rule matched)
+    """
+    # NumPy is only needed by the repricing job, so it is imported on first use
+    import numpy as np
+
+    new_prices = prices.copy()
+    matched = np.zeros(len(prices), dtype=bool)
+    for rule in rules:
+        mask = ~matched
+        if rule.category is not None:
+            mask &= categories == rule.category
+        if not mask.any():
+            continue
+        repriced = prices[mask] * (1 + rule.percent / 100)
+        if rule.ending is not None:
+            repriced = np.floor(repriced) + rule.ending
+        else:
+            # Round half up; np.round rounds half to even
+            repriced = np.floor(repriced / rule.round_to + 0.5) * rule.round_to
+        if rule.floor is not None:
+            repriced = np.maximum(repriced, rule.floor)
+        if rule.ceiling is not None:
+            repriced = np.minimum(repriced, rule.ceiling)
+        # Drop the float noise of the arithmetic above
+        new_prices[mask] = np.round(repriced, 2)
+        matched |= mask
+    return new_prices, matched
+
+
+def _chunks(documents, size):
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def reprice(db, rules, dry_run=False, batch_size=1000, diff_limit=500):
+    """
+    Apply repricing rules to the whole catalog.
+
+    Prices are read `batch_size` products at a time (only `_id`, category
+    and price) into arrays, and the rules are applied to each chunk at once.
+    Only products whose price changes are written, with one bulk write per
+    chunk conditioned on the price that was read: a product repriced
+    concurrently is left alone and counted as a conflict. The product and
+    listing caches are invalidated once, after all chunks are written.
+
+    With `dry_run`, nothing is written and the result lists the changes.
+
+    Args:
+        db: Repositories
+        rules (list): RepricingRule instances, in order
+        dry_run (bool, optional): Only compute the changes
+        batch_size (int, optional): Products per chunk
+        diff_limit (int, optional): Changes listed in the result
+
+    Returns:
+        dict: Counts of products scanned, matched, changed, updated and in
+        conflict, changes per category, and the first `diff_limit` changes
+    """
+    import numpy as np
+
+    categories = None
+    if all(rule.category is not None for rule in rules):
+        categories = {rule.category for rule in rules}
+
+    summary = {
+        'dry_run': dry_run,
+        'scanned': 0,
+        'matched': 0,
+        'changed': 0,
+        'updated': 0,
+        'conflicts': 0,
+        'categories': {},
+        'changes': []
+    }
+    updated_ids = []
+    for chunk in _chunks(db.products.iter_prices(categories, batch_size), batch_size):
+        chunk_categories = np.array([document.get('category') or '' for document in chunk], dtype=object)
+        prices = np.array([document.get('price') or 0 for document in chunk], dtype=np.float64)
+
+        new_prices, matched = apply_rules(chunk_categories, prices, rules)
+        changed = np.flatnonzero(matched & (np.abs(new_prices - prices) >= CENT / 2))
+        summary['scanned'] += len(chunk)
+        summary['matched'] += int(matched.sum())
+        summary['changed'] += len(changed)
+
+        changes = [
+            (chunk[i]['_id'], chunk_categories[i], float(prices[i]), float(new_prices[i]))
+            for i in changed.tolist()
+        ]
+        for product_id, category, old_price, new_price in changes:
+            totals = summary['categories'].setdefault(category, {'changed': 0, 'old_total': 0, 'new_total': 0})
+            totals['changed'] += 1
+            totals['old_total'] += old_price
+            totals['new_total'] += new_price
+            if len(summary['changes']) < diff_limit:
+                summary['changes'].append({
+                    'product_id': str(product_id),
+                    'category': category,
+                    'old_price': old_price,
+                    'new_price': new_price
+                })
+        if dry_run or not changes:
+            continue
+
+        # Conditioned on the price read, so a concurrent price change wins
+        now = datetime.utcnow().isoformat()
+        updated = db.products.bulk_update([
+            (product_id, {'price': old_price}, {'price': new_price, 'updated_at': now})
+            for product_id, category, old_price, new_price in changes
+        ])
+        summary['updated'] += updated
+        summary['conflicts'] += len(changes) - updated
+        updated_ids += [str(product_id) for product_id, _, _, _ in changes]
+
+    for totals in summary['categories'].values():
+        totals['old_total'] = round(totals['old_total'], 2)
+        totals['new_total'] = round(totals['new_total'], 2)
+
+    if updated_ids:
+        invalidate_many('product', [{'product_id': product_id} for product_id in updated_ids])
+        invalidate('products_page')
+        invalidate('products_featured')
+    logging.info(
+        f"Repricing {'dry run' if dry_run else 'run'}: {summary['scanned']} scanned, "
+        f"{summary['changed']} changed, {summary['updated']} updated, {summary['conflicts']} conflicts"
+    )
+    return summary
@@ -0,0 +1,178 @@
+from functools import wraps
+from flask import copy_current_request_context, current_app, make_response, request
+from redis.exceptions import WatchError
+from urllib.parse import urlencode
+import json
+import logging
+import threading
+import time
+
+CACHE_HEADER = 'X-Cache'
+KEY_PREFIX = 'response_cache'
+# Invalidation counters, kept apart from the entries so invalidating never deletes them
+GENERATION_PREFIX = 'response_cache_generation'
+# Single-flight locks of in-flight renders, likewise out of reach of invalidation scans
+LOCK_PREFIX = 'response_cache_lock'
+
+
+def cache_key(name, view_args=None, query=None):
+    """Redis key of a cached response, from the view's URL and selected query args."""
+    parts = [KEY_PREFIX, name]
+    if view_args:
+        parts.append(urlencode(sorted(view_args.items())))
+    if query:
+        parts.append(urlencode(sorted(query.items())))
+    return ':'.join(parts)
+
+
+def generation_key(name, view_args=None):
+    """Redis key counting the invalidations of `name`, or of one URL of it."""
+    return GENERATION_PREFIX + cache_key(name, view_args)[len(KEY_PREFIX):]
+
+
+def invalidate(name, **view_args):
+    """Drop every cached response of `name`, or only those for the given URL arguments."""
+    redis = current_app.redis
+    # Bumped first, so a render that started before this cannot store its response
+    redis.incr(generation_key(name, view_args))
+    prefix = cache_key(name, view_args)
+    keys = [prefix] + list(redis.scan_iter(match=f'{prefix}:*', count=1000))
+    redis.delete(*keys)
+
+
+def invalidate_many(name, view_args_list):
+    """
+    Drop the cached responses of `name` for many URLs, in chunked deletes.
+
+    Only for views cached without `query_args`, whose keys are known
+    exactly, so no scan is needed.
+    """
+    redis = current_app.redis
+    view_args_list = list(view_args_list)
+    for start in range(0, len(view_args_list), 1000):
+        chunk = view_args_list[start:start + 1000]
+        pipeline = redis.pipeline(transaction=False)
+        for view_args in chunk:
+            pipeline.incr(generation_key(name, view_args))
+        pipeline.delete(*[cache_key(name, view_args) for view_args in chunk])
+        pipeline.execute()
+
+
+def _replay(stored, state):
+    response = make_response(stored['body'], stored['status'])
+    response.headers['Content-Type'] = stored['content_type']
+    response.headers[CACHE_HEADER] = state
+    return response
+
+
+def _store_if_current(redis, key, value, ttl, generation_keys, generations):
+    # Stores the entry only if no invalidation happened since `generations` was read
+    with redis.pipeline() as pipeline:
+        try:
+            pipeline.watch(*generation_keys)
+            if pipeline.mget(generation_keys) != generations:
+                return
+            pipeline.multi()
+            pipeline.set(key, value, ex=ttl)
+            pipeline.execute()
+        except WatchError:
+            pass
+
+
+def cached_response(name, query_args=(), ttl=None, stale_ttl=None, lock_timeout=None):
+    """
+    Cache a GET endpoint's successful responses in Redis.
+
+    The cache key is built from `name`, the URL arguments and the query args
+    listed in `query_args`; other query args do not split the cache. Only
+    200 responses are stored, and only if the cache was not invalidated
+    while the view ran: `invalidate` bumps a counter for the name or URL,
+    and a render that saw an older counter drops its response.
+
+    Misses are coalesced: one request (in any worker) takes a Redis lock and
+    runs the view while the others wait for its result, falling back to
+    running the view themselves after `lock_timeout` seconds. For `stale_ttl`
+    seconds after an entry expires it is still served, and the first request
+    to see it stale refreshes it in the background.
+
+    Args:
+        name (str): Cache name, used to invalidate it
+        query_args (tuple, optional): Query args that vary the response
+        ttl (int or str, optional): Seconds a response stays fresh, or the
+            config key holding it (defaults to RESPONSE_CACHE_TTL)
+        stale_ttl (int, optional): Seconds a stale response may still be
+            served (defaults to RESPONSE_CACHE_STALE_TTL)
+        lock_timeout (int, optional): Seconds a coalesced miss waits for the
+            refresh (defaults to RESPONSE_CACHE_LOCK_TIMEOUT)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            fresh_seconds = ttl or config['RESPONSE_CACHE_TTL']
+            if isinstance(fresh_seconds, str):
+                fresh_seconds = config[fresh_seconds]
+            stale_seconds = stale_ttl if stale_ttl is not None else config['RESPONSE_CACHE_STALE_TTL']
+            wait_timeout = lock_timeout or config['RESPONSE_CACHE_LOCK_TIMEOUT']
+
+            redis = current_app.redis
+            key = cache_key(name, request.view_args, {
+                arg: request.args[arg] for arg in query_args if arg in request.args
+            })
+            lock_key = LOCK_PREFIX + key[len(KEY_PREFIX):]
+            generation_keys = list(dict.fromkeys([generation_key(name), generation_key(name, request.view_args)]))
+
+            def acquire():
+                return redis.set(lock_key, 1, nx=True, ex=wait_timeout * 2)
+
+            def render():
+                # Runs the view and stores its response; the caller holds the lock
+                try:
+                    generations = redis.mget(generation_keys)
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code == 200:
+                        _store_if_current(redis, key, json.dumps({
+                            'status': response.status_code,
+                            'content_type': response.content_type,
+                            'body': response.get_data(as_text=True),
+                            'fresh_until': time.time() + fresh_seconds
+                        }), fresh_seconds + stale_seconds, generation_keys, generations)
+                    return response
+                finally:
+                    redis.delete(lock_key)
+
+            stored = redis.get(key)
+            if stored:
+                stored = json.loads(stored)
+                if stored['fresh_until'] > time.time():
+                    return _replay(stored, 'HIT')
+
+                # Serve the stale copy; one request refreshes it in the background
+                if acquire():
+                    @copy_current_request_context
+                    def refresh():
+                        try:
+                            render()
+                        except Exception as e:
+                            logging.warning(f"Background refresh of {key} failed: {str(e)}")
+
+                    threading.Thread(target=refresh, name='cache-refresh', daemon=True).start()
+                return _replay(stored, 'STALE')
+
+            if acquire():
+                response = render()
+            else:
+                # Another request is rendering this entry: wait for it
+                deadline = time.monotonic() + wait_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    stored = redis.get(key)
+                    if stored:
+                        return _replay(json.loads(stored), 'HIT')
+                    if not redis.exists(lock_key):
+                        break
+                response = make_response(view(*args, **kwargs))
+            response.headers[CACHE_HEADER] = 'MISS'
+            return response
+        return wrapper
+    return decorator
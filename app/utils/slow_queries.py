@@ -0,0 +1,253 @@
+from pymongo import monitoring
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# Commands that are never recorded; explain must be here to avoid recursion
+IGNORED_COMMANDS = {
+    'explain', 'hello', 'ismaster', 'isMaster', 'ping', 'buildInfo', 'saslStart',
+    'saslContinue', 'endSessions', 'killCursors', 'getMore'
+}
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+
+# Fields added by the driver that explain must not receive
+SESSION_FIELDS = {'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'readConcern', 'writeConcern'}
+
+INDEX_KEY = 'slow_queries:index'
+GROUP_KEY = 'slow_queries:group:{}'
+EXPLAINED_KEY = 'slow_queries:explained:{}'
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+# Repositories only translate calls to the driver; report the model that called them
+_SKIPPED_DIRS = (os.path.join(_APP_DIR, 'repositories') + os.sep,)
+
+
+def strip_literals(value):
+    """Replace every literal in a query with '?' so queries group by shape."""
+    if isinstance(value, dict):
+        return {key: strip_literals(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Array literals ($in lists, pipelines) collapse to the shape of their first item
+        return [strip_literals(value[0])] if value else []
+    return '?'
+
+
+def query_shape(command_name, command):
+    if command_name == 'find':
+        shape = {'filter': command.get('filter', {})}
+    elif command_name in ('count', 'distinct', 'findAndModify'):
+        shape = {'filter': command.get('query', {})}
+    elif command_name == 'aggregate':
+        # Every stage matters, unlike the items of an array literal
+        return {'pipeline': [strip_literals(stage) for stage in command.get('pipeline', [])]}
+    elif command_name == 'update':
+        shape = {'filter': (command.get('updates') or [{}])[0].get('q', {})}
+    elif command_name == 'delete':
+        shape = {'filter': (command.get('deletes') or [{}])[0].get('q', {})}
+    else:
+        return {}
+    shape = strip_literals(shape)
+    # Sort directions are part of the shape, not literals
+    if 'sort' in command and command_name == 'find':
+        shape['sort'] = dict(command['sort'])
+    return shape
+
+
+def find_call_site():
+    """Qualified name of the innermost application function on the stack, e.g. Coupon.get_by_code."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_APP_DIR) and filename != _THIS_FILE and not filename.startswith(_SKIPPED_DIRS):
+            code = frame.f_code
+            return getattr(code, 'co_qualname', code.co_name)
+        frame = frame.f_back
+    return 'unknown'
+
+
+def plan_summary(explain_output):
+    """Reduce explain output to COLLSCAN, IXSCAN or the winning plan's stage name."""
+    winning_plans = []
+    stages = set()
+
+    def find_winning_plans(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == 'winningPlan':
+                    winning_plans.append(value)
+                elif key != 'rejectedPlans':
+                    find_winning_plans(value)
+        elif isinstance(node, list):
+            for value in node:
+                find_winning_plans(value)
+
+    def collect(node):
+        if isinstance(node, dict):
+            if isinstance(node.get('stage'), str):
+                stages.add(node['stage'])
+            for value in node.values():
+                collect(value)
+        elif isinstance(node, list):
+            for value in node:
+                collect(value)
+
+    find_winning_plans(explain_output)
+    collect(winning_plans)
+    if 'COLLSCAN' in stages:
+        return 'COLLSCAN'
+    if stages & {'IXSCAN', 'IDHACK', 'EXPRESS_IXSCAN', 'EXPRESS_CLUSTERED_IXSCAN'}:
+        return 'IXSCAN'
+    return sorted(stages)[0] if stages else 'UNKNOWN'
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """
+    Flags MongoDB commands slower than a threshold and aggregates them by call site.
+
+    The listener itself only captures the command and call site; aggregation in
+    Redis and the sampled `explain` run on a background thread so the request
+    that ran the slow command is not slowed down further.
+    """
+
+    def __init__(self, threshold_ms=100, explain_sample_rate=0.1, explain_interval=3600, queue_size=1000):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval = explain_interval
+        self.connections = None
+        self.redis = None
+        self._started = {}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker_pid = None
+        self._lock = threading.Lock()
+
+    def bind(self, connections, redis):
+        self.connections = connections
+        self.redis = redis
+
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            self._started[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        command = self._started.pop((event.connection_id, event.request_id), None)
+        if command is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        if self.redis is None:
+            return
+
+        self._ensure_worker()
+        record = {
+            'call_site': find_call_site(),
+            'database': event.database_name,
+            'command_name': event.command_name,
+            'command': command,
+            'duration_ms': event.duration_micros / 1000
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            logging.warning('Slow query queue is full, dropping record')
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        pid = os.getpid()
+        if self._worker_pid == pid:
+            return
+        with self._lock:
+            if self._worker_pid != pid:
+                self._worker_pid = pid
+                threading.Thread(target=self._work, name='slow-query-log', daemon=True).start()
+
+    def _work(self):
+        while True:
+            record = self._queue.get()
+            try:
+                self._process(record)
+            except Exception as e:
+                logging.warning(f"Failed to record slow query: {str(e)}")
+
+    def _process(self, record):
+        command_name = record['command_name']
+        command = record['command']
+        collection = command.get(command_name) if isinstance(command.get(command_name), str) else None
+        shape = json.dumps(query_shape(command_name, command), sort_keys=True, default=str)
+        group = {
+            'call_site': record['call_site'],
+            'collection': collection or '',
+            'command': command_name,
+            'shape': shape
+        }
+        group_id = hashlib.sha1(json.dumps(group, sort_keys=True).encode()).hexdigest()[:16]
+        group_key = GROUP_KEY.format(group_id)
+        duration_ms = record['duration_ms']
+
+        pipe = self.redis.pipeline()
+        pipe.hset(group_key, mapping=group)
+        pipe.hincrby(group_key, 'count', 1)
+        pipe.hincrbyfloat(group_key, 'total_ms', duration_ms)
+        pipe.hset(group_key, 'last_seen', time.time())
+        pipe.hget(group_key, 'max_ms')
+        pipe.zincrby(INDEX_KEY, duration_ms, group_id)
+        max_ms = pipe.execute()[4]
+        if max_ms is None or duration_ms > float(max_ms):
+            self.redis.hset(group_key, 'max_ms', duration_ms)
+
+        # Explain a sample, at most once per group per interval
+        if command_name not in EXPLAINABLE_COMMANDS or random.random() >= self.explain_sample_rate:
+            return
+        if not self.redis.set(EXPLAINED_KEY.format(group_id), 1, nx=True, ex=self.explain_interval):
+            return
+        explain_command = {key: value for key, value in command.items() if key not in SESSION_FIELDS}
+        output = self.connections.mongo_client[record['database']].command('explain', explain_command, verbosity='queryPlanner')
+        plan = plan_summary(output)
+        self.redis.hset(group_key, mapping={'plan': plan, 'explained_at': time.time()})
+        self.redis.hincrby(group_key, f'plan:{plan}', 1)
+
+
+def get_report(redis, limit=50):
+    """Slow query groups ordered by total time spent, slowest first."""
+    group_ids = redis.zrevrange(INDEX_KEY, 0, limit - 1)
+    pipe = redis.pipeline()
+    for group_id in group_ids:
+        pipe.hgetall(GROUP_KEY.format(group_id.decode()))
+    report = []
+    for group_id, group in zip(group_ids, pipe.execute()):
+        if not group:
+            continue
+        group = {key.decode(): value.decode() for key, value in group.items()}
+        count = int(group.get('count', 0))
+        total_ms = float(group.get('total_ms', 0))
+        report.append({
+            'id': group_id.decode(),
+            'call_site': group.get('call_site'),
+            'collection': group.get('collection'),
+            'command': group.get('command'),
+            'shape': json.loads(group['shape']) if group.get('shape') else None,
+            'count': count,
+            'total_ms': round(total_ms, 1),
+            'avg_ms': round(total_ms / count, 1) if count else 0,
+            'max_ms': round(float(group.get('max_ms', 0)), 1),
+            'plan': group.get('plan'),
+            'plans': {key[len('plan:'):]: int(value) for key, value in group.items() if key.startswith('plan:')}
+        })
+    return report
+
+
+def reset_report(redis):
+    group_ids = redis.zrange(INDEX_KEY, 0, -1)
+    keys = [GROUP_KEY.format(group_id.decode()) for group_id in group_ids]
+    keys += [EXPLAINED_KEY.format(group_id.decode()) for group_id in group_ids]
+    redis.delete(INDEX_KEY, *keys)
@@ -0,0 +1,83 @@
+from flask import current_app, g
+import logging
+
+
+class TaskBatcher:
+    """
+    Groups many small enqueues into chunked Celery tasks.
+
+    Items added to the batcher are published as `task.apply_async(args=(chunk,))`
+    with up to `chunk_size` items per task, so the task must take a list. A
+    chunk is published as soon as it is full; the rest when the batcher is
+    flushed or its `with` block exits.
+
+        with TaskBatcher(send_order_notifications, chunk_size=100) as batcher:
+            for order in orders:
+                batcher.add({...})
+
+    Args:
+        task: Celery task taking a list of items
+        chunk_size (int): Items per published task
+        **options: Extra apply_async options (queue, priority, countdown, ...)
+    """
+
+    def __init__(self, task, chunk_size=100, **options):
+        self.task = task
+        self.chunk_size = max(1, chunk_size)
+        self.options = options
+        self.published = 0
+        self._items = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.flush()
+
+    def add(self, item):
+        self._items.append(item)
+        if len(self._items) >= self.chunk_size:
+            self._publish(self._items)
+            self._items = []
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def flush(self):
+        """Publish the pending items. Returns the number of tasks published so far."""
+        if self._items:
+            self._publish(self._items)
+            self._items = []
+        return self.published
+
+    def _publish(self, items):
+        self.task.apply_async(args=(items,), **self.options)
+        self.published += 1
+
+
+def batch(task, item):
+    """
+    Queue `item` for `task` until the end of the current request.
+
+    Everything queued for the same task during a request is published in
+    chunks of CELERY_BATCH_SIZE once the response is built, and only if the
+    request succeeded.
+    """
+    g.setdefault('task_batches', {}).setdefault(task.name, (task, []))[1].append(item)
+
+
+def init_app(app):
+    @app.after_request
+    def flush_task_batches(response):
+        batches = g.pop('task_batches', {})
+        if response.status_code >= 400:
+            return response
+        for task, items in batches.values():
+            try:
+                with TaskBatcher(task, chunk_size=current_app.config['CELERY_BATCH_SIZE']) as batcher:
+                    batcher.extend(items)
+            except Exception as e:
+                # The request itself succeeded; a lost notification must not fail it
+                logging.error(f"Failed to enqueue {task.name} batch: {str(e)}")
+        return response
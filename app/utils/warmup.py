@@ -0,0 +1,158 @@
+from datetime import datetime
+from flask import jsonify, request
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+
+# WSGI environ flag set on the requests issued during warm-up
+WARMUP_ENVIRON_KEY = 'app.warmup'
+
+
+class Warmup:
+    """
+    Prepares a worker process before it takes traffic.
+
+    Warm-up opens MongoDB and Redis pool connections, renders the featured and
+    first catalog pages and the products on them (filling the response
+    caches), and loads the active coupons into the coupon cache. GET /ready
+    answers 503 until warm-up has finished in the process serving it.
+
+    State is per process: under gunicorn, each worker warms up in the
+    post_worker_init hook (see gunicorn.conf.py) before accepting requests.
+    """
+
+    def __init__(self, app=None):
+        self._pid = None
+        self._ready = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self.report = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['warmup'] = self
+
+        @app.route('/ready')
+        def ready():
+            if self.is_ready():
+                return jsonify({'status': 'ready', 'pid': os.getpid(), 'warmup': self.report}), 200
+            # A worker that was never warmed up (e.g. not started by gunicorn) starts now
+            self.start(app)
+            return jsonify({'status': 'warming_up', 'pid': os.getpid()}), 503
+
+        return ready
+
+    def is_ready(self):
+        return self._pid == os.getpid() and self._ready
+
+    def start(self, app):
+        """Warm up on a background thread, once per process."""
+        with self._lock:
+            if self._claim():
+                self._thread = threading.Thread(target=self._run, args=(app,), name='warmup', daemon=True)
+                self._thread.start()
+
+    def run(self, app):
+        """Warm up on the calling thread, once per process."""
+        with self._lock:
+            claimed = self._claim()
+        if claimed:
+            self._run(app)
+        elif self._thread is not None:
+            self._thread.join()
+
+    def _claim(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return False
+        self._pid = pid
+        self._ready = False
+        self._thread = None
+        return True
+
+    def _run(self, app):
+        started = time.perf_counter()
+        report = {}
+        for name, step in [
+            ('connections', warm_connections),
+            ('products', warm_products),
+            ('coupons', warm_coupons)
+        ]:
+            step_started = time.perf_counter()
+            try:
+                report[name] = step(app)
+            except Exception as e:
+                # A cold cache is slower, not broken: carry on and serve
+                logging.warning(f"Warm-up step {name} failed: {str(e)}")
+                report[name] = {'error': str(e)}
+            report[name + '_seconds'] = round(time.perf_counter() - step_started, 3)
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        self.report = report
+        self._ready = True
+        logging.info(f"Worker {os.getpid()} warmed up in {report['seconds']}s")
+
+
+def warm_connections(app):
+    """Open `WARMUP_CONNECTIONS` connections in each pool by using them concurrently."""
+    from .connections import connections
+
+    count = min(app.config['WARMUP_CONNECTIONS'], app.config['REDIS_MAX_CONNECTIONS'])
+    barrier = threading.Barrier(count)
+
+    def redis_ping(_):
+        connection = connections.redis_pool.get_connection('PING')
+        try:
+            connection.send_command('PING')
+            connection.read_response()
+            # Hold the connection until all are open so each thread gets its own
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            connections.redis_pool.release(connection)
+
+    def mongo_ping(_):
+        connections.mongo_client.admin.command('ping')
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        list(pool.map(redis_ping, range(count)))
+        if app.config['STORAGE_BACKEND'] == 'mongo':
+            list(pool.map(mongo_ping, range(count)))
+    return connections.stats()
+
+
+def warm_products(app):
+    """Request the hottest catalog endpoints so their responses are cached."""
+    pages = app.config['WARMUP_PRODUCT_PAGES']
+    per_page = app.config['WARMUP_PER_PAGE']
+    paths = ['/api/products/featured']
+    paths += [f'/api/products/?page={page}&per_page={per_page}' for page in range(1, pages + 1)]
+
+    # Listing payloads carry no ids, so read the products on those pages directly
+    product_ids = [
+        str(product['_id'])
+        for product in app.db.products.list(0, per_page * pages)
+    ]
+    paths += [f'/api/products/{product_id}' for product_id in product_ids]
+
+    client = app.test_client()
+    for path in paths:
+        client.get(path, environ_overrides={WARMUP_ENVIRON_KEY: True})
+    return {'pages': pages, 'products': len(product_ids)}
+
+
+def warm_coupons(app):
+    """Load currently valid coupons into the in-process coupon cache."""
+    coupons_data = app.db.coupons.list_active(datetime.utcnow(), limit=app.config['WARMUP_COUPONS'])
+    app.coupon_cache.prime(coupons_data)
+    return {'coupons': len(coupons_data)}
+
+
+def is_warmup_request():
+    return request.environ.get(WARMUP_ENVIRON_KEY, False)
+
+
+warmup = Warmup()
@@ -0,0 +1,105 @@
+"""
+Load test for atomic coupon redemption.
+
+Fires many concurrent redemptions at a coupon with a small usage limit and
+checks that the limit holds exactly, both across users and per user.
+
+Runs against a real MongoDB; use a throwaway database:
+
+    python -m benchmarks.coupon_redemption --mongodb-uri mongodb://localhost:27017/ecommerce_loadtest
+
+or against the in-memory storage engine:
+
+    python -m benchmarks.coupon_redemption --in-memory
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient
+
+from app.models.coupon import Coupon
+from app.repositories import MemoryRepositories, MongoRepositories
+
+
+def run_scenario(db, name, usage_limit, per_user_limit, attempts, concurrency, users):
+    code = f'LOADTEST-{uuid.uuid4().hex[:8].upper()}'
+    Coupon(
+        code=code,
+        discount_type='percentage',
+        discount_value=10,
+        usage_limit=usage_limit,
+        per_user_limit=per_user_limit
+    ).save(db)
+
+    def attempt(i):
+        # Each thread works on its own stale copy, like concurrent requests do
+        coupon = Coupon.get_by_code(db, code)
+        return coupon.redeem(db, users[i % len(users)])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(attempt, range(attempts)))
+    elapsed = time.perf_counter() - started
+
+    redeemed = sum(results)
+    used_count = Coupon.get_by_code(db, code).used_count
+    expected = min(attempts, usage_limit or attempts, per_user_limit * len(users) if per_user_limit else attempts)
+    per_user_max = max(Coupon.get_redemption_count(db, code, user) for user in users)
+
+    passed = redeemed == expected and used_count == expected
+    if per_user_limit:
+        passed = passed and per_user_max <= per_user_limit
+
+    Coupon.get_by_code(db, code).delete(db)
+
+    return {
+        'scenario': name,
+        'attempts': attempts,
+        'concurrency': concurrency,
+        'usage_limit': usage_limit,
+        'per_user_limit': per_user_limit,
+        'redeemed': redeemed,
+        'used_count': used_count,
+        'expected': expected,
+        'max_redemptions_per_user': per_user_max,
+        'redemptions_per_second': round(attempts / elapsed, 1),
+        'passed': passed
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongodb-uri', default='mongodb://localhost:27017/ecommerce_loadtest')
+    parser.add_argument('--attempts', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--usage-limit', type=int, default=100)
+    parser.add_argument('--in-memory', action='store_true', help='Use the in-memory storage engine')
+    args = parser.parse_args(argv)
+
+    if args.in_memory:
+        db = MemoryRepositories()
+    else:
+        db = MongoRepositories(MongoClient(args.mongodb_uri, maxPoolSize=args.concurrency).get_database())
+    db.ensure_indexes()
+
+    results = [
+        # Many shoppers racing for a limited promo
+        run_scenario(db, 'global_limit', args.usage_limit, None, args.attempts,
+                     args.concurrency, [f'user-{i}' for i in range(args.attempts)]),
+        # A few shoppers hammering a once-per-customer coupon
+        run_scenario(db, 'per_user_limit', None, 1, args.attempts,
+                     args.concurrency, [f'user-{i}' for i in range(10)]),
+        # Both limits at once
+        run_scenario(db, 'both_limits', args.usage_limit, 2, args.attempts,
+                     args.concurrency, [f'user-{i}' for i in range(args.usage_limit)])
+    ]
+
+    print(json.dumps(results, indent=2))
+    return 0 if all(result['passed'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Boots the application for benchmarking and seeds a realistic dataset.
+
+Two storage modes are supported:
+
+- local services: a MongoDB and Redis reachable at BENCH_MONGODB_URI and
+  BENCH_REDIS_URL (defaults to a separate `ecommerce_bench` database)
+- in-memory: the in-memory storage engine (STORAGE_BACKEND=memory) and
+  fakeredis, installed from benchmarks/requirements.txt, for a quick run
+  without any services
+"""
+import os
+import queue
+import random
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.config import Config
+from app.models.cart import Cart
+from app.models.coupon import Coupon
+from app.models.product import Product
+from app.repositories import MemoryRepositories
+from app.utils.passwords import password_hasher
+
+CATEGORIES = ['Electronics', 'Books', 'Clothing', 'Home', 'Toys', 'Sports', 'Beauty', 'Garden']
+BENCH_PASSWORD = 'benchmark-password'
+
+
+class BenchmarkConfig(Config):
+    MONGODB_URI = os.getenv('BENCH_MONGODB_URI', 'mongodb://localhost:27017/ecommerce_bench')
+    REDIS_URL = os.getenv('BENCH_REDIS_URL', 'redis://localhost:6379/15')
+    RATELIMIT_ENABLED = False
+    MAIL_SUPPRESS_SEND = True
+    SLOW_QUERY_ENABLED = False
+    WARMUP_ON_STARTUP = False
+
+
+class InMemoryConfig(BenchmarkConfig):
+    STORAGE_BACKEND = 'memory'
+    METRICS_ENABLED = False
+    CELERY_BROKER_URL = 'memory://'
+    CELERY_RESULT_BACKEND = 'cache+memory://'
+
+
+def build_app(in_memory=False):
+    """Create the Flask app wired to local services or in-memory stand-ins."""
+    if not in_memory:
+        app = create_app(BenchmarkConfig)
+        return app
+
+    import fakeredis
+
+    # Tasks are published to an in-memory broker and never executed. Celery
+    # reads these variables ahead of its configuration, and .env sets them
+    os.environ['CELERY_BROKER_URL'] = InMemoryConfig.CELERY_BROKER_URL
+    os.environ['CELERY_RESULT_BACKEND'] = InMemoryConfig.CELERY_RESULT_BACKEND
+    app = create_app(InMemoryConfig)
+    app.redis = fakeredis.FakeRedis()
+    app.coupon_cache.redis = app.redis
+    return app
+
+
+def reset(app):
+    if app.config['STORAGE_BACKEND'] == 'mongo':
+        for name in ('products', 'users', 'carts', 'orders', 'coupons', 'coupon_redemptions', 'token_blocklist', 'sales_rollups'):
+            app.db.database[name].delete_many({})
+    else:
+        app.db = MemoryRepositories()
+    app.redis.flushdb()
+
+
+def seed(app, products=1000, users=200, coupons=20, cart_items=3, rng=None):
+    """
+    Seed a catalog, users with carts, and coupons.
+
+    All users share BENCH_PASSWORD, hashed once. Returns a context dict with
+    product ids, user ids, access tokens and coupon codes for the scenarios.
+    `checkout_coupon_codes` apply to any cart, and `checkout_users` is a queue
+    that hands each customer to one checkout at a time.
+    """
+    from flask_jwt_extended import create_access_token
+
+    rng = rng or random.Random(42)
+    db = app.db
+    now = datetime.utcnow()
+
+    product_ids = []
+    for i in range(products):
+        product = Product(
+            name=f'Product {i}',
+            description=f'Benchmark product {i} ' + 'lorem ipsum ' * rng.randint(5, 40),
+            price=round(rng.uniform(2, 500), 2),
+            category=rng.choice(CATEGORIES),
+            stock=rng.randint(10_000, 1_000_000),
+            image_url=f'https://example.com/images/{i}.jpg'
+        )
+        product.save(db)
+        product_ids.append(str(product._id))
+
+    with app.app_context():
+        pwhash = password_hasher.hash(BENCH_PASSWORD)
+
+    user_docs = []
+    for i in range(users):
+        user_docs.append({
+            'email': f'bench{i}@example.com',
+            'name': f'Bench User {i}',
+            'role': 'admin' if i == 0 else 'customer',
+            'password': pwhash,
+            'created_at': now.isoformat(),
+            'updated_at': now.isoformat()
+        })
+    user_ids = [str(db.users.insert(user_doc)) for user_doc in user_docs]
+
+    for user_id in user_ids:
+        cart = Cart(user_id)
+        for product_id in rng.sample(product_ids, cart_items):
+            cart.add_item(product_id, rng.randint(1, 3))
+        cart.save(db)
+
+    coupon_codes = []
+    checkout_coupon_codes = []
+    for i in range(coupons):
+        coupon = Coupon(
+            code=f'BENCH{i:03d}',
+            discount_type=rng.choice(['percentage', 'fixed']),
+            discount_value=rng.choice([5, 10, 15, 20]),
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=30),
+            categories=[rng.choice(CATEGORIES)] if i % 2 else [],
+            stackable=i % 3 == 0
+        )
+        coupon.save(db)
+        coupon_codes.append(coupon.code)
+        if not coupon.categories:
+            checkout_coupon_codes.append(coupon.code)
+
+    with app.app_context():
+        tokens = {user_id: create_access_token(identity=user_id, expires_delta=timedelta(days=1)) for user_id in user_ids}
+
+    checkout_users = queue.Queue()
+    for user_id in user_ids[1:]:
+        checkout_users.put(user_id)
+
+    return {
+        'product_ids': product_ids,
+        'user_ids': user_ids,
+        'admin_id': user_ids[0],
+        'customer_ids': user_ids[1:],
+        'tokens': tokens,
+        'coupon_codes': coupon_codes,
+        'checkout_coupon_codes': checkout_coupon_codes,
+        'checkout_users': checkout_users,
+        'emails': {user_id: doc['email'] for user_id, doc in zip(user_ids, user_docs)},
+        'password': BENCH_PASSWORD
+    }
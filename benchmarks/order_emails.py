@@ -0,0 +1,85 @@
+"""
+Send a batch of order notification emails to a local SMTP debugging server.
+
+Seeds the in-memory storage engine with users, products and orders, then runs
+the send_order_notifications task eagerly and reports how many messages went
+out and how long building and sending took. Start a debugging server first,
+which prints every message it receives:
+
+    pip install aiosmtpd
+    python -m aiosmtpd -n -l localhost:1025
+
+    python -m benchmarks.order_emails --orders 500 --items 5
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from app.models.cart import Cart
+from app.models.order import Order
+from app.tasks import (
+    NOTIFICATION_CONFIRMATION, NOTIFICATION_STATUS_UPDATE,
+    build_order_messages, send_order_notifications
+)
+from benchmarks.harness import build_app, seed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--items', type=int, default=5, help='Items per order')
+    parser.add_argument('--smtp-host', default='localhost')
+    parser.add_argument('--smtp-port', type=int, default=1025)
+    parser.add_argument('--max-emails', type=int, default=100, help='Messages per SMTP connection')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    app = build_app(in_memory=True)
+    app.config.update(
+        MAIL_SERVER=args.smtp_host,
+        MAIL_PORT=args.smtp_port,
+        MAIL_USE_TLS=False,
+        MAIL_USERNAME=None,
+        MAIL_PASSWORD=None,
+        MAIL_DEFAULT_SENDER='orders@example.com',
+        MAIL_SUPPRESS_SEND=False,
+        MAIL_MAX_EMAILS=args.max_emails
+    )
+    context = seed(app, products=max(args.items * 10, 100), users=min(args.orders, 200), coupons=0, cart_items=args.items)
+
+    notifications = []
+    for i in range(args.orders):
+        user_id = context['customer_ids'][i % len(context['customer_ids'])]
+        cart = Cart(user_id)
+        for product_id in rng.sample(context['product_ids'], args.items):
+            cart.add_item(product_id, rng.randint(1, 3))
+        order_id = Order.create_from_cart(app.db, user_id, cart, {'street': f'{i} Bench Street'})
+        notifications.append({
+            'type': rng.choice([NOTIFICATION_CONFIRMATION, NOTIFICATION_STATUS_UPDATE]),
+            'user_id': user_id,
+            'order_id': str(order_id),
+            'status': 'shipped'
+        })
+
+    with app.app_context():
+        started = time.perf_counter()
+        messages = build_order_messages(app.db, notifications)
+        built = time.perf_counter()
+        sent = send_order_notifications(notifications)
+        finished = time.perf_counter()
+
+    print(json.dumps({
+        'notifications': len(notifications),
+        'messages': len(messages),
+        'sent': sent,
+        'smtp_connections': -(-sent // args.max_emails) if sent else 0,
+        'build_seconds': round(built - started, 3),
+        'build_and_send_seconds': round(finished - built, 3)
+    }, indent=2))
+    return 0 if sent == len(notifications) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
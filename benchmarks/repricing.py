@@ -0,0 +1,71 @@
+"""
+Reprice a seeded catalog with the vectorized repricing job.
+
+Seeds the in-memory storage engine with products, runs a dry run and then
+the real repricing with a seasonal rule set, and compares it with updating
+the same number of products one at a time (get, full save and cache
+invalidation per product, as the product update endpoint does):
+
+    python -m benchmarks.repricing --products 100000
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.models.product import Product
+from app.utils.repricing import parse_rules, reprice
+from app.utils.response_cache import invalidate
+from benchmarks.harness import build_app, seed
+
+RULES = [
+    {'category': 'Clothing', 'percent': -30, 'ending': 0.99, 'floor': 4.99},
+    {'category': 'Garden', 'percent': 15, 'round_to': 0.05, 'ceiling': 400},
+    {'category': 'Electronics', 'percent': -5, 'round_to': 1}
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--one-by-one', type=int, default=1000, help='Products updated one at a time for comparison')
+    args = parser.parse_args(argv)
+
+    app = build_app(in_memory=True)
+    context = seed(app, products=args.products, users=1, coupons=0, cart_items=0)
+    rules = parse_rules(RULES)
+
+    with app.app_context():
+        started = time.perf_counter()
+        dry_run = reprice(app.db, rules, dry_run=True, batch_size=args.batch_size, diff_limit=5)
+        dry_run_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        applied = reprice(app.db, rules, batch_size=args.batch_size, diff_limit=0)
+        applied_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for product_id in context['product_ids'][:args.one_by_one]:
+            product = Product.get_by_id(app.db, product_id)
+            product.price = round(product.price * 0.95, 2)
+            product.save(app.db)
+            invalidate('product', product_id=product_id)
+            invalidate('products_page')
+        one_by_one_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        'products': args.products,
+        'changed': applied['changed'],
+        'updated': applied['updated'],
+        'dry_run_seconds': round(dry_run_seconds, 3),
+        'reprice_seconds': round(applied_seconds, 3),
+        'one_by_one_products': args.one_by_one,
+        'one_by_one_seconds': round(one_by_one_seconds, 3),
+        'sample_changes': dry_run['changes']
+    }, indent=2))
+    return 0 if applied['updated'] == dry_run['changed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Run the benchmark scenarios and report throughput and latency percentiles per endpoint.
+
+Examples:
+
+    # In-process against in-memory stand-ins (pip install -r benchmarks/requirements.txt)
+    python -m benchmarks.run --in-memory --concurrency 8 --duration 30
+
+    # In-process against local MongoDB and Redis
+    python -m benchmarks.run --concurrency 16 --duration 60 --output bench.json
+
+    # Over HTTP against a running server (e.g. gunicorn) sharing BENCH_MONGODB_URI
+    python -m benchmarks.run --base-url http://localhost:8000 --concurrency 64
+
+    # Compare with a previous run and fail on regressions
+    python -m benchmarks.run --compare baseline.json --fail-threshold 15
+
+    # Smoke check: every in-memory checkout must succeed
+    python -m benchmarks.run --in-memory --scenarios checkout=1 --duration 5 --max-errors 0
+"""
+import argparse
+import http.client
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from benchmarks.harness import build_app, reset, seed
+from benchmarks.scenarios import DEFAULT_MIX, SCENARIOS
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        # Off during warm-up
+        self.enabled = False
+
+    def record(self, label, duration, ok):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.latencies[label].append(duration)
+            if not ok:
+                self.errors[label] += 1
+
+
+class BaseClient:
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def request(self, label, method, path, token=None, json=None, expected=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        started = time.perf_counter()
+        try:
+            status = self._send(method, path, headers, json)
+        except Exception:
+            status = None
+        duration = time.perf_counter() - started
+        ok = status is not None and (status in expected if expected else status < 400)
+        self.recorder.record(label, duration, ok)
+        return status
+
+
+class FlaskClient(BaseClient):
+    """Drives the app in-process through the Flask test client."""
+
+    def __init__(self, recorder, app):
+        super().__init__(recorder)
+        self.client = app.test_client()
+
+    def _send(self, method, path, headers, body):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        return response.status_code
+
+
+class HttpClient(BaseClient):
+    """Drives a running server over a keep-alive HTTP connection."""
+
+    def __init__(self, recorder, base_url):
+        super().__init__(recorder)
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = None
+
+    def _send(self, method, path, headers, body):
+        if self.connection is None:
+            self.connection = self.connection_class(self.host, self.port, timeout=30)
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            self.connection.close()
+            self.connection = None
+            raise
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    total = 0
+    for label, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        total += len(values)
+        endpoints[label] = {
+            'count': len(values),
+            'errors': recorder.errors.get(label, 0),
+            'throughput': round(len(values) / elapsed, 2),
+            'mean_ms': round(sum(values) / len(values) * 1000, 2),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2)
+        }
+    return {
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'throughput': round(total / elapsed, 2),
+        'endpoints': endpoints
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print per-endpoint changes and return the endpoints that regressed beyond threshold percent."""
+    regressions = []
+    print(f"{'endpoint':40} {'p95 base':>10} {'p95 now':>10} {'change':>8} {'rps base':>10} {'rps now':>10}", file=sys.stderr)
+    for label, now in current['results']['endpoints'].items():
+        base = baseline['results']['endpoints'].get(label)
+        if not base:
+            continue
+        change = (now['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0
+        print(f"{label:40} {base['p95_ms']:10.2f} {now['p95_ms']:10.2f} {change:7.1f}% "
+              f"{base['throughput']:10.2f} {now['throughput']:10.2f}", file=sys.stderr)
+        if change > threshold:
+            regressions.append(label)
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'Unknown scenario: {name}')
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=parse_mix, default=DEFAULT_MIX,
+                        help='Weighted mix, e.g. browse=6,checkout=1 (default: realistic mix)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run after warm-up')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds of unrecorded warm-up')
+    parser.add_argument('--in-memory', action='store_true', help='Use the in-memory storage engine and fakeredis')
+    parser.add_argument('--base-url', help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', help='Baseline JSON report to compare against')
+    parser.add_argument('--fail-threshold', type=float, default=None,
+                        help='Exit non-zero if any endpoint p95 regressed by more than this percent')
+    parser.add_argument('--max-errors', type=int, default=None,
+                        help='Exit non-zero if more requests than this failed or got an unexpected status')
+    args = parser.parse_args(argv)
+
+    if args.base_url and args.in_memory:
+        parser.error('--in-memory cannot be combined with --base-url')
+
+    app = build_app(in_memory=args.in_memory)
+    reset(app)
+    ctx = seed(app, products=args.products, users=args.users, rng=random.Random(args.seed))
+
+    names = list(args.scenarios)
+    weights = [args.scenarios[name] for name in names]
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        client = HttpClient(recorder, args.base_url) if args.base_url else FlaskClient(recorder, app)
+        while not stop.is_set():
+            scenario = SCENARIOS[rng.choices(names, weights)[0]]
+            scenario(client, ctx, rng)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recorder.enabled = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.enabled = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'mode': 'http' if args.base_url else ('in-memory' if args.in_memory else 'local'),
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'scenarios': args.scenarios,
+            'products': args.products,
+            'users': args.users,
+            'python': platform.python_version()
+        },
+        'results': summarize(recorder, elapsed)
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+    errors = report['results']['errors']
+    if args.max_errors is not None and errors > args.max_errors:
+        print(f"{errors} requests failed, more than --max-errors {args.max_errors}", file=sys.stderr)
+        return 1
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.fail_threshold if args.fail_threshold is not None else 10)
+        if regressions and args.fail_threshold is not None:
+            print(f"Regressed endpoints: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Scripted user journeys driven by the benchmark runner.
+
+Each scenario receives a client, the seed context and a random generator and
+issues its requests through `client.request(label, method, path, ...)`. The
+label groups latencies per endpoint (ids are not part of it).
+"""
+
+
+def browse(client, ctx, rng):
+    """An anonymous shopper paging through the catalog and opening products."""
+    client.request('GET /api/products/featured', 'GET', '/api/products/featured')
+    page = rng.randint(1, max(len(ctx['product_ids']) // 20, 1))
+    client.request('GET /api/products', 'GET', f'/api/products/?page={page}&per_page=20')
+    for product_id in rng.sample(ctx['product_ids'], 3):
+        client.request('GET /api/products/<id>', 'GET', f'/api/products/{product_id}')
+
+
+def add_to_cart(client, ctx, rng):
+    """A signed-in shopper viewing a product, adding it and checking the cart."""
+    user_id = rng.choice(ctx['customer_ids'])
+    token = ctx['tokens'][user_id]
+    product_id = rng.choice(ctx['product_ids'])
+    client.request('GET /api/products/<id>', 'GET', f'/api/products/{product_id}')
+    client.request('POST /api/cart', 'POST', '/api/cart/', token=token,
+                   json={'product_id': product_id, 'quantity': rng.randint(1, 2)})
+    client.request('GET /api/cart', 'GET', '/api/cart/', token=token)
+
+
+def checkout(client, ctx, rng):
+    """
+    A shopper validating a coupon and placing an order for their cart.
+
+    The coupon applies to any cart and no other checkout uses the same
+    shopper concurrently, so every order must succeed: a 400 is an error.
+    """
+    # Two concurrent checkouts for one shopper would empty each other's cart
+    user_id = ctx['checkout_users'].get()
+    try:
+        _checkout(client, ctx, rng, user_id)
+    finally:
+        ctx['checkout_users'].put(user_id)
+
+
+def _checkout(client, ctx, rng, user_id):
+    token = ctx['tokens'][user_id]
+    product_ids = rng.sample(ctx['product_ids'], 2)
+    for product_id in product_ids:
+        client.request('POST /api/cart', 'POST', '/api/cart/', token=token,
+                       json={'product_id': product_id, 'quantity': 1})
+
+    code = rng.choice(ctx['checkout_coupon_codes'])
+    client.request('POST /api/coupons/validate', 'POST', '/api/coupons/validate', json={
+        'code': code,
+        'items': [{'product_id': product_id, 'quantity': 1} for product_id in product_ids]
+    })
+    client.request('POST /api/orders', 'POST', '/api/orders/', token=token, json={
+        'shipping_address': {
+            'street': '1 Benchmark Way',
+            'city': 'Loadville',
+            'state': 'LV',
+            'country': 'Testland',
+            'zip_code': '12345'
+        },
+        'payment_method': 'credit_card',
+        'coupon_code': code
+    }, expected=(201,))
+
+
+def admin_stock_update(client, ctx, rng):
+    """Warehouse staff correcting stock levels."""
+    token = ctx['tokens'][ctx['admin_id']]
+    product_id = rng.choice(ctx['product_ids'])
+    client.request('PUT /api/products/<id>/stock', 'PUT', f'/api/products/{product_id}/stock', token=token,
+                   json={'stock': rng.randint(10_000, 1_000_000)})
+
+
+def login(client, ctx, rng):
+    """A returning shopper signing in (password hashing path)."""
+    user_id = rng.choice(ctx['customer_ids'])
+    client.request('POST /api/auth/login', 'POST', '/api/auth/login', json={
+        'email': ctx['emails'][user_id],
+        'password': ctx['password']
+    })
+
+
+SCENARIOS = {
+    'browse': browse,
+    'add_to_cart': add_to_cart,
+    'checkout': checkout,
+    'admin_stock_update': admin_stock_update,
+    'login': login
+}
+
+# Relative weights of the default traffic mix
+DEFAULT_MIX = {
+    'browse': 60,
+    'add_to_cart': 25,
+    'checkout': 10,
+    'admin_stock_update': 3,
+    'login': 2
+}
@@ -0,0 +1,101 @@
+"""
+Report application startup cost: import time per top-level package, cold-start
+time and resident memory after `create_app()`, checked against budgets.
+
+Runs `create_app` in a fresh interpreter with `python -X importtime` and
+without touching MongoDB (index creation and warm-up are disabled).
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --top 15 --budget-ms 1200 --budget-rss-mb 120
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from app.config import Config
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Sum `-X importtime` self times (microseconds) by top-level package."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        totals[name.strip().split('.')[0]] += int(self_us)
+    return totals
+
+
+def measure(env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD],
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=20, help='Number of packages to list')
+    parser.add_argument('--budget-ms', type=float, default=Config.STARTUP_TIME_BUDGET_MS,
+                        help='Cold-start budget for import + create_app')
+    parser.add_argument('--budget-rss-mb', type=float, default=Config.WORKER_RSS_BUDGET_MB,
+                        help='Resident memory budget after create_app')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, MONGODB_ENSURE_INDEXES='False', WARMUP_ON_STARTUP='False', SLOW_QUERY_ENABLED='False')
+    timings, packages = measure(env)
+    startup_ms = timings['import_ms'] + timings['create_app_ms']
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    over_budget = []
+    if startup_ms > args.budget_ms:
+        over_budget.append(f'startup {startup_ms:.0f} ms > {args.budget_ms:.0f} ms')
+    if timings['rss_mb'] > args.budget_rss_mb:
+        over_budget.append(f"rss {timings['rss_mb']:.1f} MB > {args.budget_rss_mb:.0f} MB")
+
+    if args.json:
+        print(json.dumps({
+            **{key: round(value, 1) for key, value in timings.items()},
+            'startup_ms': round(startup_ms, 1),
+            'packages_ms': {name: round(us / 1000, 1) for name, us in top},
+            'over_budget': over_budget
+        }, indent=2))
+    else:
+        print(f"{'package':30} {'import ms':>10}")
+        for name, us in top:
+            print(f'{name:30} {us / 1000:10.1f}')
+        print()
+        print(f"import app      {timings['import_ms']:8.1f} ms")
+        print(f"create_app()    {timings['create_app_ms']:8.1f} ms")
+        print(f'startup         {startup_ms:8.1f} ms (budget {args.budget_ms:.0f} ms)')
+        print(f"rss             {timings['rss_mb']:8.1f} MB (budget {args.budget_rss_mb:.0f} MB)")
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Compare gunicorn worker models on the benchmark scenarios.
+
+Starts gunicorn with gunicorn.conf.py once per worker class, drives it over
+HTTP with benchmarks.run, and prints a Markdown table of the results. Needs a
+local MongoDB and Redis (see BENCH_MONGODB_URI / BENCH_REDIS_URL); gevent mode
+needs `pip install gevent`. Each mode resets and reseeds the database, so it
+only runs against a dedicated bench database.
+
+    python -m benchmarks.worker_modes --modes gthread,gevent,sync --concurrency 64 --duration 60
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from benchmarks import run
+from benchmarks.harness import BenchmarkConfig
+
+
+def dedicated_databases():
+    """
+    Whether the bench MongoDB and Redis URLs point at throwaway databases:
+    a MongoDB database with `bench` in its name and a Redis database other
+    than 0.
+    """
+    mongo_database = urlparse(BenchmarkConfig.MONGODB_URI).path.lstrip('/')
+    redis_database = urlparse(BenchmarkConfig.REDIS_URL).path.lstrip('/') or '0'
+    return 'bench' in mongo_database and redis_database != '0'
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_mode(mode, args):
+    env = dict(
+        os.environ,
+        GUNICORN_WORKER_CLASS=mode,
+        GUNICORN_BIND=f'127.0.0.1:{args.port}',
+        GUNICORN_ACCESS_LOG='',
+        MONGODB_URI=BenchmarkConfig.MONGODB_URI,
+        REDIS_URL=BenchmarkConfig.REDIS_URL,
+        RATELIMIT_ENABLED='False',
+        SLOW_QUERY_ENABLED='False',
+        MAIL_SUPPRESS_SEND='True'
+    )
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], env=env)
+    try:
+        if not wait_until_up(args.port):
+            raise RuntimeError(f'gunicorn ({mode}) did not start')
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            run.main([
+                '--base-url', f'http://127.0.0.1:{args.port}',
+                '--concurrency', str(args.concurrency),
+                '--duration', str(args.duration),
+                '--output', output.name
+            ])
+            with open(output.name) as f:
+                return json.load(f)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='gthread,gevent,sync')
+    parser.add_argument('--workers', type=int, help='Override the worker count for every mode')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='Also write the Markdown table to this file')
+    args = parser.parse_args(argv)
+
+    if not dedicated_databases():
+        parser.error(
+            'every mode resets and reseeds the database; point BENCH_MONGODB_URI at a database '
+            'with "bench" in its name and BENCH_REDIS_URL at a Redis database other than 0'
+        )
+
+    rows = []
+    for mode in args.modes.split(','):
+        results = run_mode(mode, args)['results']
+        endpoints = results['endpoints'].values()
+        rows.append((
+            mode,
+            results['throughput'],
+            max((endpoint['p95_ms'] for endpoint in endpoints), default=0),
+            max((endpoint['p99_ms'] for endpoint in endpoints), default=0),
+            results['errors']
+        ))
+
+    lines = [
+        '| worker class | req/s | worst p95 (ms) | worst p99 (ms) | errors |',
+        '|---|---|---|---|---|'
+    ] + ['| {} | {} | {} | {} | {} |'.format(*row) for row in rows]
+    table = '\n'.join(lines)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(table + '\n')
+    print(table)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Gunicorn settings for the API.
+
+    gunicorn -c gunicorn.conf.py
+
+Every setting can be overridden with a GUNICORN_* environment variable (or on
+the command line). See the Deployment section of the README for how the
+worker models compare.
+"""
+import importlib.util
+import os
+import resource
+import sys
+import threading
+import traceback
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _cpu_count():
+    # Respect CPU affinity / container limits where the platform exposes them
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Workers warm up in post_worker_init; warming the preloading master would
+# only open connections that are discarded at fork
+os.environ.setdefault('WARMUP_ON_STARTUP', 'False')
+
+wsgi_app = os.getenv('GUNICORN_APP', 'run:app')
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Worker model: gthread (default), gevent or sync
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+    print('gevent is not installed, falling back to gthread workers', file=sys.stderr)
+    worker_class = 'gthread'
+
+cores = _cpu_count()
+if worker_class == 'gevent':
+    # One event loop per core; concurrency comes from greenlets
+    workers = _env_int('GUNICORN_WORKERS', cores)
+    worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 256)
+elif worker_class == 'gthread':
+    workers = _env_int('GUNICORN_WORKERS', min(cores * 2 + 1, _env_int('GUNICORN_MAX_WORKERS', 12)))
+    threads = _env_int('GUNICORN_THREADS', 4)
+else:
+    workers = _env_int('GUNICORN_WORKERS', min(cores * 2 + 1, _env_int('GUNICORN_MAX_WORKERS', 12)))
+
+# Keep connections from the load balancer open between requests
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+
+# Recycle workers to bound memory growth; jitter keeps them from restarting together
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+# Import the app once in the master so workers share its memory copy-on-write.
+# Connections are opened lazily in each worker (app/utils/connections.py).
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() in ('true', '1', 't')
+if worker_class == 'gevent':
+    # gevent workers monkey-patch after the fork; a preloaded app would keep
+    # the unpatched socket, ssl and threading modules it imported in the master
+    preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    server.log.info(
+        f"Serving with {workers} {worker_class} workers"
+        + (f" x {threads} threads" if worker_class == 'gthread' else '')
+        + (f" x {worker_connections} connections" if worker_class == 'gevent' else '')
+    )
+
+
+def post_worker_init(worker):
+    # Runs in each worker after the app is loaded and before it accepts requests
+    warmup = worker.wsgi.extensions.get('warmup') if hasattr(worker.wsgi, 'extensions') else None
+    if warmup is not None:
+        with worker.wsgi.app_context():
+            warmup.run(worker.wsgi)
+        worker.log.info(f"Worker {worker.pid} warmed up in {warmup.report.get('seconds')}s")
+    
+    # Includes pages still shared with the master when the app is preloaded
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    budget = worker.wsgi.config.get('WORKER_RSS_BUDGET_MB') if hasattr(worker.wsgi, 'config') else None
+    if budget and rss_mb > budget:
+        worker.log.warning(f"Worker {worker.pid} uses {rss_mb:.0f} MB after startup, over the {budget} MB budget")
+
+
+def worker_abort(worker):
+    # Log where every thread was stuck when the worker timed out
+    frames = sys._current_frames()
+    for thread in threading.enumerate():
+        frame = frames.get(thread.ident)
+        if frame is not None:
+            worker.log.warning(f"Thread {thread.name}:\n{''.join(traceback.format_stack(frame))}")